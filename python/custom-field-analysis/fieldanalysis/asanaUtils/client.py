@@ -1,6 +1,43 @@
 import json
+import time
 import asyncio
 import aiohttp
+from collections import namedtuple
+
+from .ratelimit import get_rate_limiter, parse_retry_after
+from .metrics import get_request_metrics
+from .hedging import get_hedge_policy
+from .records import loads
+
+# Default timeouts, in seconds, for opening a connection and for each read
+# from it. For more information, see: https://docs.aiohttp.org/en/stable/client_quickstart.html#timeouts
+CONNECT_TIMEOUT = 10.0
+READ_TIMEOUT = 60.0
+
+# The request failed before Asana answered: the connection was refused or
+# reset, or it timed out
+TRANSPORT_ERRORS = (
+    aiohttp.ClientConnectionError,
+    aiohttp.ClientPayloadError,
+    asyncio.TimeoutError,
+)
+
+# A proxy or load balancer in front of Asana could not get an answer. The
+# request may or may not have reached Asana, and the body may be an HTML or
+# empty page rather than JSON.
+GATEWAY_ERRORS = {502, 503, 504}
+
+# Methods that are safe to send again when the first attempt may or may not
+# have reached Asana
+IDEMPOTENT_METHODS = {"GET", "PUT", "DELETE"}
+
+# What one attempt got back, and how long it waited for the rate limiter
+Reply = namedtuple("Reply", ["status", "headers", "body", "waited", "latency"])
+
+
+# Returns the timeouts for an aiohttp session
+def client_timeout(connect=CONNECT_TIMEOUT, read=READ_TIMEOUT):
+    return aiohttp.ClientTimeout(total=None, sock_connect=connect, sock_read=read)
 
 
 async def asana_client(method, url, session, **kwargs):
@@ -23,8 +60,32 @@ async def asana_client(method, url, session, **kwargs):
 
     headers = {"Authorization": "Bearer " + kwargs["token"]}
 
+    request = {"data": data, "params": params, "headers": headers}
+    if kwargs.get("timeout"):
+        request["timeout"] = kwargs["timeout"]
+
+    # Parses the response body, e.g. into typed records
+    decode = kwargs.get("decoder") or loads
+
+    # Error statuses the caller handles itself, e.g. 412 from the events
+    # API. Their response body is returned instead of False.
+    allowed_errors = kwargs.get("allowed_errors") or ()
+
+    # Every request on the session shares the same rate budget
+    limiter = kwargs.get("rate_limiter") or get_rate_limiter(session)
+    metrics = get_request_metrics(session)
+    hedging = get_hedge_policy(session)
+
     result = False
 
+    # Time spent waiting for the limiter before the first attempt, and
+    # waiting or sleeping before the retries
+    queued_seconds = 0.0
+    retry_seconds = 0.0
+    status = None
+    latency = 0.0
+    size = 0
+
     while ((retryError == 429) or (retryError == 500)) and (attempt < 10):
         # pause execution before trying again
 
@@ -34,44 +95,157 @@ async def asana_client(method, url, session, **kwargs):
         if attempt == 8:
             print("thanks for your patience. still slow.")
 
-        try:
-            response = await session.request(
-                method,
-                url=full_url,
-                data=data,
-                params=params,
-                headers=headers,
-                raise_for_status=False,
-            )
-            retryError = response.status
-
-            if retryError >= 400:
-                if (response.status != 429) and (response.status != 500):
-                    error_json = await response.json()
-                    print(error_json["errors"][0]["message"])
-                    print("HTTP Error: ", response.status)
-                    return False
-            else:
-                result = await response.json()
-                return result
-
-        except aiohttp.client_exceptions.ClientResponseError as e:
-            if (response.status != 429) and (response.status != 500):
-                print("HTTP Error: ", response.status)
-                error_json = await response.json()
-                print(error_json["errors"][0]["message"])
-                return False
-
         # Exponential backoff in seconds = constant * attempt^2
         retry_time = backoff_seconds * attempt * attempt
 
-        print(
-            f"The script is hitting rate limits (too many calls/minute). Waiting for {retry_time} seconds before continuing"
-        )
-        await asyncio.sleep(retry_time)
+        try:
+            if hedging:
+                reply = await _send_hedged(
+                    session, limiter, hedging, metrics, method, url, full_url, request
+                )
+            else:
+                reply = await _send(session, limiter, method, full_url, request)
+
+        except TRANSPORT_ERRORS as error:
+            # Writes may have gone through, so only retry what is safe to repeat
+            if method not in IDEMPOTENT_METHODS:
+                print(f"Could not reach the Asana API: {type(error).__name__} {error}")
+                return False
+            print(
+                f"Could not reach the Asana API ({type(error).__name__} {error}). Waiting for {retry_time} seconds before continuing"
+            )
+            await asyncio.sleep(retry_time)
+            retry_seconds += retry_time
+            retryError = 500
+            attempt += 1
+            continue
+
+        if attempt == 0:
+            queued_seconds += reply.waited
+        else:
+            retry_seconds += reply.waited
+        latency = reply.latency
+        size = len(reply.body)
+        retryError = status = reply.status
+
+        if retryError == 429:
+            # Asana says how long to wait. Without the header, fall back to exponential backoff.
+            # For more information, see: https://developers.asana.com/docs/rate-limits
+            limiter.throttled(
+                parse_retry_after(reply.headers.get("Retry-After"), max(retry_time, 1.0))
+            )
+        elif retryError in allowed_errors:
+            metrics.record(method, url, status, latency, size, attempt, retry_seconds, queued_seconds)
+            return loads(reply.body)
+        elif retryError in GATEWAY_ERRORS and method in IDEMPOTENT_METHODS:
+            # Retried like the transport errors, with the server error backoff
+            retryError = 500
+        elif retryError >= 400:
+            if retryError != 500:
+                metrics.record(method, url, status, latency, size, attempt, retry_seconds, queued_seconds)
+                print(_error_message(reply.body))
+                print("HTTP Error: ", status)
+                return False
+        else:
+            result = decode(reply.body)
+            limiter.succeeded()
+            metrics.record(method, url, status, latency, size, attempt, retry_seconds, queued_seconds)
+            return result
+
+        # Rate limited calls wait on the shared limiter, which is paused for
+        # every caller. Server errors back off individually.
+        if retryError == 500:
+            print(
+                f"The Asana API returned a server error. Waiting for {retry_time} seconds before continuing"
+            )
+            await asyncio.sleep(retry_time)
+            retry_seconds += retry_time
         attempt += 1
 
     if attempt >= 10:
         print("too many requests hit rate limits - timed out")
 
+    if status is not None:
+        metrics.record(method, url, status, latency, size, attempt - 1, retry_seconds, queued_seconds)
+
     return result
+
+
+# Returns the message of an error response, or its raw body if it is not an
+# Asana error, e.g. a proxy's HTML error page
+def _error_message(body):
+    try:
+        return json.loads(body)["errors"][0]["message"]
+    except (ValueError, KeyError, IndexError, TypeError):
+        return body.decode("utf-8", "replace")
+
+
+# Sends one attempt of a request once the rate limiter lets it through, and
+# reads the whole response. `sent` is set once the limiter let it through.
+async def _send(session, limiter, method, full_url, request, sent=None):
+    waiting_since = time.monotonic()
+    async with limiter:
+        if sent is not None:
+            sent.set()
+        sent_at = time.monotonic()
+        response = await session.request(
+            method, url=full_url, raise_for_status=False, **request
+        )
+        body = await response.read()
+        return Reply(
+            response.status,
+            response.headers,
+            body,
+            sent_at - waiting_since,
+            time.monotonic() - sent_at,
+        )
+
+
+# Sends one attempt of a request, and a hedged copy of it if the first copy
+# is slower than the policy allows. Returns the first reply to arrive and
+# cancels the other copy. Errors are only raised once both copies failed.
+async def _send_hedged(session, limiter, policy, metrics, method, url, full_url, request):
+    delay = policy.delay(metrics, method, url)
+    sent = asyncio.Event()
+    first = asyncio.ensure_future(
+        _send(session, limiter, method, full_url, request, sent=sent)
+    )
+    tasks = [first]
+    sending = asyncio.ensure_future(sent.wait())
+
+    try:
+        if delay is None:
+            return await first
+
+        # The delay counts from when the first copy was sent. Time queued
+        # behind the rate budget is not slowness, and hedging it would only
+        # add load once the budget is used up.
+        await asyncio.wait([first, sending], return_when=asyncio.FIRST_COMPLETED)
+        if first.done():
+            return await first
+
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done or not policy.allow():
+            return await first
+
+        tasks.append(
+            asyncio.ensure_future(_send(session, limiter, method, full_url, request))
+        )
+        metrics.record_hedge(method, url)
+
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in tasks:
+                if task in done and task.exception() is None:
+                    if task is not first:
+                        metrics.record_hedge(method, url, won=True)
+                    return task.result()
+
+        # Both copies failed
+        return first.result()
+
+    finally:
+        for task in tasks + [sending]:
+            if not task.done():
+                task.cancel()
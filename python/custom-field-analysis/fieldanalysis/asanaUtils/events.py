@@ -0,0 +1,131 @@
+import asyncio
+
+from .client import asana_client
+
+
+class SyncTokenExpired(RuntimeError):
+    """
+    The events since the last sync token are no longer available, e.g.
+    because there were too many of them. The stream has a new token, but
+    the changes in between have to be caught up some other way.
+    """
+
+
+class EventStream:
+    """
+    Reads the events of one Asana resource (a task, project or goal) with
+    sync tokens. `start()` gets a token for the current state, and each `poll()`
+    returns the events that happened since the previous call.
+
+    For more information on this API endpoint, see: https://developers.asana.com/reference/getevents
+    """
+
+    def __init__(self, session, token, resource):
+        self.session = session
+        self.token = token
+        self.resource = resource
+        self.sync = None
+
+    # Gets a sync token to read events from, without reading any. Asana
+    # answers a request without a token with a 412 that holds a fresh one.
+    async def start(self):
+        result = await self._get()
+        if "sync" not in result:
+            raise RuntimeError(f"could not get a sync token for the events of {self.resource}")
+        self.sync = result["sync"]
+
+    # Returns the events since the last call, reading every page of them
+    async def poll(self):
+        events = []
+        while True:
+            result = await self._get()
+            if "errors" in result:
+                # The old token expired, and the new one starts from now
+                self.sync = result.get("sync")
+                raise SyncTokenExpired(
+                    f"the events of {self.resource} since the last sync are no longer available"
+                )
+
+            events.extend(result.get("data", []))
+            self.sync = result["sync"]
+            if not result.get("has_more"):
+                return events
+
+    async def _get(self):
+        params = {"resource": self.resource}
+        if self.sync:
+            params["sync"] = self.sync
+
+        result = await asana_client(
+            **{
+                "method": "GET",
+                "url": "/events",
+                "session": self.session,
+                "token": self.token,
+                "params": params,
+                "allowed_errors": {412},
+            }
+        )
+        if result is False:
+            raise RuntimeError(f"could not read the events of {self.resource}")
+        return result
+
+
+class ProjectEventStreams:
+    """
+    Reads the events of many projects, with one EventStream and sync token
+    per project, as Asana only streams the events of a task, project or
+    goal. `track()` sets the projects to follow, and each `poll()` reads
+    the events of all of them, up to `concurrency` at a time.
+    """
+
+    def __init__(self, session, token, concurrency=4):
+        self.session = session
+        self.token = token
+        self.concurrency = concurrency
+        self.streams = {}
+
+    # Follows the given projects from now on, and stops following the
+    # others. Projects whose stream cannot be started (e.g. they are no
+    # longer visible) are tried again on the next call.
+    async def track(self, project_gids):
+        project_gids = set(project_gids)
+        for project_gid in set(self.streams) - project_gids:
+            del self.streams[project_gid]
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def start(project_gid):
+            stream = EventStream(self.session, self.token, project_gid)
+            async with semaphore:
+                try:
+                    await stream.start()
+                except RuntimeError:
+                    return
+            self.streams[project_gid] = stream
+
+        await asyncio.gather(
+            *[start(project_gid) for project_gid in project_gids - set(self.streams)]
+        )
+
+    # Returns the events since the last call by project gid, and the gids
+    # of the projects whose events could not be read (e.g. their sync
+    # token expired), which have to be caught up some other way
+    async def poll(self):
+        events = {}
+        missed = set()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def poll_project(project_gid, stream):
+            async with semaphore:
+                try:
+                    events[project_gid] = await stream.poll()
+                except RuntimeError:
+                    # Also covers SyncTokenExpired, after which the stream
+                    # goes on from its new token
+                    missed.add(project_gid)
+
+        await asyncio.gather(
+            *[poll_project(project_gid, stream) for project_gid, stream in list(self.streams.items())]
+        )
+        return events, missed
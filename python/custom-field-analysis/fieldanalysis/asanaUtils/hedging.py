@@ -0,0 +1,65 @@
+import weakref
+
+# A GET that has not answered by this quantile of its endpoint's observed
+# latency gets a second copy
+DEFAULT_QUANTILE = 0.95
+
+# At most this share of GETs is hedged, so a slow API does not get twice
+# the load
+DEFAULT_MAX_RATIO = 0.05
+
+# Endpoints are only hedged once this many of their calls have been timed
+MIN_SAMPLES = 20
+
+# Never hedge sooner than this, in seconds
+MIN_DELAY = 0.05
+
+# Hedging is off unless a policy is set for the session
+_policies = weakref.WeakKeyDictionary()
+
+
+class HedgePolicy:
+    """
+    When to send a hedged copy of a slow GET request.
+
+    A GET that has not answered after the `quantile` latency observed for
+    its endpoint (see metrics.RequestMetrics) is sent a second time, and
+    whichever copy answers first is used. The copy waits for the session's
+    rate limiter like any other request, so it counts against the shared
+    budget, and at most `max_ratio` of the GETs are hedged.
+    """
+
+    def __init__(self, quantile=DEFAULT_QUANTILE, max_ratio=DEFAULT_MAX_RATIO):
+        self.quantile = quantile
+        self.max_ratio = max_ratio
+        self.requests = 0
+        self.hedges = 0
+
+    # Seconds to wait for an answer before hedging a request, or None if the
+    # request should not be hedged
+    def delay(self, metrics, method, url):
+        if method != "GET":
+            return None
+        self.requests += 1
+        latency = metrics.latency_quantile(method, url, self.quantile, MIN_SAMPLES)
+        if latency is None:
+            return None
+        return max(latency, MIN_DELAY)
+
+    # Takes a hedge out of the budget, if there is one left
+    def allow(self):
+        if self.hedges + 1 > self.max_ratio * self.requests:
+            return False
+        self.hedges += 1
+        return True
+
+
+# Returns the hedging policy of a session, or None if hedging is off
+def get_hedge_policy(session):
+    return _policies.get(session)
+
+
+# Turns on hedging for every GET made on a session
+def set_hedge_policy(session, policy):
+    _policies[session] = policy
+    return policy
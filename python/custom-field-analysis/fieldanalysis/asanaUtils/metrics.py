@@ -0,0 +1,227 @@
+import re
+import time
+import weakref
+
+# Upper bounds of the latency buckets, in seconds: 10ms growing by 1.5x up
+# to about a minute
+LATENCY_BUCKETS = tuple(round(0.01 * 1.5 ** i, 4) for i in range(22))
+
+# Upper bounds of the response size buckets, in bytes
+SIZE_BUCKETS = (1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+# One set of metrics per aiohttp session, like the rate limiter
+_metrics = weakref.WeakKeyDictionary()
+
+_GID = re.compile(r"/\d+(?=/|$)")
+
+
+class Histogram:
+    """
+    Counts observations into fixed buckets, Prometheus-style.
+    """
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = 0.0
+
+    def observe(self, value):
+        index = 0
+        while index < len(self.bounds) and value > self.bounds[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = max(self.max, value)
+
+    # Estimates a quantile (0 to 1) by interpolating inside its bucket,
+    # narrowed down to the smallest and largest observed values
+    def quantile(self, q):
+        if self.count == 0:
+            return None
+
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = max(self.bounds[index - 1] if index > 0 else 0.0, self.min)
+                upper = min(self.bounds[index] if index < len(self.bounds) else self.max, self.max)
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.max
+
+    def summary(self):
+        values = {
+            "mean": self.sum / self.count if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "max": self.max,
+        }
+        return {
+            "count": self.count,
+            **{k: round(v, 4) if v is not None else None for k, v in values.items()},
+        }
+
+
+class EndpointMetrics:
+    def __init__(self):
+        self.statuses = {}
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.size = Histogram(SIZE_BUCKETS)
+        self.retries = 0
+        self.backoff_seconds = 0.0
+        self.queued_seconds = 0.0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+
+class RequestMetrics:
+    """
+    Records every API call made on a session: its endpoint (with gids
+    replaced by {gid}), final status, latency, bytes received, number of
+    retries, time spent waiting for the rate limiter before the first
+    attempt, and time spent backing off before retries. Hedged copies of
+    slow requests (see hedging.py) are counted separately.
+    """
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.endpoints = {}
+
+    def record(self, method, url, status, latency, size, retries, backoff_seconds, queued_seconds):
+        key = f"{method} {endpoint_template(url)}"
+        if key not in self.endpoints:
+            self.endpoints[key] = EndpointMetrics()
+
+        endpoint = self.endpoints[key]
+        endpoint.statuses[status] = endpoint.statuses.get(status, 0) + 1
+        endpoint.latency.observe(latency)
+        endpoint.size.observe(size)
+        endpoint.retries += retries
+        endpoint.backoff_seconds += backoff_seconds
+        endpoint.queued_seconds += queued_seconds
+
+    # Counts a hedged copy of a request, or that the copy answered first
+    def record_hedge(self, method, url, won=False):
+        key = f"{method} {endpoint_template(url)}"
+        if key not in self.endpoints:
+            self.endpoints[key] = EndpointMetrics()
+
+        if won:
+            self.endpoints[key].hedge_wins += 1
+        else:
+            self.endpoints[key].hedges += 1
+
+    # Observed latency quantile of one endpoint, or None without enough data
+    def latency_quantile(self, method, url, q, min_count=20):
+        endpoint = self.endpoints.get(f"{method} {endpoint_template(url)}")
+        if endpoint is None or endpoint.latency.count < min_count:
+            return None
+        return endpoint.latency.quantile(q)
+
+    def summary(self):
+        elapsed = time.monotonic() - self.started_at
+        requests = sum(e.latency.count for e in self.endpoints.values())
+        statuses = {}
+        for endpoint in self.endpoints.values():
+            for status, count in endpoint.statuses.items():
+                statuses[str(status)] = statuses.get(str(status), 0) + count
+
+        return {
+            "elapsed_seconds": round(elapsed, 3),
+            "requests": requests,
+            "requests_per_second": round(requests / elapsed, 3) if elapsed else None,
+            "bytes_received": sum(int(e.size.sum) for e in self.endpoints.values()),
+            "retries": sum(e.retries for e in self.endpoints.values()),
+            "backoff_seconds": round(sum(e.backoff_seconds for e in self.endpoints.values()), 3),
+            "queued_seconds": round(sum(e.queued_seconds for e in self.endpoints.values()), 3),
+            "hedges": sum(e.hedges for e in self.endpoints.values()),
+            "hedge_wins": sum(e.hedge_wins for e in self.endpoints.values()),
+            "statuses": statuses,
+            "endpoints": {
+                key: {
+                    "requests": e.latency.count,
+                    "statuses": {str(s): c for s, c in e.statuses.items()},
+                    "latency_seconds": e.latency.summary(),
+                    "bytes_received": int(e.size.sum),
+                    "retries": e.retries,
+                    "backoff_seconds": round(e.backoff_seconds, 3),
+                    "queued_seconds": round(e.queued_seconds, 3),
+                    "hedges": e.hedges,
+                    "hedge_wins": e.hedge_wins,
+                }
+                for key, e in sorted(self.endpoints.items())
+            },
+        }
+
+    # Renders the metrics in the Prometheus text exposition format
+    def to_prometheus(self):
+        lines = [
+            "# HELP asana_requests_total API calls by final status.",
+            "# TYPE asana_requests_total counter",
+        ]
+        for key, e in sorted(self.endpoints.items()):
+            for status, count in sorted(e.statuses.items()):
+                lines.append(f'asana_requests_total{{{_labels(key)},status="{status}"}} {count}')
+
+        lines += [
+            "# HELP asana_request_duration_seconds Latency of the final attempt of each API call.",
+            "# TYPE asana_request_duration_seconds histogram",
+        ]
+        for key, e in sorted(self.endpoints.items()):
+            lines += _histogram_lines("asana_request_duration_seconds", _labels(key), e.latency)
+
+        lines += [
+            "# HELP asana_response_bytes Size of each API response body.",
+            "# TYPE asana_response_bytes histogram",
+        ]
+        for key, e in sorted(self.endpoints.items()):
+            lines += _histogram_lines("asana_response_bytes", _labels(key), e.size)
+
+        for name, help_text, attribute in (
+            ("asana_request_retries_total", "Retried attempts of API calls.", "retries"),
+            ("asana_backoff_seconds_total", "Time spent backing off before retries.", "backoff_seconds"),
+            ("asana_queued_seconds_total", "Time spent waiting for the rate limiter.", "queued_seconds"),
+            ("asana_hedged_requests_total", "Hedged copies sent of slow API calls.", "hedges"),
+            ("asana_hedge_wins_total", "Hedged copies that answered first.", "hedge_wins"),
+        ):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            for key, e in sorted(self.endpoints.items()):
+                lines.append(f"{name}{{{_labels(key)}}} {getattr(e, attribute)}")
+
+        return "\n".join(lines) + "\n"
+
+
+# Turns "/projects/123/custom_field_settings?limit=100" into
+# "/projects/{gid}/custom_field_settings"
+def endpoint_template(url):
+    return _GID.sub("/{gid}", url.split("?", 1)[0])
+
+
+# Returns the metrics of every request on a session
+def get_request_metrics(session):
+    if session not in _metrics:
+        _metrics[session] = RequestMetrics()
+    return _metrics[session]
+
+
+def _labels(key):
+    method, endpoint = key.split(" ", 1)
+    return f'method="{method}",endpoint="{endpoint}"'
+
+
+def _histogram_lines(name, labels, histogram):
+    lines = []
+    cumulative = 0
+    for bound, count in zip(histogram.bounds, histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+    lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+    lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+    return lines
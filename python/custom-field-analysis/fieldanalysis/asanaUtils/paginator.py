@@ -0,0 +1,90 @@
+import asyncio
+
+from .client import asana_client
+
+# Largest page size Asana allows for list endpoints
+PAGE_LIMIT = 100
+
+# Marks the end of the pages in the read-ahead queue
+_DONE = object()
+
+
+async def paginate(
+    session, token, url, params=None, prefetch=1, offset=None, decoder=None
+):
+    """
+    Iterates over every page of an Asana list endpoint.
+
+    While the caller processes one page, up to `prefetch` following pages are
+    already being fetched in the background. With `prefetch=0` each page is
+    only requested once the caller asks for it. Pagination starts at `offset`
+    if given. Each page is the raw response, so `page["data"]` holds its
+    records and `page["next_page"]` where the next page starts. A `decoder`
+    (see records.page_decoder) turns the records into typed objects.
+
+    For more information on pagination, see: https://developers.asana.com/docs/pagination
+
+        async for page in paginate(session, token, "/workspaces/1/projects"):
+            for project in page["data"]:
+                ...
+    """
+    params = dict(params or {})
+    params.setdefault("limit", PAGE_LIMIT)
+
+    if prefetch < 1:
+        async for page in _fetch_pages(session, token, url, params, offset, decoder):
+            yield page
+        return
+
+    queue = asyncio.Queue(maxsize=prefetch)
+
+    async def read_ahead():
+        try:
+            async for page in _fetch_pages(session, token, url, params, offset, decoder):
+                await queue.put(page)
+        except Exception as e:
+            await queue.put(e)
+        else:
+            await queue.put(_DONE)
+
+    producer = asyncio.ensure_future(read_ahead())
+
+    try:
+        while True:
+            page = await queue.get()
+            if page is _DONE:
+                break
+            if isinstance(page, Exception):
+                raise page
+            yield page
+    finally:
+        # Stop fetching if the caller stopped iterating early
+        producer.cancel()
+
+
+# Fetches the pages of a list endpoint one after another
+async def _fetch_pages(session, token, url, params, offset, decoder):
+    while True:
+        if offset:
+            params["offset"] = offset
+
+        result = await asana_client(
+            **{
+                "method": "GET",
+                "url": url,
+                "params": params,
+                "session": session,
+                "token": token,
+                "decoder": decoder,
+            }
+        )
+
+        if not result:
+            raise RuntimeError(f"could not fetch {url}")
+
+        yield result
+
+        if result.get("next_page"):
+            offset = result["next_page"]["offset"]
+        else:
+            return
@@ -0,0 +1,161 @@
+import asyncio
+import weakref
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+# Asana allows 1500 requests per minute on paid plans and 50 concurrent GET
+# requests per user. For more information, see: https://developers.asana.com/docs/rate-limits
+DEFAULT_RATE = 25.0
+DEFAULT_CONCURRENCY = 10
+MAX_CONCURRENCY = 50
+
+# One limiter per aiohttp session, so every coroutine sharing a session also
+# shares its request budget
+_limiters = weakref.WeakKeyDictionary()
+
+
+class RateLimiter:
+    """
+    Shared request budget for every API call made on one session.
+
+    Requests wait for a token from a token bucket refilled at `rate` tokens
+    per second, and for one of `concurrency` in-flight slots. The number of
+    slots is adjusted AIMD-style: it grows by one after a full window of
+    successful requests and is halved when Asana answers with a 429. A
+    Retry-After header pauses every caller until it has elapsed.
+
+    Use it as an async context manager around each request:
+
+        async with limiter:
+            response = await session.request(...)
+    """
+
+    def __init__(
+        self,
+        rate=DEFAULT_RATE,
+        burst=None,
+        concurrency=DEFAULT_CONCURRENCY,
+        min_concurrency=1,
+        max_concurrency=MAX_CONCURRENCY,
+    ):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self.concurrency = max(min_concurrency, min(concurrency, max_concurrency))
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+
+        self._tokens = self.burst
+        self._updated_at = None
+        self._in_flight = 0
+        self._successes = 0
+        self._paused_until = 0.0
+        self._last_decrease = None
+        self._condition = None
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.release()
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+
+        # Created lazily so the limiter binds to the running event loop
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+            self._updated_at = loop.time()
+
+        async with self._condition:
+            while True:
+                now = loop.time()
+                self._refill(now)
+
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self._in_flight >= self.concurrency:
+                    wait = None
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    self._in_flight += 1
+                    return
+                else:
+                    wait = (1 - self._tokens) / self.rate
+
+                try:
+                    await asyncio.wait_for(self._condition.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def release(self):
+        async with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def succeeded(self):
+        # Additive increase: one more slot per window of successful requests
+        self._successes += 1
+        if self._successes >= self.concurrency:
+            self._successes = 0
+            if self.concurrency < self.max_concurrency:
+                self.concurrency += 1
+
+    def throttled(self, retry_after):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+
+        # Multiplicative decrease, once per backoff window. Every request
+        # that was in flight when the limit was hit reports the same 429.
+        if self._last_decrease is None or now - self._last_decrease >= retry_after:
+            self._last_decrease = now
+            self._successes = 0
+            self.concurrency = max(self.min_concurrency, self.concurrency // 2)
+            print(
+                f"The script is hitting rate limits (too many calls/minute). Pausing all calls for {retry_after} seconds "
+                f"and lowering concurrency to {self.concurrency}"
+            )
+
+        # Global backoff: nobody sends anything until Retry-After has passed
+        if now + retry_after > self._paused_until:
+            self._paused_until = now + retry_after
+            self._tokens = 0
+
+    def _refill(self, now):
+        elapsed = now - self._updated_at
+        self._updated_at = now
+        self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+
+
+# Returns how many seconds a Retry-After header asks to wait. It is either a
+# number of seconds or an HTTP date; anything else gives the default.
+def parse_retry_after(value, default):
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    if retry_at is None:
+        return default
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+# Returns the limiter shared by all requests on a session, creating one with
+# the default budget the first time the session is used
+def get_rate_limiter(session):
+    if session not in _limiters:
+        _limiters[session] = RateLimiter()
+    return _limiters[session]
+
+
+# Sets the limiter shared by all requests on a session
+def set_rate_limiter(session, limiter):
+    _limiters[session] = limiter
+    return limiter
@@ -0,0 +1,180 @@
+import json
+
+# orjson parses JSON several times faster than the standard library, so use
+# it when it is installed (pip install orjson)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+loads = orjson.loads if orjson else json.loads
+
+
+class User:
+    """
+    A user, as returned for e.g. created_by.(name|email).
+    """
+
+    __slots__ = ("name", "email")
+
+    def __init__(self, name=None, email=None):
+        self.name = name
+        self.email = email
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data.get("name"), data.get("email"))
+
+
+class EnumOption:
+    """
+    An option of an enum or multi_enum custom field.
+    """
+
+    __slots__ = ("gid", "name", "enabled", "color")
+
+    def __init__(self, gid, name=None, enabled=None, color=None):
+        self.gid = gid
+        self.name = name
+        self.enabled = enabled
+        self.color = color
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data["gid"], data.get("name"), data.get("enabled"), data.get("color"))
+
+
+class CustomField:
+    """
+    A custom field, with the attributes the audit writes out. `enum_options`
+    is None unless Asana returned enum options for the field.
+    """
+
+    __slots__ = ("gid", "name", "type", "created_by", "enum_options")
+
+    def __init__(self, gid, name=None, type=None, created_by=None, enum_options=None):
+        self.gid = gid
+        self.name = name
+        self.type = type
+        self.created_by = created_by
+        self.enum_options = enum_options
+
+    @classmethod
+    def from_json(cls, data):
+        created_by = data.get("created_by")
+        enum_options = data.get("enum_options")
+        return cls(
+            data["gid"],
+            data.get("name"),
+            data.get("type"),
+            User.from_json(created_by) if created_by else None,
+            [EnumOption.from_json(option) for option in enum_options]
+            if enum_options is not None
+            else None,
+        )
+
+    @property
+    def created_by_name(self):
+        return self.created_by.name if self.created_by else None
+
+    @property
+    def created_by_email(self):
+        return self.created_by.email if self.created_by else None
+
+    @property
+    def enum_option_names(self):
+        if self.enum_options is None:
+            return None
+        return [option.name for option in self.enum_options]
+
+
+class Project:
+    """
+    A project, with the gids of the custom fields it uses. Only the
+    attributes requested with opt_fields are set, the others are None.
+    """
+
+    __slots__ = (
+        "gid",
+        "modified_at",
+        "custom_field_gids",
+        "team_gid",
+        "team_name",
+        "archived",
+        "created_at",
+    )
+
+    def __init__(
+        self,
+        gid,
+        modified_at=None,
+        custom_field_gids=None,
+        team_gid=None,
+        team_name=None,
+        archived=None,
+        created_at=None,
+    ):
+        self.gid = gid
+        self.modified_at = modified_at
+        self.custom_field_gids = custom_field_gids
+        self.team_gid = team_gid
+        self.team_name = team_name
+        self.archived = archived
+        self.created_at = created_at
+
+    @classmethod
+    def from_json(cls, data):
+        settings = data.get("custom_field_settings")
+        team = data.get("team")
+        return cls(
+            data["gid"],
+            data.get("modified_at"),
+            [setting["custom_field"]["gid"] for setting in settings]
+            if settings is not None
+            else None,
+            team["gid"] if team else None,
+            team.get("name") if team else None,
+            data.get("archived"),
+            data.get("created_at"),
+        )
+
+
+class CustomFieldSetting:
+    """
+    The link between a project or portfolio and one of its custom fields.
+    """
+
+    __slots__ = ("custom_field_gid",)
+
+    def __init__(self, custom_field_gid):
+        self.custom_field_gid = custom_field_gid
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data["custom_field"]["gid"])
+
+
+# Returns a decoder for asana_client that parses a page of a list endpoint,
+# turning each item of page["data"] into a `record_class`
+def page_decoder(record_class):
+    from_json = record_class.from_json
+
+    def decode(body):
+        page = loads(body)
+        page["data"] = [from_json(item) for item in page["data"]]
+        return page
+
+    return decode
+
+
+# Returns a decoder for asana_client that parses the response of a single
+# resource (e.g. GET /projects/{project_gid}) into a `record_class`
+def record_decoder(record_class):
+    from_json = record_class.from_json
+
+    def decode(body):
+        result = loads(body)
+        result["data"] = from_json(result["data"])
+        return result
+
+    return decode
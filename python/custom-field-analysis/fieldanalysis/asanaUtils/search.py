@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta
+
+from .client import asana_client
+
+# The search endpoint returns at most this many tasks per query, and has no
+# offset to fetch the next page
+SEARCH_LIMIT = 100
+
+
+# Counts the tasks of a workspace matching the search `filters` (e.g.
+# {"custom_fields.123.is_set": "true"}). With a `limit`, counting stops once
+# that many tasks are found, and the count is `limit`, meaning "at least
+# that many": a limit of up to SEARCH_LIMIT takes a single query, e.g. a
+# limit of 1 only checks whether any task matches. Returns None if the
+# tasks cannot be counted exactly.
+#
+# Search does not return a total, so an exact count still reads every
+# matching task. Search results cannot be paged through with an offset, so
+# the tasks are sorted by creation time and each query asks for the tasks
+# created after the last one seen. The query starts a millisecond before
+# the last task of the page, so tasks created at the same time are not
+# missed, and the tasks it returns again are skipped.
+#
+# For more information on this API endpoint, see: https://developers.asana.com/reference/searchtasksforworkspace
+# Note that search is only available in premium workspaces.
+async def count_tasks(session, token, workspace, filters, limit=None):
+    page_size = min(limit, SEARCH_LIMIT) if limit else SEARCH_LIMIT
+    params = {
+        **filters,
+        "opt_fields": "created_at",
+        "sort_by": "created_at",
+        "sort_ascending": "true",
+        "limit": page_size,
+    }
+
+    count = 0
+    # The tasks already counted that the next query returns again
+    boundary_gids = set()
+
+    while True:
+        result = await asana_client(
+            **{
+                "method": "GET",
+                "url": f"/workspaces/{workspace}/tasks/search",
+                "session": session,
+                "token": token,
+                "params": params,
+            }
+        )
+        if result is False:
+            raise RuntimeError(f"could not search the tasks of workspace {workspace}")
+
+        tasks = result["data"]
+        new_tasks = [task for task in tasks if task["gid"] not in boundary_gids]
+        count += len(new_tasks)
+
+        if limit and count >= limit:
+            return limit
+
+        if len(tasks) < page_size:
+            return count
+
+        if not new_tasks:
+            # More than a page of tasks share one creation time, so the
+            # query cannot move past them
+            print(
+                f"More than {page_size} tasks were created at {tasks[-1]['created_at']}, leaving the task count of {filters} empty"
+            )
+            return None
+
+        last_created_at = tasks[-1]["created_at"]
+        after = _millisecond_before(last_created_at)
+        if params.get("created_at.after") != after:
+            boundary_gids = set()
+        boundary_gids.update(
+            task["gid"] for task in tasks if task["created_at"] >= after
+        )
+        params["created_at.after"] = after
+
+
+def _millisecond_before(timestamp):
+    moment = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    moment -= timedelta(milliseconds=1)
+    return moment.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
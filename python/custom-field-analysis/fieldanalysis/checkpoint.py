@@ -0,0 +1,85 @@
+import json
+import os
+import time
+
+# Marks a project listing that has been read to the end
+DONE = "done"
+
+# Seconds between two checkpoints written during a scan
+DEFAULT_INTERVAL = 30
+
+
+class Checkpoint:
+    """
+    Progress of a project scan, saved to disk so an interrupted scan can be
+    resumed.
+
+    A checkpoint holds where each project listing (the workspace listing or
+    one per team shard) should continue from, the gids of the projects that
+    were already counted, and the project counts accumulated so far. The
+    three are always saved together, so a resumed scan never counts a
+    project twice.
+    """
+
+    def __init__(self, path, workspace, interval=DEFAULT_INTERVAL):
+        self.path = path
+        self.workspace = workspace
+        self.interval = interval
+
+        # Offset to continue each listing from, or DONE
+        self.offsets = {}
+        self.seen_projects = set()
+        self.project_counts = {}
+
+        self._saved_at = time.monotonic()
+
+    # Returns the checkpoint saved at `path` for a workspace, or None if
+    # there is none
+    @classmethod
+    def load(cls, path, workspace, interval=DEFAULT_INTERVAL):
+        try:
+            with open(path) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return None
+
+        if state["workspace"] != workspace:
+            return None
+
+        checkpoint = cls(path, workspace, interval)
+        checkpoint.offsets = state["offsets"]
+        checkpoint.seen_projects = set(state["seen_projects"])
+        checkpoint.project_counts = state["project_counts"]
+        return checkpoint
+
+    def offset(self, listing):
+        return self.offsets.get(listing)
+
+    # Records that a page of a listing has been processed, and saves the
+    # checkpoint if the last one is older than the interval
+    def advance(self, listing, next_page):
+        self.offsets[listing] = next_page["offset"] if next_page else DONE
+
+        if time.monotonic() - self._saved_at >= self.interval:
+            self.save()
+
+    def save(self):
+        state = {
+            "workspace": self.workspace,
+            "offsets": self.offsets,
+            "seen_projects": sorted(self.seen_projects),
+            "project_counts": self.project_counts,
+        }
+
+        # Write to a temporary file first, so a crash while saving never
+        # leaves a truncated checkpoint behind
+        temporary_path = self.path + ".tmp"
+        with open(temporary_path, "w") as f:
+            json.dump(state, f)
+        os.replace(temporary_path, self.path)
+
+        self._saved_at = time.monotonic()
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,209 @@
+import bisect
+import math
+import re
+from collections import Counter
+
+# Columns of the duplicates report
+DUPLICATE_HEADERS = [
+    "cluster",
+    "gid",
+    "name",
+    "type",
+    "enum_option_names",
+    "closest_gid",
+    "closest_name",
+    "name_similarity",
+    "enum_option_similarity",
+]
+
+# Pairs of fields whose names are at least this similar are reported
+DEFAULT_THRESHOLD = 0.7
+
+# Names this short are too ambiguous to be taken as abbreviations
+MIN_ABBREVIATION_LENGTH = 3
+
+_NOT_ALPHANUMERIC = re.compile(r"[\W_]+")
+
+
+# Groups custom fields with similar names into clusters of candidate
+# duplicates. `fields` is a list of dicts with each field's gid, name, type
+# and enum_option_names (as in the audit). Returns one dict per field that
+# has a candidate duplicate, with the cluster it belongs to, its most
+# similar field, and how similar their names and enum options are.
+#
+# Names are compared by their character trigrams, after lowercasing and
+# dropping punctuation. The similarity of two names is their Dice
+# coefficient: twice the number of shared trigrams over the number of
+# trigrams in both names. "Priority" and "priority " are 1.0, "Priority" and
+# "Priority (old)" are 0.8, "Status" and "Stage" are 0.36. A name cut short
+# inside its last word, like "Prio" for "Priority", is an abbreviation, and
+# is scored between 0.7 and 1.0 depending on how much of the name it keeps.
+#
+# Comparing every pair of fields would take hours on tens of thousands of
+# fields, so candidates are found through an inverted index of trigrams
+# instead ("prefix filtering"). Two names sharing enough trigrams must share
+# two of the rarest trigrams of each name, so the index only holds the
+# rarest trigrams of each name, each name only looks up its own rarest
+# trigrams, and only the names it finds twice are compared with it.
+def find_duplicates(fields, threshold=DEFAULT_THRESHOLD):
+
+    # Fields with the same normalized name are duplicates of each other, and
+    # only one name of each group needs to be compared with the others
+    groups = {}
+    for i, field in enumerate(fields):
+        name = normalize(field.get("name") or "")
+        if name:
+            groups.setdefault(name, []).append(i)
+
+    pairs = []
+    for group in groups.values():
+        pairs.extend((1.0, group[0], i) for i in group[1:])
+
+    names = list(groups)
+    grams = [trigrams(name) for name in names]
+    sizes = [len(name_grams) for name_grams in grams]
+    frequency = Counter(gram for name_grams in grams for gram in name_grams)
+
+    # Each name's trigrams, rarest first
+    ordered = [
+        sorted(name_grams, key=lambda gram: (frequency[gram], gram)) for name_grams in grams
+    ]
+
+    # A name at least as long as another must share at least
+    # threshold / (2 - threshold) of its trigrams to be similar enough. Of
+    # those shared trigrams, the two rarest are among the rest of its
+    # trigrams plus two, so only that many of its rarest trigrams are indexed
+    postings = {}
+    for i, name_grams in enumerate(ordered):
+        size = len(name_grams)
+        needed = math.ceil(threshold / (2 - threshold) * size - 1e-9)
+        for gram in name_grams[: size - needed + 2]:
+            postings.setdefault(gram, []).append((size, i))
+
+    # The names indexed under each trigram, sorted by their number of trigrams
+    index = {}
+    for gram, entries in postings.items():
+        entries.sort()
+        index[gram] = ([size for size, _ in entries], [i for _, i in entries])
+
+    # Each name then looks up the longer names it could be similar to
+    for i, name_grams in enumerate(ordered):
+        size = len(name_grams)
+
+        # A longer match must share at least `needed` of this name's
+        # trigrams, and have at most `longest` trigrams
+        needed = math.ceil(threshold * size - 1e-9)
+        longest = size * (2 - threshold) / threshold + 1e-9
+
+        # Count the rarest trigrams each longer name shares with this one. A
+        # match shares at least two of them (or one, if one is enough)
+        hits = Counter()
+        for gram in name_grams[: size - needed + 2]:
+            if gram in index:
+                entry_sizes, entries = index[gram]
+                start = bisect.bisect_left(entry_sizes, size)
+                end = bisect.bisect_right(entry_sizes, longest)
+                hits.update(entries[start:end])
+        least_hits = min(needed, 2)
+
+        # Each pair is checked once, from its shorter name
+        name_set = grams[i]
+        for j, count in hits.items():
+            if count < least_hits or (sizes[j] == size and j <= i):
+                continue
+            similarity = 2 * len(name_set & grams[j]) / (size + sizes[j])
+            if similarity >= threshold:
+                pairs.append((similarity, groups[names[i]][0], groups[names[j]][0]))
+
+    pairs.extend(
+        (similarity, groups[short][0], groups[long][0])
+        for similarity, short, long in abbreviations(names)
+        if similarity >= threshold
+    )
+
+    return _clusters(fields, pairs)
+
+
+# Finds the names that are an abbreviation of another name, i.e. the other
+# name with the end of its last word cut off. Sorted, the names starting
+# with a given name follow it, so each name only looks at its neighbours.
+def abbreviations(names):
+    names = sorted(names)
+    for i, short in enumerate(names):
+        if len(short) < MIN_ABBREVIATION_LENGTH:
+            continue
+        end = bisect.bisect_left(names, short + "\uffff", i + 1)
+        for long in names[i + 1 : end]:
+            if " " not in long[len(short) :]:
+                yield 0.7 + 0.3 * len(short) / len(long), short, long
+
+
+# Lowercases a name and turns punctuation and runs of spaces into one space
+def normalize(name):
+    return " ".join(_NOT_ALPHANUMERIC.sub(" ", name.lower()).split())
+
+
+# The character trigrams of a name, with the start and end marked by spaces
+def trigrams(name):
+    if not name:
+        return frozenset()
+    padded = f" {name} "
+    return frozenset(padded[i : i + 3] for i in range(len(padded) - 2))
+
+
+# Jaccard index of the enum options of two fields, or None unless both have
+# enum options
+def enum_option_similarity(field, other_field):
+    options = {normalize(name) for name in field.get("enum_option_names") or []}
+    other_options = {normalize(name) for name in other_field.get("enum_option_names") or []}
+    if not options or not other_options:
+        return None
+    return len(options & other_options) / len(options | other_options)
+
+
+# Joins the pairs of similar fields into clusters, numbered from the
+# largest cluster down
+def _clusters(fields, pairs):
+    parent = {}
+
+    def find(i):
+        parent.setdefault(i, i)
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    # The most similar field to each field
+    closest = {}
+    for similarity, i, j in pairs:
+        parent[find(i)] = find(j)
+        for a, b in ((i, j), (j, i)):
+            if a not in closest or similarity > closest[a][0]:
+                closest[a] = (similarity, b)
+
+    members = {}
+    for i in closest:
+        members.setdefault(find(i), []).append(i)
+
+    rows = []
+    ordered = sorted(members.values(), key=lambda cluster: (-len(cluster), min(cluster)))
+    for number, cluster in enumerate(ordered, start=1):
+        for i in sorted(cluster, key=lambda i: -closest[i][0]):
+            similarity, j = closest[i]
+            option_similarity = enum_option_similarity(fields[i], fields[j])
+            rows.append(
+                {
+                    "cluster": number,
+                    "gid": fields[i]["gid"],
+                    "name": fields[i].get("name"),
+                    "type": fields[i].get("type"),
+                    "enum_option_names": fields[i].get("enum_option_names"),
+                    "closest_gid": fields[j]["gid"],
+                    "closest_name": fields[j].get("name"),
+                    "name_similarity": round(similarity, 4),
+                    "enum_option_similarity": (
+                        round(option_similarity, 4) if option_similarity is not None else None
+                    ),
+                }
+            )
+    return rows
@@ -5,164 +5,1458 @@ from operator import truediv
 import os
 import asyncio
 import aiohttp
+import argparse
+import json
 import sys
-from .menu import menu
+import tempfile
+import time
+from .menu import menu, batch_settings, TOKEN_ENVIRONMENT_VARIABLE
 
-from .asanaUtils.client import asana_client
+from .asanaUtils.client import asana_client, client_timeout, CONNECT_TIMEOUT, READ_TIMEOUT
+from .asanaUtils.paginator import paginate
+from .asanaUtils.search import count_tasks
+from .asanaUtils.ratelimit import RateLimiter, set_rate_limiter, DEFAULT_RATE, MAX_CONCURRENCY
+from .asanaUtils.metrics import get_request_metrics
+from .asanaUtils.hedging import HedgePolicy, set_hedge_policy, DEFAULT_QUANTILE
+from .asanaUtils.records import page_decoder, record_decoder, CustomField, CustomFieldSetting, Project
+from .asanaUtils.events import ProjectEventStreams
+from .store import AuditStore, DIFF_HEADERS
+from .sinks import open_sink, SINKS
+from .checkpoint import Checkpoint, DONE, DEFAULT_INTERVAL
+from .progress import ScanProgress
+from .incidence import IncidenceMatrix, cooccurrence, COOCCURRENCE_HEADERS, DEFAULT_MIN_JACCARD
+from .duplicates import find_duplicates, DUPLICATE_HEADERS, DEFAULT_THRESHOLD
+from .usage import UsageCube, usage_headers, DIMENSIONS
 import csv
 
+# Columns of the audit, without and with project counts
+FIELD_HEADERS = [
+    "gid",
+    "name",
+    "type",
+    "created_by_name",
+    "created_by_email",
+    "is_global_to_workspace",
+    "enum_option_names",
+]
+
+PROJECT_COUNT_HEADERS = [
+    "gid",
+    "project_count",
+    "name",
+    "type",
+    "created_by_name",
+    "created_by_email",
+    "enum_option_names",
+]
+
+# Columns added by --count-tasks
+TASK_COUNT_HEADERS = ["task_count", "enum_option_task_counts"]
+
 ##################################################
 # Main Function (orchestrates all functionality) #
 ##################################################
 
 
 #  An asynchronous function to get all custom fields in Asana
-async def get_fields():
+async def get_fields(options):
 
     # Create the client session with aiohttp
     # This library allows us to send multiple API requests at once in conjunction with asyncio
-    async with aiohttp.ClientSession() as session:
+    # All audits share the session's connection pool
+    # A connection that hangs times out, and the call is retried
+    connector = aiohttp.TCPConnector(limit=options.max_connections)
+    timeout = client_timeout(options.connect_timeout, options.read_timeout)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
 
-        [
-            workspace,
-            workspace_name,
-            projects_flag,
-            token,
-        ] = await menu(session)
+        # All requests on this session share one rate budget
+        set_rate_limiter(
+            session,
+            RateLimiter(
+                rate=options.requests_per_second,
+                max_concurrency=options.max_in_flight,
+            ),
+        )
+
+        # Every API call made on this session is recorded here
+        metrics = get_request_metrics(session)
+
+        # Slow GETs get a second copy once their endpoint's latency is known
+        if options.hedge:
+            set_hedge_policy(session, HedgePolicy(quantile=options.hedge_quantile))
+
+        try:
+            if options.batch:
+                return await run_batch(session, options)
+
+            [
+                workspace,
+                workspace_name,
+                projects_flag,
+                token,
+            ] = await menu(session)
+
+            if options.watch:
+                await watch_workspace(session, token, workspace, workspace_name, options)
+            else:
+                await audit_workspace(
+                    session, token, workspace, workspace_name, projects_flag, options
+                )
+        finally:
+            report_metrics(metrics, options)
+
+    return
+
+
+# Audits every workspace given on the command line or in the config file at
+# the same time, without asking for any input
+async def run_batch(session, options):
+
+    [workspaces, token] = await batch_settings(session, options)
+
+    # Workspaces with the same name get their gid in their file names
+    names = [workspace_name for _, workspace_name in workspaces]
+    options.shared_workspace_names = {name for name in names if names.count(name) > 1}
+
+    results = await asyncio.gather(
+        *[
+            watch_workspace(session, token, workspace_gid, workspace_name, options)
+            if options.watch
+            else audit_workspace(
+                session,
+                token,
+                workspace_gid,
+                workspace_name,
+                options.count_projects,
+                options,
+            )
+            for workspace_gid, workspace_name in workspaces
+        ],
+        return_exceptions=True,
+    )
+
+    failed = [
+        (workspace, result)
+        for workspace, result in zip(workspaces, results)
+        if isinstance(result, Exception)
+    ]
+    for (workspace_gid, workspace_name), error in failed:
+        print(f"Could not audit {workspace_name} ({workspace_gid}): {error}")
+
+    if failed:
+        sys.exit(f"{len(failed)} of {len(workspaces)} audits failed")
+
+
+# Audits the custom fields of one workspace and writes the resulting file
+async def audit_workspace(
+    session, token, workspace, workspace_name, projects_flag, options
+):
+
+    headers = audit_headers(projects_flag, options.count_tasks)
+
+    # Rows are written out as soon as they are known
+    file_name, sink = open_sink(
+        options.format,
+        output_path(options, workspace, workspace_name, "Asana_Custom_Field_Audit_Sheet"),
+        headers,
+    )
+
+    # Optionally keep this audit in the local store
+    store = None
+    if options.store:
+        store = AuditStore(options.store)
+        audit_id = store.start_audit(workspace, workspace_name)
+
+    # The number of projects using each custom field, by custom field gid.
+    # This is the only per-field data kept in memory for the whole audit.
+    project_counts = {}
+
+    # The gid, type and enum option gids of each custom field, to search
+    # tasks by
+    task_queries = []
+
+    # The name of each custom field, for the co-occurrence report
+    field_names = {}
+
+    # The name, type and enum options of each custom field, to look for
+    # duplicates in
+    named_fields = []
+    cooccurrence_flag = options.cooccurrence and projects_flag
+    usage_flag = options.usage_cube and projects_flag
+
+    # Project and task counts are only known once every project has been
+    # scanned and every search has run, so until then the rows wait in a
+    # temporary file rather than in memory
+    spool = (
+        tempfile.TemporaryFile("w+") if projects_flag or options.count_tasks else None
+    )
 
-        has_more = True
-        limit = 100
-        offset = ""
+    try:
+        # Fetch custom fields, iterating through all pages in the response.
         # For more information on this API endpoint, see: https://developers.asana.com/reference/getcustomfieldsforworkspace
         # Note that this request uses also input/output options: https://developers.asana.com/docs/inputoutput-options
-        url = f"/workspaces/{workspace}/custom_fields?limit={limit}&opt_fields=gid,name,type,created_by.(name|email),enum_options"
+        async for result in paginate(
+            session,
+            token,
+            f"/workspaces/{workspace}/custom_fields",
+            params={
+                "opt_fields": "gid,name,type,created_by.(name|email),enum_options"
+            },
+            prefetch=options.prefetch,
+            decoder=page_decoder(CustomField),
+        ):
+            for cf in result["data"]:
+                project_counts[cf.gid] = 0
+                if cooccurrence_flag or usage_flag:
+                    field_names[cf.gid] = cf.name
+                if options.find_duplicates:
+                    named_fields.append(
+                        {
+                            key: getattr(cf, key)
+                            for key in ("gid", "name", "type", "enum_option_names")
+                        }
+                    )
 
-        custom_fields = {}
+                if options.count_tasks:
+                    task_queries.append(
+                        (cf.gid, cf.type, [option.gid for option in cf.enum_options or []])
+                    )
 
-        # Fetch custom fields, iterating through all pages in the response.
-        # For more information on Pagination, see: https://developers.asana.com/docs/pagination
-        while has_more == True:
+                row = {header: getattr(cf, header) for header in headers if hasattr(cf, header)}
+                if spool:
+                    spool.write(json.dumps(row) + "\n")
+                else:
+                    sink.write(row)
+
+            if store:
+                store.save_custom_fields(audit_id, result["data"])
+
+        if options.find_duplicates:
+            write_duplicates_report(named_fields, workspace, workspace_name, options)
+            named_fields = None
+
+        # Each workspace gets its own cap on concurrent project listings
+        scan_options = {
+            "shard_by_team": options.shard_by_team,
+            "concurrency": options.concurrency,
+            "prefetch": options.prefetch,
+            "label": workspace_name if options.batch else None,
+        }
+
+        # The last stored audit, or else the last count of this workspace,
+        # tells roughly how many projects to expect, which gives the progress
+        # line an ETA
+        if store:
+            last_audit = store.last_audit(workspace, with_projects=True)
+            if last_audit:
+                scan_options["expected_total"] = last_audit["project_total"]
+        else:
+            scan_options["expected_total"] = load_project_total(options, workspace)
+        project_total = None
+
+        # Which custom fields each project uses, kept for the co-occurrence
+        # report
+        incidence = IncidenceMatrix(project_counts) if cooccurrence_flag else None
+
+        # Project counts by team, archived state and creation year, for the
+        # usage report
+        cube = UsageCube(project_counts) if usage_flag else None
+
+        # if the user has indicated they would also like to see project counts, get all the projects:
+        if projects_flag:
+
+            if store:
+                # Only re-read the projects that changed since the last audit,
+                # then count from the projects recorded in the store
+                project_total = await update_project_store(
+                    session, token, workspace, store, options.full_scan, **scan_options
+                )
+                counts = store.project_counts(workspace)
+                for gid in project_counts:
+                    project_counts[gid] = counts.get(gid, 0)
+                store.save_project_counts(audit_id, project_counts)
+                if incidence:
+                    incidence.add_pairs(store.project_custom_fields(workspace))
+            else:
+                project_total = await count_projects_with_checkpoint(
+                    session,
+                    token,
+                    workspace,
+                    project_counts,
+                    checkpoint_path(options, workspace),
+                    options,
+                    incidence=incidence,
+                    cube=cube,
+                    **scan_options,
+                )
+                save_project_total(options, workspace, project_total)
+
+        task_counts = {}
+        if options.count_tasks:
+            task_counts = await count_field_tasks(
+                session,
+                token,
+                workspace,
+                task_queries,
+                limit=options.task_count_limit,
+                concurrency=options.concurrency,
+                label=scan_options["label"],
+            )
+
+        if spool:
+            # Stream the waiting rows out, now with their counts
+            spool.seek(0)
+            for line in spool:
+                row = json.loads(line)
+                if projects_flag:
+                    row["project_count"] = project_counts[row["gid"]]
+                if row["gid"] in task_counts:
+                    row["task_count"], option_counts = task_counts[row["gid"]]
+                    if option_counts:
+                        row["enum_option_task_counts"] = option_counts
+                sink.write(row)
+
+        if incidence:
+            write_cooccurrence_report(incidence, field_names, workspace, workspace_name, options)
+
+        if cube:
+            write_usage_report(cube, field_names, workspace, workspace_name, options)
+
+        if store:
+            store.finish_audit(audit_id, project_total)
+            print(f"Saved audit {audit_id} of {workspace_name} to {options.store}")
+
+    finally:
+        sink.close()
+        if spool:
+            spool.close()
+        if store:
+            store.close()
 
-            if offset != "":
-                url = f"/workspaces/{workspace}/custom_fields?limit={limit}&opt_fields=gid,name,type,created_by.(name|email),enum_options&offset={offset}"
+    print(f"Done! See the resulting file: {file_name}")
+    return audit_id if options.store else None
 
+
+# Adds each project's custom fields to the matching project count, and to
+# the incidence matrix and usage cube if they are given
+async def count_projects(
+    session, token, workspace, project_counts, incidence=None, cube=None, **scan_options
+):
+    def on_projects(projects):
+        tally_projects(projects, project_counts)
+        if incidence:
+            incidence.add_projects(projects)
+        if cube:
+            cube.add_projects(projects)
+
+    # The cube's dimensions come with the same listing, in a few more fields
+    opt_fields = "custom_field_settings.custom_field.gid"
+    if cube:
+        opt_fields += ",team.name,archived,created_at"
+
+    return await scan_projects(
+        session,
+        token,
+        workspace,
+        opt_fields,
+        on_projects,
+        **scan_options,
+    )
+
+
+# Counts projects while regularly saving the scan's progress to a
+# checkpoint file. If the scan fails or is interrupted, the checkpoint is
+# saved one last time so that a run with --resume continues where it stopped.
+async def count_projects_with_checkpoint(
+    session,
+    token,
+    workspace,
+    project_counts,
+    path,
+    options,
+    incidence=None,
+    cube=None,
+    **scan_options,
+):
+
+    checkpoint = None
+    if options.resume:
+        checkpoint = Checkpoint.load(path, workspace, options.checkpoint_interval)
+
+    if checkpoint:
+        print(
+            f"Resuming from {path}: {len(checkpoint.seen_projects)} projects were already counted"
+        )
+        for gid in project_counts:
+            project_counts[gid] = checkpoint.project_counts.get(gid, 0)
+    else:
+        checkpoint = Checkpoint(path, workspace, options.checkpoint_interval)
+
+    # The checkpoint saves the live counts
+    checkpoint.project_counts = project_counts
+
+    try:
+        project_total = await count_projects(
+            session,
+            token,
+            workspace,
+            project_counts,
+            incidence=incidence,
+            cube=cube,
+            checkpoint=checkpoint,
+            **scan_options,
+        )
+    except BaseException:
+        checkpoint.save()
+        print(f"Saved the progress of the project scan to {path}. Run again with --resume to continue")
+        raise
+
+    checkpoint.remove()
+    return project_total
+
+
+# Brings the projects recorded in the store up to date. The first audit of a
+# workspace (or a full scan) reads the custom fields of every project. Later
+# audits only list each project's modified_at, and re-read the custom fields
+# of the projects that are new or were modified since the last audit.
+async def update_project_store(
+    session, token, workspace, store, full_scan=False, **scan_options
+):
+
+    known_projects = {} if full_scan else store.known_projects(workspace)
+
+    if not known_projects:
+        store.clear_projects(workspace)
+        return await scan_projects(
+            session,
+            token,
+            workspace,
+            "modified_at,custom_field_settings.custom_field.gid",
+            lambda projects: store.save_projects(
+                workspace,
+                [
+                    (project.gid, project.modified_at, project.custom_field_gids)
+                    for project in projects
+                ],
+            ),
+            **scan_options,
+        )
+
+    seen_projects = set()
+    changed_projects = {}
+
+    def find_changes(projects):
+        for project in projects:
+            seen_projects.add(project.gid)
+            if known_projects.get(project.gid) != project.modified_at:
+                changed_projects[project.gid] = project.modified_at
+
+    project_total = await scan_projects(
+        session, token, workspace, "modified_at", find_changes, **scan_options
+    )
+
+    removed_projects = known_projects.keys() - seen_projects
+    prefix = f"{scan_options['label']}: " if scan_options.get("label") else ""
+    store.remove_projects(workspace, removed_projects)
+
+    print(
+        f"{prefix}{len(changed_projects)} projects are new or changed since the last audit, {len(removed_projects)} were removed"
+    )
+
+    semaphore = asyncio.Semaphore(scan_options.get("concurrency", 4))
+
+    async def reread_project(project_gid, modified_at):
+        async with semaphore:
+            custom_field_gids = []
+            try:
+                # For more information on this API endpoint, see: https://developers.asana.com/reference/getcustomfieldsettingsforproject
+                async for result in paginate(
+                    session,
+                    token,
+                    f"/projects/{project_gid}/custom_field_settings",
+                    params={"opt_fields": "custom_field.gid"},
+                    decoder=page_decoder(CustomFieldSetting),
+                ):
+                    custom_field_gids.extend(
+                        setting.custom_field_gid for setting in result["data"]
+                    )
+            except RuntimeError:
+                # Leave the project as it was, so the next audit tries again
+                print(f"Could not re-read project {project_gid}, keeping its previous custom fields")
+                return
+
+        store.save_projects(workspace, [(project_gid, modified_at, custom_field_gids)])
+
+    await asyncio.gather(
+        *[
+            reread_project(project_gid, modified_at)
+            for project_gid, modified_at in changed_projects.items()
+        ]
+    )
+
+    return project_total
+
+
+# Event actions on a project that can change its custom fields. Every
+# other action on a project (e.g. a new task in it) is ignored.
+PROJECT_ADDED_ACTIONS = {"added", "undeleted"}
+PROJECT_REMOVED_ACTIONS = {"deleted"}
+
+
+# Audits a workspace, then keeps its audit current from the events of its
+# projects instead of re-running it. Project changes only re-read the
+# projects they concern. Every --field-refresh-interval seconds, or when an
+# event says they changed, the custom fields are re-listed, along with the
+# projects' modified_at to find new projects, which are not in any project's
+# events. The audit file and the store are rewritten after every batch of
+# changes.
+async def watch_workspace(session, token, workspace, workspace_name, options):
+    prefix = f"{workspace_name}: " if options.batch else ""
+
+    audit_id = await audit_workspace(
+        session, token, workspace, workspace_name, True, options
+    )
+
+    store = AuditStore(options.store)
+
+    # Asana only streams the events of a task, project or goal, so every
+    # project gets its own stream and sync token.
+    # For more information on this API endpoint, see: https://developers.asana.com/reference/getevents
+    streams = ProjectEventStreams(session, token, options.concurrency)
+    known_projects = store.known_projects(workspace)
+    print(f"{prefix}Starting the event streams of {len(known_projects)} projects...")
+    await streams.track(known_projects)
+
+    # Catch up on the changes made between the snapshot and the start of
+    # the streams, from each project's modified_at
+    await update_project_store(
+        session, token, workspace, store, concurrency=options.concurrency
+    )
+    await streams.track(store.known_projects(workspace))
+    write_stored_audit(store, audit_id, workspace, workspace_name, options)
+
+    fields_refreshed_at = time.monotonic()
+    print(f"{prefix}Watching for changes every {options.watch_interval:g} seconds...")
+
+    try:
+        while True:
+            await asyncio.sleep(options.watch_interval)
+
+            events, missed = await streams.poll()
+            if missed:
+                print(f"{prefix}Missed the events of {len(missed)} projects, re-reading them...")
+            changes = await apply_events(
+                session,
+                token,
+                workspace,
+                store,
+                audit_id,
+                events,
+                missed,
+                options.concurrency,
+            )
+
+            refresh = changes["fields"] or (
+                time.monotonic() - fields_refreshed_at >= options.field_refresh_interval
+            )
+            if refresh:
+                await update_project_store(
+                    session, token, workspace, store, concurrency=options.concurrency
+                )
+                await refresh_custom_fields(session, token, workspace, store, audit_id)
+                fields_refreshed_at = time.monotonic()
+            elif not changes["projects"]:
+                continue
+
+            # Follow the projects that were added, and drop the removed ones
+            await streams.track(store.known_projects(workspace))
+
+            file_name = write_stored_audit(store, audit_id, workspace, workspace_name, options)
+            print(f"{prefix}Applied {changes['projects']} project changes. Updated {file_name}")
+    finally:
+        store.close()
+
+
+# Applies the events of each project, by project gid, to the projects
+# recorded in the store. Projects in `missed` have events that could not be
+# read, and are re-read. Returns how many projects changed, and whether the
+# custom fields need to be re-listed (e.g. a field was edited, or a project
+# uses a field that is not listed in the audit yet).
+async def apply_events(
+    session, token, workspace, store, audit_id, events, missed=(), concurrency=4
+):
+    reread = set(missed)
+    removed = set()
+    refresh_fields = False
+
+    for project_gid, project_events in events.items():
+        for event in project_events:
+            resource = event.get("resource") or {}
+            action = event.get("action")
+            change = event.get("change") or {}
+
+            if resource.get("resource_type") == "project" and resource.get("gid") == project_gid:
+                if action in PROJECT_REMOVED_ACTIONS:
+                    removed.add(project_gid)
+                elif action in PROJECT_ADDED_ACTIONS or (
+                    action == "changed"
+                    and change.get("field") in (None, "custom_field_settings")
+                ):
+                    reread.add(project_gid)
+
+            elif resource.get("resource_type") == "custom_field_setting":
+                reread.add(project_gid)
+
+            elif resource.get("resource_type") == "custom_field":
+                refresh_fields = True
+
+    # A project deleted after it changed needs no re-read
+    reread -= removed
+    store.remove_projects(workspace, removed)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    known_fields = set(store.custom_field_gids(audit_id))
+    unknown_fields = set()
+
+    async def reread_project(project_gid):
+        async with semaphore:
+            # For more information on this API endpoint, see: https://developers.asana.com/reference/getproject
             result = await asana_client(
                 **{
                     "method": "GET",
-                    "url": url,
+                    "url": f"/projects/{project_gid}",
                     "session": session,
                     "token": token,
+                    "params": {
+                        "opt_fields": "modified_at,custom_field_settings.custom_field.gid"
+                    },
+                    "decoder": record_decoder(Project),
+                    "allowed_errors": {403, 404},
                 }
             )
 
-            for cf in result["data"]:
-                custom_fields[cf["gid"]] = flatten_custom_field_values(cf)
-                custom_fields[cf["gid"]]["project_count"] = 0
+        if result is False:
+            # Leave the project as it was, the next audit re-reads it
+            print(f"Could not re-read project {project_gid}, keeping its previous custom fields")
+        elif "errors" in result:
+            # Deleted, or no longer visible to this user
+            store.remove_projects(workspace, [project_gid])
+        else:
+            project = result["data"]
+            store.save_projects(
+                workspace, [(project.gid, project.modified_at, project.custom_field_gids)]
+            )
+            unknown_fields.update(set(project.custom_field_gids) - known_fields)
 
-            if "next_page" in result:
-                if result["next_page"] != None:
-                    offset = result["next_page"]["offset"]
-                else:
-                    has_more = False
-            else:
-                has_more = False
-
-        headers = [
-            "gid",
-            "name",
-            "type",
-            "created_by_name",
-            "created_by_email",
-            "is_global_to_workspace",
-            "enum_option_names",
-        ]
+    await asyncio.gather(*[reread_project(project_gid) for project_gid in reread])
 
-        # if the user has indicated they would also like to see project counts, get all the projects:
-        if projects_flag:
+    return {
+        "projects": len(reread) + len(removed),
+        "fields": refresh_fields or bool(unknown_fields),
+    }
 
-            # Get all projects in the workspace, along with their custom fields
-            has_more = True
-            limit = 100
-            offset = ""
-            url = f"/workspaces/{workspace}/projects?limit={limit}&opt_fields=custom_field_settings.custom_field.gid"
 
-            # Total count of projects with custom fields
-            total_count = 0
+# Re-lists the custom fields of a workspace into a stored audit, so renamed,
+# added and removed fields and enum options show up
+async def refresh_custom_fields(session, token, workspace, store, audit_id):
+    listed = []
 
-            while has_more == True:
+    # For more information on this API endpoint, see: https://developers.asana.com/reference/getcustomfieldsforworkspace
+    async for result in paginate(
+        session,
+        token,
+        f"/workspaces/{workspace}/custom_fields",
+        params={"opt_fields": "gid,name,type,created_by.(name|email),enum_options"},
+        decoder=page_decoder(CustomField),
+    ):
+        listed.extend(result["data"])
 
-                if offset != "":
-                    # For more information on this API endpoint, see: https://developers.asana.com/reference/getprojectsforworkspace
-                    url = f"/workspaces/{workspace}/projects?limit={limit}&opt_fields=custom_field_settings.custom_field.gid&offset={offset}"
+    removed = set(store.custom_field_gids(audit_id)) - {cf.gid for cf in listed}
+    store.remove_custom_fields(audit_id, removed)
+    store.save_custom_fields(audit_id, listed)
 
-                result = await asana_client(
-                    **{
-                        "method": "GET",
-                        "url": url,
-                        "session": session,
-                        "token": token,
-                    }
-                )
 
-                projects = result["data"]
+# Recounts the projects of each custom field from the store, and rewrites
+# the audit file from the stored audit. The file is replaced in one step, so
+# readers never see it half written.
+def write_stored_audit(store, audit_id, workspace, workspace_name, options):
+    counts = store.project_counts(workspace)
+    store.save_project_counts(
+        audit_id, {gid: counts.get(gid, 0) for gid in store.custom_field_gids(audit_id)}
+    )
+    store.finish_audit(audit_id, len(store.known_projects(workspace)))
 
-                # Again, paginate requests. For more information, see: https://developers.asana.com/docs/pagination
-                if "next_page" in result:
-                    if result["next_page"] != None:
-                        offset = result["next_page"]["offset"]
-                    else:
-                        has_more = False
-                else:
-                    has_more = False
-
-                # Add a +1 project count to each custom field referenced in each project
-                for project in projects:
-                    total_count += 1
-                    for customFieldSetting in project["custom_field_settings"]:
-                        if customFieldSetting["custom_field"]["gid"] in custom_fields:
-                            custom_fields[customFieldSetting["custom_field"]["gid"]][
-                                "project_count"
-                            ] += 1
-
-                print(f"Analyzing {total_count} projects...")
-
-                headers = [
-                    "gid",
-                    "project_count",
-                    "name",
-                    "type",
-                    "created_by_name",
-                    "created_by_email",
-                    "enum_option_names",
-                ]
-
-        file_name = f"{workspace_name}_Asana_Custom_Field_Audit_Sheet.csv"
+    path = output_path(options, workspace, workspace_name, "Asana_Custom_Field_Audit_Sheet")
+    partial_name, sink = open_sink(options.format, path + ".partial", audit_headers(True, False))
+    try:
+        for row in store.custom_field_rows(audit_id):
+            sink.write(row)
+    finally:
+        sink.close()
 
-        print(
-            f"Done! See the resulting CSV file in your current directory: {file_name}"
+    file_name = partial_name.replace(".partial", "", 1)
+    os.replace(partial_name, file_name)
+    return file_name
+
+
+# Walks every project in the workspace, requesting `opt_fields` for each, and
+# passes each page of projects to `on_projects`. Each project is passed once.
+#
+# With `shard_by_team`, the scan is split into one listing per team and
+# archived state, and up to `concurrency` of those listings run at the same
+# time. Every project in an organization belongs to exactly one team, but
+# teams are only listed if the user can see them, so projects shared with the
+# user from other teams are in no shard. Alongside the shards, the gids of
+# the workspace's projects are listed, and the projects no shard returned
+# are read one by one, so the total matches the workspace-wide listing.
+async def scan_projects(
+    session,
+    token,
+    workspace,
+    opt_fields,
+    on_projects,
+    shard_by_team=False,
+    concurrency=4,
+    prefetch=1,
+    label=None,
+    checkpoint=None,
+    expected_total=None,
+):
+
+    # Gids of every project seen so far, shared by all shards. A resumed
+    # scan starts with the projects its checkpoint already counted.
+    seen_projects = checkpoint.seen_projects if checkpoint else set()
+    resumed_total = len(seen_projects)
+    prefix = f"{label}: " if label else ""
+    progress = ScanProgress(label, expected_total)
+
+    # Projects are decoded straight into records holding the requested fields
+    decoder = page_decoder(Project)
+
+    # New projects found by each listing, to estimate the total from
+    listing_totals = {}
+
+    def handle_page(listing, result):
+        projects = []
+        for project in result["data"]:
+            if project.gid not in seen_projects:
+                seen_projects.add(project.gid)
+                projects.append(project)
+        listing_totals[listing] = listing_totals.get(listing, 0) + len(projects)
+
+        on_projects(projects)
+
+        if checkpoint:
+            checkpoint.advance(listing, result.get("next_page"))
+
+        progress.update(len(seen_projects))
+
+    # Reads one project listing to the end, continuing from the checkpoint
+    async def scan_listing(listing, url, params):
+        offset = checkpoint.offset(listing) if checkpoint else None
+        if offset == DONE:
+            return
+
+        try:
+            async for result in paginate(
+                session,
+                token,
+                url,
+                params=params,
+                prefetch=prefetch,
+                offset=offset,
+                decoder=decoder,
+            ):
+                handle_page(listing, result)
+        except RuntimeError:
+            if not offset:
+                raise
+
+            # Pagination offsets expire after a while. Projects that were
+            # already counted are skipped, so restart the listing instead.
+            print(f"{prefix}Could not continue {url} from the checkpoint. Restarting it...")
+            async for result in paginate(
+                session, token, url, params=params, prefetch=prefetch, decoder=decoder
+            ):
+                handle_page(listing, result)
+
+    teams = []
+    if shard_by_team:
+        teams = await get_teams(session, token, workspace)
+
+        # Workspaces that are not organizations have no teams to shard by
+        if not teams:
+            print(f"{prefix}Could not list teams for this workspace. Scanning projects serially...")
+
+    if not teams:
+        # Get all projects in the workspace, along with the requested fields
+        # For more information on this API endpoint, see: https://developers.asana.com/reference/getprojectsforworkspace
+        await scan_listing(
+            "workspace",
+            f"/workspaces/{workspace}/projects",
+            {"opt_fields": opt_fields},
         )
 
-        # write to a CSV:
-        with open(file_name, "w") as csvfile:
-            writer = csv.DictWriter(
-                csvfile, fieldnames=headers, restval="", extrasaction="ignore"
+        progress.finish(len(seen_projects))
+        return len(seen_projects)
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    # Shards left to read, and the ones read to the end so far. Until the
+    # number of projects is known, it is estimated from the average shard.
+    pending_shards = {
+        shard_listing(team, archived)
+        for team in teams
+        for archived in (False, True)
+        if not checkpoint or checkpoint.offset(shard_listing(team, archived)) != DONE
+    }
+    finished_shards = []
+
+    async def scan_shard(team, archived):
+        listing = shard_listing(team, archived)
+        async with semaphore:
+            # For more information on this API endpoint, see: https://developers.asana.com/reference/getprojectsforteam
+            await scan_listing(
+                listing,
+                f"/teams/{team['gid']}/projects",
+                {
+                    "archived": str(archived).lower(),
+                    "opt_fields": opt_fields,
+                },
             )
-            writer.writeheader()
-            writer.writerows(list(custom_fields.values()))
 
-    return
+        if listing in pending_shards:
+            finished_shards.append(listing_totals.get(listing, 0))
+            average = sum(finished_shards) / len(finished_shards)
+            progress.estimate(resumed_total + round(average * len(pending_shards)))
+
+    # Gids of every project in the workspace, which only costs a small
+    # response per page
+    workspace_projects = set()
+
+    async def list_workspace_projects():
+        # For more information on this API endpoint, see: https://developers.asana.com/reference/getprojectsforworkspace
+        async for result in paginate(
+            session,
+            token,
+            f"/workspaces/{workspace}/projects",
+            params={"opt_fields": "gid"},
+            prefetch=prefetch,
+        ):
+            workspace_projects.update(project["gid"] for project in result["data"])
+
+    async def read_project(project_gid):
+        async with semaphore:
+            # For more information on this API endpoint, see: https://developers.asana.com/reference/getproject
+            result = await asana_client(
+                **{
+                    "method": "GET",
+                    "url": f"/projects/{project_gid}",
+                    "session": session,
+                    "token": token,
+                    "params": {"opt_fields": opt_fields},
+                    "decoder": record_decoder(Project),
+                    "allowed_errors": {403, 404},
+                }
+            )
+
+        if result is False:
+            raise RuntimeError(f"could not read project {project_gid}")
+        if "errors" in result or project_gid in seen_projects:
+            # Deleted since it was listed
+            return
+
+        seen_projects.add(project_gid)
+        on_projects([result["data"]])
+        progress.update(len(seen_projects))
+
+    print(f"{prefix}Scanning projects across {len(teams)} teams...")
+
+    shards = [
+        asyncio.ensure_future(scan_shard(team, archived))
+        for team in teams
+        for archived in (False, True)
+    ] + [asyncio.ensure_future(list_workspace_projects())]
+
+    try:
+        await asyncio.gather(*shards)
+
+        # Projects of teams the user cannot see
+        missed = workspace_projects - seen_projects
+        if missed:
+            print(f"{prefix}Reading {len(missed)} projects from teams that could not be listed...")
+            shards = [asyncio.ensure_future(read_project(gid)) for gid in missed]
+            await asyncio.gather(*shards)
+    finally:
+        # If one shard failed, stop the others so the scan's state stays put
+        for shard in shards:
+            shard.cancel()
+
+    progress.finish(len(seen_projects))
+    return len(seen_projects)
+
+
+# Name of the listing of a team's active or archived projects
+def shard_listing(team, archived):
+    return f"team:{team['gid']}:{'archived' if archived else 'active'}"
+
+
+# Counts the tasks that have a value for each custom field, and for each of
+# its enum options, with one task search per count. Returns a
+# (task count, [task count of each enum option]) tuple by custom field gid.
+# Counts that could not be searched are None. With a `limit`, counts stop at
+# it, see count_tasks.
+#
+# Task search only documents custom_fields.<gid>.value for single-select
+# enum fields, so the options of multi_enum fields are not counted.
+async def count_field_tasks(
+    session, token, workspace, fields, limit=None, concurrency=4, label=None
+):
+
+    prefix = f"{label}: " if label else ""
+    if not fields:
+        return {}
+
+    # Search is only available in premium workspaces, so check it works once
+    # before sending every other search
+    first_gid = fields[0][0]
+    try:
+        first_count = await count_tasks(
+            session, token, workspace, {f"custom_fields.{first_gid}.is_set": "true"}, limit
+        )
+    except RuntimeError:
+        print(f"{prefix}Could not search tasks in this workspace, skipping the task counts")
+        return {}
+
+    searches = len(fields) - 1 + sum(
+        len(option_gids) for _, field_type, option_gids in fields if field_type == "enum"
+    )
+    print(f"{prefix}Counting the tasks of {len(fields)} custom fields with {searches} searches...")
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def search(filters):
+        async with semaphore:
+            try:
+                return await count_tasks(session, token, workspace, filters, limit)
+            except RuntimeError:
+                return None
+
+    async def count_field(gid, field_type, option_gids, search_field=True):
+        task_count = first_count
+        if search_field:
+            task_count = await search({f"custom_fields.{gid}.is_set": "true"})
+        if field_type != "enum":
+            return gid, (task_count, [None] * len(option_gids))
+
+        option_counts = await asyncio.gather(
+            *[
+                search({f"custom_fields.{gid}.value": option_gid})
+                for option_gid in option_gids
+            ]
+        )
+        return gid, (task_count, list(option_counts))
+
+    results = await asyncio.gather(
+        count_field(*fields[0], search_field=False),
+        *[count_field(*field) for field in fields[1:]],
+    )
+    return dict(results)
+
+
+# Returns every team in an organization, or an empty list if the workspace
+# has no teams
+async def get_teams(session, token, workspace):
+
+    teams = []
+
+    # For more information on this API endpoint, see: https://developers.asana.com/reference/getteamsforworkspace
+    try:
+        async for result in paginate(
+            session,
+            token,
+            f"/workspaces/{workspace}/teams",
+            params={"opt_fields": "gid,name"},
+        ):
+            teams.extend(result["data"])
+    except RuntimeError:
+        return []
+
+    return teams
 
 
 ##############################################
 # Utils                                      #
 ##############################################
 
+# Command line options for the analysis
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Generate a CSV audit of the custom fields in an Asana workspace"
+    )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help=f"audit the given workspaces without asking for input, using the token in ${TOKEN_ENVIRONMENT_VARIABLE}",
+    )
+    parser.add_argument(
+        "--workspace",
+        dest="workspaces",
+        action="append",
+        metavar="GID",
+        help="workspace to audit in batch mode, can be repeated",
+    )
+    parser.add_argument(
+        "--count-projects",
+        action="store_true",
+        help="in batch mode, also count the projects that use each custom field",
+    )
+    parser.add_argument(
+        "--count-tasks",
+        action="store_true",
+        help="also count the tasks that have a value for each custom field and enum option (uses task search, premium workspaces only)",
+    )
+    parser.add_argument(
+        "--task-count-limit",
+        type=int,
+        help="with --count-tasks, stop each count at this many tasks, which then means at least that many (default: count exactly, reading every matching task; up to 100 takes one search per count)",
+    )
+    parser.add_argument(
+        "--cooccurrence",
+        action="store_true",
+        help="when counting projects, also write a CSV of the custom fields that are used together on the same projects (requires numpy and scipy)",
+    )
+    parser.add_argument(
+        "--min-jaccard",
+        type=float,
+        default=DEFAULT_MIN_JACCARD,
+        help=f"with --cooccurrence, report pairs of fields sharing at least this share of their projects (default: {DEFAULT_MIN_JACCARD})",
+    )
+    parser.add_argument(
+        "--usage-cube",
+        action="store_true",
+        help="when counting projects, also write a CSV of the project counts of each field by team, archived state and creation year",
+    )
+    parser.add_argument(
+        "--usage-by",
+        type=lambda value: [dimension.strip() for dimension in value.split(",")],
+        default=DIMENSIONS,
+        metavar="DIMENSIONS",
+        help=f"with --usage-cube, the comma-separated dimensions to break the counts down by (default: {','.join(DIMENSIONS)})",
+    )
+    parser.add_argument(
+        "--find-duplicates",
+        action="store_true",
+        help="also write a CSV of the custom fields with similar names, grouped into clusters of candidate duplicates",
+    )
+    parser.add_argument(
+        "--duplicate-threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help=f"with --find-duplicates, how similar two names must be, from 0 to 1 (default: {DEFAULT_THRESHOLD})",
+    )
+    parser.add_argument(
+        "--config",
+        metavar="PATH",
+        help="JSON file with default values for these options, e.g. "
+        '{"batch": true, "workspaces": ["123"], "count_projects": true}',
+    )
+    parser.add_argument(
+        "--output-dir",
+        default=".",
+        metavar="DIR",
+        help="directory to write the resulting CSV files to (default: current directory)",
+    )
+    parser.add_argument(
+        "--format",
+        choices=sorted(SINKS),
+        default="csv",
+        help="format of the resulting files (default: csv). parquet requires pyarrow",
+    )
+    parser.add_argument(
+        "--max-connections",
+        type=int,
+        default=100,
+        help="size of the connection pool shared by all audits (default: 100)",
+    )
+    parser.add_argument(
+        "--shard-by-team",
+        action="store_true",
+        help="count projects with one listing per team and archived state, run in parallel",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="maximum number of project listings to run at once with --shard-by-team (default: 4)",
+    )
+    parser.add_argument(
+        "--prefetch",
+        type=int,
+        default=2,
+        help="number of pages to fetch ahead while the current page is processed, 0 to disable (default: 2)",
+    )
+    parser.add_argument(
+        "--requests-per-second",
+        type=float,
+        default=DEFAULT_RATE,
+        help=f"average number of API requests to send per second (default: {DEFAULT_RATE:g})",
+    )
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=MAX_CONCURRENCY,
+        help=f"upper bound for the number of API requests in flight at once (default: {MAX_CONCURRENCY})",
+    )
+    parser.add_argument(
+        "--connect-timeout",
+        type=float,
+        default=CONNECT_TIMEOUT,
+        metavar="SECONDS",
+        help=f"how long to wait for a connection to Asana before retrying (default: {CONNECT_TIMEOUT:g})",
+    )
+    parser.add_argument(
+        "--read-timeout",
+        type=float,
+        default=READ_TIMEOUT,
+        metavar="SECONDS",
+        help=f"how long to wait for data from a connection before retrying (default: {READ_TIMEOUT:g})",
+    )
+    parser.add_argument(
+        "--hedge",
+        action="store_true",
+        help="send a second copy of GET requests slower than --hedge-quantile of their endpoint, and use the first answer",
+    )
+    parser.add_argument(
+        "--hedge-quantile",
+        type=float,
+        default=DEFAULT_QUANTILE,
+        metavar="Q",
+        help=f"latency quantile after which a GET is hedged (default: {DEFAULT_QUANTILE})",
+    )
+    parser.add_argument(
+        "--metrics",
+        metavar="PATH",
+        help="write a JSON summary of the API calls made (latency, retries, backoff, by endpoint)",
+    )
+    parser.add_argument(
+        "--prometheus",
+        metavar="PATH",
+        help="write the API call metrics in the Prometheus text format",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="continue an interrupted project count from its checkpoint in --output-dir",
+    )
+    parser.add_argument(
+        "--checkpoint-interval",
+        type=float,
+        default=DEFAULT_INTERVAL,
+        metavar="SECONDS",
+        help=f"how often to save the progress of a project count (default: {DEFAULT_INTERVAL})",
+    )
+    parser.add_argument(
+        "--store",
+        metavar="PATH",
+        help="keep audits in a local SQLite database, and only re-read the projects that changed since the last audit",
+    )
+    parser.add_argument(
+        "--full-scan",
+        action="store_true",
+        help="with --store, re-read the custom fields of every project",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="after the audit, keep it up to date from the workspace's events until interrupted. requires --store",
+    )
+    parser.add_argument(
+        "--watch-interval",
+        type=float,
+        default=60,
+        metavar="SECONDS",
+        help="with --watch, how often to read new events (default: 60)",
+    )
+    parser.add_argument(
+        "--field-refresh-interval",
+        type=float,
+        default=600,
+        metavar="SECONDS",
+        help="with --watch, how often to re-list the custom fields (default: 600)",
+    )
+    parser.add_argument(
+        "--list-audits",
+        action="store_true",
+        help="list the audits kept in --store and exit",
+    )
+    parser.add_argument(
+        "--diff",
+        nargs=2,
+        type=int,
+        metavar=("BEFORE", "AFTER"),
+        help="write a CSV of the changes between two audits kept in --store and exit",
+    )
+    options = parser.parse_args(argv)
+
+    # Values from the config file act as defaults for the command line
+    if options.config:
+        try:
+            with open(options.config) as config_file:
+                config = json.load(config_file)
+        except (OSError, ValueError) as e:
+            parser.error(f"could not read {options.config}: {e}")
+
+        unknown = [key for key in config if not hasattr(options, key)]
+        if unknown:
+            parser.error(f"unknown options in {options.config}: {', '.join(unknown)}")
+
+        parser.set_defaults(**config)
+        options = parser.parse_args(argv)
+
+    if options.batch and not options.workspaces:
+        parser.error("--batch requires at least one --workspace")
+
+    if options.max_connections < 1:
+        parser.error("--max-connections must be at least 1")
+
+    if (options.list_audits or options.diff) and not options.store:
+        parser.error("--list-audits and --diff require --store")
+
+    if options.cooccurrence and options.resume:
+        parser.error("--cooccurrence cannot be combined with --resume, as checkpoints only keep the project counts")
+
+    if options.usage_cube and (options.resume or options.store):
+        parser.error("--usage-cube cannot be combined with --resume or --store, which do not keep the teams, archived state and creation year of projects")
+
+    unknown = set(options.usage_by) - set(DIMENSIONS)
+    if unknown or not options.usage_by:
+        parser.error(f"--usage-by takes a comma-separated list of: {', '.join(DIMENSIONS)}")
+
+    if not 0 < options.min_jaccard <= 1:
+        parser.error("--min-jaccard must be between 0 and 1")
+
+    if not 0 < options.duplicate_threshold <= 1:
+        parser.error("--duplicate-threshold must be between 0 and 1")
+
+    if options.task_count_limit is not None and options.task_count_limit < 1:
+        parser.error("--task-count-limit must be at least 1")
+
+    if options.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+
+    if options.prefetch < 0:
+        parser.error("--prefetch cannot be negative")
+
+    if options.requests_per_second <= 0:
+        parser.error("--requests-per-second must be positive")
+
+    if options.max_in_flight < 1:
+        parser.error("--max-in-flight must be at least 1")
+
+    if options.connect_timeout <= 0 or options.read_timeout <= 0:
+        parser.error("--connect-timeout and --read-timeout must be positive")
+
+    if options.watch and not options.store:
+        parser.error("--watch requires --store, which keeps the projects to update")
+
+    if options.watch and options.count_tasks:
+        parser.error("--watch cannot be combined with --count-tasks, as task counts are not kept up to date")
+
+    if options.watch_interval <= 0 or options.field_refresh_interval <= 0:
+        parser.error("--watch-interval and --field-refresh-interval must be positive")
+
+    if not 0 < options.hedge_quantile < 1:
+        parser.error("--hedge-quantile must be between 0 and 1")
+
+    # Names of the workspaces of a batch that share their name, see run_batch
+    options.shared_workspace_names = set()
+
+    return options
+
+
+# Columns of the audit for the counts that were asked for
+def audit_headers(projects_flag, tasks_flag):
+    headers = list(PROJECT_COUNT_HEADERS if projects_flag else FIELD_HEADERS)
+    if tasks_flag:
+        # Task counts go next to the project counts, and the enum option task
+        # counts next to the enum option names
+        position = headers.index("project_count") + 1 if projects_flag else 1
+        headers.insert(position, TASK_COUNT_HEADERS[0])
+        headers.insert(headers.index("enum_option_names") + 1, TASK_COUNT_HEADERS[1])
+    return headers
+
+
+# Adds a +1 project count to each custom field referenced in each project
+def tally_projects(projects, project_counts):
+    for project in projects:
+        for custom_field_gid in project.custom_field_gids:
+            if custom_field_gid in project_counts:
+                project_counts[custom_field_gid] += 1
+
+
+# Prints a summary of the API calls made during the run, and writes the
+# detailed metrics to the files given with --metrics and --prometheus
+def report_metrics(metrics, options):
+    summary = metrics.summary()
+    print(
+        f"Made {summary['requests']} API calls in {summary['elapsed_seconds']:.1f} seconds "
+        f"({summary['retries']} retries, {summary['backoff_seconds']:.1f} seconds backing off, "
+        f"{summary['queued_seconds']:.1f} seconds waiting for the rate limit)"
+    )
+    if summary["hedges"]:
+        print(f"Hedged {summary['hedges']} slow API calls, {summary['hedge_wins']} of which answered first")
+
+    if options.metrics:
+        with open(options.metrics, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"See the API call metrics in: {options.metrics}")
+
+    if options.prometheus:
+        with open(options.prometheus, "w") as f:
+            f.write(metrics.to_prometheus())
+
+
+# Writes the pairs of custom fields used together on the same projects
+def write_cooccurrence_report(incidence, field_names, workspace, workspace_name, options):
+    pairs = cooccurrence(incidence, field_names, min_jaccard=options.min_jaccard)
+
+    file_name = output_path(
+        options, workspace, workspace_name, "Asana_Custom_Field_Cooccurrence.csv"
+    )
+    with open(file_name, "w") as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=COOCCURRENCE_HEADERS)
+        writer.writeheader()
+        writer.writerows(pairs)
+
+    print(
+        f"Found {len(pairs)} pairs of custom fields used together. See the resulting CSV file: {file_name}"
+    )
+
+
+# Writes the project counts of the usage cube, broken down by --usage-by
+def write_usage_report(cube, field_names, workspace, workspace_name, options):
+    rows = cube.rows(field_names, by=options.usage_by)
+
+    file_name = output_path(
+        options, workspace, workspace_name, "Asana_Custom_Field_Usage.csv"
+    )
+    with open(file_name, "w") as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=usage_headers(options.usage_by))
+        writer.writeheader()
+        writer.writerows(rows)
+
+    print(
+        f"Broke down the project counts into {len(rows)} rows by {', '.join(options.usage_by)}. See the resulting CSV file: {file_name}"
+    )
+
+
+# Writes the clusters of custom fields with similar names
+def write_duplicates_report(fields, workspace, workspace_name, options):
+    rows = find_duplicates(fields, threshold=options.duplicate_threshold)
+
+    file_name = output_path(
+        options, workspace, workspace_name, "Asana_Custom_Field_Duplicates.csv"
+    )
+    with open(file_name, "w") as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=DUPLICATE_HEADERS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+    clusters = len({row["cluster"] for row in rows})
+    print(
+        f"Found {len(rows)} custom fields in {clusters} clusters of candidate duplicates. See the resulting CSV file: {file_name}"
+    )
+
+
+# Where a file of a workspace is written. The name starts with the
+# workspace's name, followed by its gid if another workspace of the same
+# batch has the same name.
+def output_path(options, workspace, workspace_name, name):
+    os.makedirs(options.output_dir, exist_ok=True)
+    if workspace_name in options.shared_workspace_names:
+        workspace_name = f"{workspace_name}_{workspace}"
+    return os.path.join(options.output_dir, f"{workspace_name}_{name}")
+
+
+# Where the progress of a workspace's project scan is saved
+def checkpoint_path(options, workspace):
+    os.makedirs(options.output_dir, exist_ok=True)
+    return os.path.join(options.output_dir, f"{workspace}_project_scan.checkpoint.json")
+
+
+# Where the number of projects the last count of a workspace found is kept
+def project_total_path(options, workspace):
+    os.makedirs(options.output_dir, exist_ok=True)
+    return os.path.join(options.output_dir, f"{workspace}_project_scan.total.json")
+
+
+# Returns the number of projects the last count of a workspace found, or
+# None if it was never counted
+def load_project_total(options, workspace):
+    try:
+        with open(project_total_path(options, workspace)) as f:
+            return json.load(f)["project_total"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+# Keeps the number of projects a count found, for the next count to expect
+def save_project_total(options, workspace, project_total):
+    with open(project_total_path(options, workspace), "w") as f:
+        json.dump({"project_total": project_total}, f)
+
+
+# Prints the audits kept in the store
+def list_audits(options):
+    store = AuditStore(options.store)
+    for audit in store.list_audits():
+        projects = audit["project_total"] if audit["project_total"] is not None else "-"
+        print(
+            f"{audit['id']}: {audit['workspace_name']} ({audit['workspace_gid']}) "
+            f"started {audit['started_at']}, finished {audit['finished_at'] or '-'}, {projects} projects"
+        )
+    store.close()
+
+
+# Writes the changes between two stored audits to a CSV
+def diff_audits(options):
+    store = AuditStore(options.store)
+    before_id, after_id = options.diff
+
+    for audit_id in (before_id, after_id):
+        if store.get_audit(audit_id) is None:
+            sys.exit(f"audit {audit_id} does not exist in {options.store}")
+
+    changes = store.diff(before_id, after_id)
+    store.close()
+
+    file_name = f"Asana_Custom_Field_Audit_Diff_{before_id}_{after_id}.csv"
+
+    with open(file_name, "w") as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=DIFF_HEADERS)
+        writer.writeheader()
+        writer.writerows(changes)
+
+    print(
+        f"Found {len(changes)} changes. See the resulting CSV file in your current directory: {file_name}"
+    )
+
+
 # Main function which is targeted by the CLI command
 def main():
     # Runs the project upload function asynchronously
 
+    options = parse_args()
+
+    if options.list_audits:
+        return list_audits(options)
+
+    if options.diff:
+        return diff_audits(options)
+
     try:
-        asyncio.run(get_fields())
+        asyncio.run(get_fields(options))
     except KeyboardInterrupt:
         print("\nInterrupted - goodbye")
         try:
@@ -174,29 +1468,10 @@ def main():
 # If this file is run directly via Python:
 if __name__ == "__main__":
     try:
-        asyncio.run(get_fields())
+        asyncio.run(get_fields(parse_args()))
     except KeyboardInterrupt:
         print("\nInterrupted - goodbye")
         try:
             sys.exit(0)
         except SystemExit:
             os._exit(0)
-
-# Formats custom field values
-def flatten_custom_field_values(custom_field):
-
-    if "enum_options" in custom_field:
-        new_enum_options = []
-        custom_field["enum_options"] = list(custom_field["enum_options"])
-
-        for value in custom_field["enum_options"]:
-            new_enum_options.append(dict(value)["name"])
-
-        custom_field["enum_option_names"] = new_enum_options
-
-    if "created_by" in custom_field and custom_field["created_by"] != None:
-        custom_field["created_by"] = dict(custom_field["created_by"])
-        custom_field["created_by_email"] = custom_field["created_by"]["email"]
-        custom_field["created_by_name"] = custom_field["created_by"]["name"]
-
-    return custom_field
@@ -0,0 +1,158 @@
+from array import array
+from itertools import groupby
+
+# Columns of the co-occurrence report
+COOCCURRENCE_HEADERS = [
+    "field_gid",
+    "field_name",
+    "other_field_gid",
+    "other_field_name",
+    "field_projects",
+    "other_field_projects",
+    "shared_projects",
+    "jaccard",
+    "relationship",
+]
+
+# Pairs of fields whose projects overlap at least this much (shared projects
+# over projects using either field) are reported even if neither contains
+# the other
+DEFAULT_MIN_JACCARD = 0.9
+
+# Pairs sharing fewer projects than this are never reported
+DEFAULT_MIN_SHARED = 2
+
+
+class IncidenceMatrix:
+    """
+    Which custom fields each project uses, as a sparse project-by-field
+    matrix in CSR (compressed sparse row) form.
+
+    Custom fields are numbered in the order they were listed, and projects in
+    the order they were scanned. Each project adds one row: the numbers of
+    its custom fields are appended to `indices`, and `indptr` records where
+    the row ends. This takes 4 bytes per (project, custom field) pair and 8
+    bytes per project, so 100k projects with 20 custom fields each fit in
+    under 10MB.
+    """
+
+    def __init__(self, field_gids):
+        # Fail before the scan rather than after it
+        _import_scipy()
+
+        self.field_gids = list(field_gids)
+        self.field_index = {gid: i for i, gid in enumerate(self.field_gids)}
+        self.indptr = array("q", [0])
+        self.indices = array("i")
+
+    @property
+    def project_total(self):
+        return len(self.indptr) - 1
+
+    # Adds a row for a project. Custom fields that were not listed (e.g.
+    # deleted since) are left out, like in the project counts.
+    def add_project(self, custom_field_gids):
+        columns = {
+            self.field_index[gid] for gid in custom_field_gids if gid in self.field_index
+        }
+        self.indices.extend(sorted(columns))
+        self.indptr.append(len(self.indices))
+
+    # Adds the projects returned by the API (see records.Project), with the
+    # gids of their custom fields
+    def add_projects(self, projects):
+        for project in projects:
+            self.add_project(project.custom_field_gids)
+
+    # Adds (project gid, custom field gid) pairs, sorted by project
+    def add_pairs(self, pairs):
+        for _, project_pairs in groupby(pairs, key=lambda pair: pair[0]):
+            self.add_project(custom_field_gid for _, custom_field_gid in project_pairs)
+
+    # Returns the matrix as a scipy.sparse.csr_matrix
+    def to_scipy(self):
+        numpy, sparse = _import_scipy()
+        indices = numpy.frombuffer(self.indices, dtype=numpy.int32)
+        return sparse.csr_matrix(
+            (
+                numpy.ones(len(indices), dtype=numpy.int32),
+                indices,
+                numpy.frombuffer(self.indptr, dtype=numpy.int64),
+            ),
+            shape=(self.project_total, len(self.field_gids)),
+        )
+
+
+# Finds the pairs of custom fields that are used on the same projects. With
+# A the project-by-field matrix, AᵀA holds the number of projects shared by
+# each pair of fields, and its diagonal the number of projects using each
+# field. Returns one dict per reported pair, where the relationship is:
+#
+# - "always together": both fields are used on exactly the same projects
+# - "subset": every project using the field also uses the other field, so
+#   the field may be redundant
+# - "mostly together": the fields share at least `min_jaccard` of the
+#   projects using either of them
+def cooccurrence(
+    matrix, field_names, min_jaccard=DEFAULT_MIN_JACCARD, min_shared=DEFAULT_MIN_SHARED
+):
+    numpy, _ = _import_scipy()
+
+    a = matrix.to_scipy()
+    shared = (a.T @ a).tocoo()
+    field_projects = shared.diagonal()
+
+    # Each pair once, sharing enough projects
+    keep = (shared.row < shared.col) & (shared.data >= min_shared)
+    rows, cols, both = shared.row[keep], shared.col[keep], shared.data[keep]
+    projects_row, projects_col = field_projects[rows], field_projects[cols]
+    jaccard = both / (projects_row + projects_col - both)
+
+    # Put the field contained in the other one first
+    swap = projects_row > projects_col
+    rows, cols = numpy.where(swap, cols, rows), numpy.where(swap, rows, cols)
+    projects_row, projects_col = field_projects[rows], field_projects[cols]
+
+    relationship = numpy.select(
+        [
+            (both == projects_row) & (both == projects_col),
+            both == projects_row,
+            jaccard >= min_jaccard,
+        ],
+        ["always together", "subset", "mostly together"],
+        default="",
+    )
+    keep = relationship != ""
+    rows, cols, both, jaccard, relationship = (
+        rows[keep], cols[keep], both[keep], jaccard[keep], relationship[keep]
+    )
+
+    pairs = []
+    for i in numpy.lexsort((-both, -jaccard)):
+        field_gid = matrix.field_gids[rows[i]]
+        other_field_gid = matrix.field_gids[cols[i]]
+        pairs.append(
+            {
+                "field_gid": field_gid,
+                "field_name": field_names.get(field_gid),
+                "other_field_gid": other_field_gid,
+                "other_field_name": field_names.get(other_field_gid),
+                "field_projects": int(field_projects[rows[i]]),
+                "other_field_projects": int(field_projects[cols[i]]),
+                "shared_projects": int(both[i]),
+                "jaccard": round(float(jaccard[i]), 4),
+                "relationship": str(relationship[i]),
+            }
+        )
+    return pairs
+
+
+def _import_scipy():
+    try:
+        import numpy
+        from scipy import sparse
+    except ImportError:
+        raise RuntimeError(
+            "the co-occurrence report requires numpy and scipy. install them with: pip install numpy scipy"
+        )
+    return numpy, sparse
@@ -1,7 +1,11 @@
+import os
 import sys
 import csv
 from .asanaUtils.client import asana_client
 
+# Environment variable holding the personal access token in batch mode
+TOKEN_ENVIRONMENT_VARIABLE = "ASANA_ACCESS_TOKEN"
+
 async def menu(session):
     # Get personal access token (PAT)
     # For more information on PATs, see: https://developers.asana.com/docs/personal-access-token
@@ -55,3 +59,42 @@ async def menu(session):
         projects_flag,
         token,
     ]
+
+
+# Non-interactive counterpart of menu(): reads the personal access token from
+# the environment and checks that every workspace to audit can be accessed
+async def batch_settings(session, options):
+    token = os.environ.get(TOKEN_ENVIRONMENT_VARIABLE)
+    if not token:
+        sys.exit(f"set the {TOKEN_ENVIRONMENT_VARIABLE} environment variable to your personal access token")
+
+    # For more information on this API endpoint, see: https://developers.asana.com/reference/getuser
+    user = await asana_client(
+        **{"method": "GET", "url": "/users/me", "session": session, "token": token}
+    )
+    if not user:
+        sys.exit("invalid account token")
+
+    workspaces = []
+
+    # For more information on this API endpoint, see: https://developers.asana.com/reference/getworkspace
+    for workspace_gid in dict.fromkeys(options.workspaces):
+        workspace = await asana_client(
+            **{
+                "method": "GET",
+                "url": f"/workspaces/{workspace_gid}",
+                "session": session,
+                "token": token,
+            }
+        )
+
+        if not workspace:
+            sys.exit(
+                f"could not get workspace {workspace_gid} or it does not exist. check that you have access to it"
+            )
+
+        workspaces.append((workspace_gid, workspace["data"]["name"]))
+
+    print(f"Auditing {len(workspaces)} workspaces...")
+
+    return [workspaces, token]
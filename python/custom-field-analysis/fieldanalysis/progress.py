@@ -0,0 +1,87 @@
+import sys
+import time
+
+# Seconds between two progress lines
+DEFAULT_INTERVAL = 1.0
+
+
+class ScanProgress:
+    """
+    Reports how many projects a scan has analyzed, how fast, and (when the
+    number of projects is roughly known, e.g. from the last stored audit) how
+    long the rest of the scan should take. Without a known number, a sharded
+    scan estimates it from the shards it has finished, and the time left is
+    shown as an estimate.
+
+    On a terminal, the progress line is rewritten in place. Otherwise (or
+    when several workspaces are audited at once), one line is printed per
+    interval.
+    """
+
+    def __init__(self, label=None, expected_total=None, interval=DEFAULT_INTERVAL, stream=None):
+        self.prefix = f"{label}: " if label else ""
+        self.expected_total = expected_total
+        self.estimated = False
+        self.interval = interval
+        self.stream = stream or sys.stdout
+        self.in_place = label is None and self.stream.isatty()
+
+        self.started_at = time.monotonic()
+        self._printed_at = None
+        self._first_count = None
+
+    # Sets the number of projects the scan is expected to find, unless it is
+    # already known
+    def estimate(self, total):
+        if self.expected_total is None or self.estimated:
+            self.expected_total = total
+            self.estimated = True
+
+    def update(self, count):
+        now = time.monotonic()
+
+        # Projects counted before a resumed scan do not add to its throughput
+        if self._first_count is None:
+            self._first_count = count
+
+        if self._printed_at is not None and now - self._printed_at < self.interval:
+            return
+        self._printed_at = now
+        self._write(self.line(count, now))
+
+    def finish(self, count):
+        self._write(self.line(count, time.monotonic()))
+        if self.in_place:
+            self.stream.write("\n")
+            self.stream.flush()
+
+    def line(self, count, now):
+        elapsed = now - self.started_at
+        rate = (count - (self._first_count or 0)) / elapsed if elapsed > 0 else 0.0
+
+        line = f"{self.prefix}Analyzing {count} projects... ({rate:.1f} projects/s"
+        if self.expected_total and rate > 0:
+            remaining = max(self.expected_total - count, 0)
+            if self.estimated:
+                line += f", an estimated {format_duration(remaining / rate)} left"
+            else:
+                line += f", about {format_duration(remaining / rate)} left"
+        return line + ")"
+
+    def _write(self, line):
+        if self.in_place:
+            # Pad over the end of a longer previous line
+            self.stream.write(f"\r{line:<79}")
+            self.stream.flush()
+        else:
+            print(line, file=self.stream)
+
+
+# Formats seconds as e.g. "1h 02m", "4m 05s" or "12s"
+def format_duration(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    return f"{seconds}s"
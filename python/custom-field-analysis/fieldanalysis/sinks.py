@@ -0,0 +1,130 @@
+import csv
+import json
+
+# Rows written to Parquet are buffered and flushed as one row group at a time
+PARQUET_ROW_GROUP_SIZE = 10000
+
+# Column types of the audit when written to a columnar format. Columns not
+# listed here are written as strings.
+COLUMN_TYPES = {
+    "project_count": "int64",
+    "task_count": "int64",
+    "enum_option_names": "list<string>",
+    "enum_option_task_counts": "list<int64>",
+}
+
+
+class CsvSink:
+    """
+    Writes audit rows to a CSV file as they are produced.
+    """
+
+    extension = "csv"
+
+    def __init__(self, file_name, headers):
+        self.file = open(file_name, "w")
+        self.writer = csv.DictWriter(
+            self.file, fieldnames=headers, restval="", extrasaction="ignore"
+        )
+        self.writer.writeheader()
+
+    def write(self, row):
+        self.writer.writerow(row)
+
+    def close(self):
+        self.file.close()
+
+
+class JsonlSink:
+    """
+    Writes audit rows to a JSON Lines file (one JSON object per line) as they
+    are produced.
+    """
+
+    extension = "jsonl"
+
+    def __init__(self, file_name, headers):
+        self.file = open(file_name, "w")
+        self.headers = headers
+
+    def write(self, row):
+        self.file.write(json.dumps({h: row.get(h) for h in self.headers}) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetSink:
+    """
+    Writes audit rows to a Parquet file, one row group at a time, so the
+    audit can be loaded column by column by analytics tools. Requires
+    pyarrow (pip install pyarrow).
+    """
+
+    extension = "parquet"
+
+    def __init__(self, file_name, headers):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError(
+                "writing Parquet files requires pyarrow. install it with: pip install pyarrow"
+            )
+
+        self.pyarrow = pyarrow
+        self.headers = headers
+        self.schema = pyarrow.schema(
+            [(h, _arrow_type(pyarrow, COLUMN_TYPES.get(h, "string"))) for h in headers]
+        )
+        self.writer = pyarrow.parquet.ParquetWriter(file_name, self.schema)
+        self.rows = []
+
+    def write(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= PARQUET_ROW_GROUP_SIZE:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        columns = {
+            h: [_column_value(row.get(h), COLUMN_TYPES.get(h, "string")) for row in self.rows]
+            for h in self.headers
+        }
+        self.writer.write_table(
+            self.pyarrow.Table.from_pydict(columns, schema=self.schema)
+        )
+        self.rows = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+SINKS = {sink.extension: sink for sink in (CsvSink, JsonlSink, ParquetSink)}
+
+
+# Opens the sink for an output format, writing to `<base_name>.<extension>`
+def open_sink(output_format, base_name, headers):
+    sink_class = SINKS[output_format]
+    file_name = f"{base_name}.{sink_class.extension}"
+    return file_name, sink_class(file_name, headers)
+
+
+def _arrow_type(pyarrow, column_type):
+    if column_type == "int64":
+        return pyarrow.int64()
+    if column_type == "list<string>":
+        return pyarrow.list_(pyarrow.string())
+    if column_type == "list<int64>":
+        return pyarrow.list_(pyarrow.int64())
+    return pyarrow.string()
+
+
+def _column_value(value, column_type):
+    if value is None or value == "":
+        return None
+    if column_type == "string":
+        return str(value)
+    return value
@@ -0,0 +1,385 @@
+import sqlite3
+from datetime import datetime, timezone
+
+# Custom fields and their enum options are kept per audit, so two audits can
+# be compared. Projects and the custom fields attached to them are kept as
+# the latest known state of each workspace, so later audits only need to
+# re-read the projects that changed.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS audits (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    workspace_gid TEXT NOT NULL,
+    workspace_name TEXT,
+    started_at TEXT NOT NULL,
+    finished_at TEXT,
+    project_total INTEGER
+);
+CREATE INDEX IF NOT EXISTS audits_workspace ON audits (workspace_gid, id);
+
+CREATE TABLE IF NOT EXISTS custom_fields (
+    audit_id INTEGER NOT NULL REFERENCES audits (id) ON DELETE CASCADE,
+    gid TEXT NOT NULL,
+    name TEXT,
+    type TEXT,
+    created_by_name TEXT,
+    created_by_email TEXT,
+    project_count INTEGER,
+    PRIMARY KEY (audit_id, gid)
+);
+
+CREATE TABLE IF NOT EXISTS enum_options (
+    audit_id INTEGER NOT NULL REFERENCES audits (id) ON DELETE CASCADE,
+    custom_field_gid TEXT NOT NULL,
+    gid TEXT NOT NULL,
+    name TEXT,
+    enabled INTEGER,
+    color TEXT,
+    position INTEGER,
+    PRIMARY KEY (audit_id, custom_field_gid, gid)
+);
+
+CREATE TABLE IF NOT EXISTS projects (
+    workspace_gid TEXT NOT NULL,
+    gid TEXT NOT NULL,
+    modified_at TEXT,
+    PRIMARY KEY (workspace_gid, gid)
+);
+
+CREATE TABLE IF NOT EXISTS project_custom_fields (
+    workspace_gid TEXT NOT NULL,
+    project_gid TEXT NOT NULL,
+    custom_field_gid TEXT NOT NULL,
+    PRIMARY KEY (workspace_gid, project_gid, custom_field_gid)
+);
+CREATE INDEX IF NOT EXISTS project_custom_fields_field
+    ON project_custom_fields (workspace_gid, custom_field_gid);
+"""
+
+
+class AuditStore:
+    """
+    Local SQLite store for custom field audits, keyed by workspace.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA foreign_keys = ON")
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    ##############################################
+    # Audits                                     #
+    ##############################################
+
+    def start_audit(self, workspace_gid, workspace_name):
+        with self.db:
+            cursor = self.db.execute(
+                "INSERT INTO audits (workspace_gid, workspace_name, started_at) VALUES (?, ?, ?)",
+                (workspace_gid, workspace_name, _now()),
+            )
+        return cursor.lastrowid
+
+    def finish_audit(self, audit_id, project_total=None):
+        with self.db:
+            self.db.execute(
+                "UPDATE audits SET finished_at = ?, project_total = ? WHERE id = ?",
+                (_now(), project_total, audit_id),
+            )
+
+    def get_audit(self, audit_id):
+        return self.db.execute(
+            "SELECT * FROM audits WHERE id = ?", (audit_id,)
+        ).fetchone()
+
+    def list_audits(self, workspace_gid=None):
+        if workspace_gid is None:
+            return self.db.execute("SELECT * FROM audits ORDER BY id").fetchall()
+        return self.db.execute(
+            "SELECT * FROM audits WHERE workspace_gid = ? ORDER BY id",
+            (workspace_gid,),
+        ).fetchall()
+
+    # Returns the most recent audit of a workspace that ran to completion
+    def last_audit(self, workspace_gid, with_projects=False):
+        query = "SELECT * FROM audits WHERE workspace_gid = ? AND finished_at IS NOT NULL"
+        if with_projects:
+            query += " AND project_total IS NOT NULL"
+        return self.db.execute(
+            query + " ORDER BY id DESC LIMIT 1", (workspace_gid,)
+        ).fetchone()
+
+    ##############################################
+    # Custom fields                              #
+    ##############################################
+
+    # Records the custom fields (see records.CustomField) seen by an audit.
+    # A field recorded before is replaced, along with its enum options.
+    def save_custom_fields(self, audit_id, custom_fields):
+        with self.db:
+            for cf in custom_fields:
+                self.db.execute(
+                    "DELETE FROM enum_options WHERE audit_id = ? AND custom_field_gid = ?",
+                    (audit_id, cf.gid),
+                )
+                self.db.execute(
+                    "INSERT OR REPLACE INTO custom_fields "
+                    "(audit_id, gid, name, type, created_by_name, created_by_email) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        audit_id,
+                        cf.gid,
+                        cf.name,
+                        cf.type,
+                        cf.created_by_name,
+                        cf.created_by_email,
+                    ),
+                )
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO enum_options "
+                    "(audit_id, custom_field_gid, gid, name, enabled, color, position) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (
+                            audit_id,
+                            cf.gid,
+                            option.gid,
+                            option.name,
+                            option.enabled,
+                            option.color,
+                            position,
+                        )
+                        for position, option in enumerate(cf.enum_options or [])
+                    ],
+                )
+
+    def remove_custom_fields(self, audit_id, gids):
+        with self.db:
+            for gid in gids:
+                self.db.execute(
+                    "DELETE FROM enum_options WHERE audit_id = ? AND custom_field_gid = ?",
+                    (audit_id, gid),
+                )
+                self.db.execute(
+                    "DELETE FROM custom_fields WHERE audit_id = ? AND gid = ?",
+                    (audit_id, gid),
+                )
+
+    # Returns the gids of the custom fields recorded for an audit
+    def custom_field_gids(self, audit_id):
+        return [
+            row["gid"]
+            for row in self.db.execute(
+                "SELECT gid FROM custom_fields WHERE audit_id = ? ORDER BY rowid",
+                (audit_id,),
+            )
+        ]
+
+    # Returns the custom fields of an audit as rows of the audit file, in
+    # the order they were recorded. Enum fields list their option names.
+    def custom_field_rows(self, audit_id):
+        options = {}
+        for row in self.db.execute(
+            "SELECT custom_field_gid, name FROM enum_options WHERE audit_id = ? "
+            "ORDER BY custom_field_gid, position",
+            (audit_id,),
+        ):
+            options.setdefault(row["custom_field_gid"], []).append(row["name"])
+
+        rows = []
+        for row in self.db.execute(
+            "SELECT * FROM custom_fields WHERE audit_id = ? ORDER BY rowid", (audit_id,)
+        ):
+            row = dict(row)
+            del row["audit_id"]
+            if row["gid"] in options or row["type"] in ("enum", "multi_enum"):
+                row["enum_option_names"] = options.get(row["gid"], [])
+            rows.append(row)
+        return rows
+
+    def save_project_counts(self, audit_id, counts):
+        with self.db:
+            self.db.executemany(
+                "UPDATE custom_fields SET project_count = ? WHERE audit_id = ? AND gid = ?",
+                [(count, audit_id, gid) for gid, count in counts.items()],
+            )
+
+    ##############################################
+    # Projects                                   #
+    ##############################################
+
+    # Returns {project gid: modified_at} for every project last seen in a workspace
+    def known_projects(self, workspace_gid):
+        return dict(
+            self.db.execute(
+                "SELECT gid, modified_at FROM projects WHERE workspace_gid = ?",
+                (workspace_gid,),
+            ).fetchall()
+        )
+
+    # Replaces the custom fields recorded for each project. `projects` is a
+    # list of (project gid, modified_at, custom field gids) tuples.
+    def save_projects(self, workspace_gid, projects):
+        with self.db:
+            for gid, modified_at, custom_field_gids in projects:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO projects (workspace_gid, gid, modified_at) VALUES (?, ?, ?)",
+                    (workspace_gid, gid, modified_at),
+                )
+                self.db.execute(
+                    "DELETE FROM project_custom_fields WHERE workspace_gid = ? AND project_gid = ?",
+                    (workspace_gid, gid),
+                )
+                self.db.executemany(
+                    "INSERT OR IGNORE INTO project_custom_fields "
+                    "(workspace_gid, project_gid, custom_field_gid) VALUES (?, ?, ?)",
+                    [(workspace_gid, gid, cf_gid) for cf_gid in custom_field_gids],
+                )
+
+    def remove_projects(self, workspace_gid, project_gids):
+        with self.db:
+            for gid in project_gids:
+                self.db.execute(
+                    "DELETE FROM project_custom_fields WHERE workspace_gid = ? AND project_gid = ?",
+                    (workspace_gid, gid),
+                )
+                self.db.execute(
+                    "DELETE FROM projects WHERE workspace_gid = ? AND gid = ?",
+                    (workspace_gid, gid),
+                )
+
+    # Removes every recorded project of a workspace, e.g. before a full rescan
+    def clear_projects(self, workspace_gid):
+        with self.db:
+            self.db.execute(
+                "DELETE FROM project_custom_fields WHERE workspace_gid = ?",
+                (workspace_gid,),
+            )
+            self.db.execute(
+                "DELETE FROM projects WHERE workspace_gid = ?", (workspace_gid,)
+            )
+
+    # Returns {custom field gid: number of projects using it} from the
+    # recorded projects of a workspace
+    def project_counts(self, workspace_gid):
+        return dict(
+            self.db.execute(
+                "SELECT custom_field_gid, COUNT(*) FROM project_custom_fields "
+                "WHERE workspace_gid = ? GROUP BY custom_field_gid",
+                (workspace_gid,),
+            ).fetchall()
+        )
+
+    # Returns (project gid, custom field gid) pairs for the recorded projects
+    # of a workspace, sorted by project
+    def project_custom_fields(self, workspace_gid):
+        return self.db.execute(
+            "SELECT project_gid, custom_field_gid FROM project_custom_fields "
+            "WHERE workspace_gid = ? ORDER BY project_gid",
+            (workspace_gid,),
+        )
+
+    ##############################################
+    # Reports                                    #
+    ##############################################
+
+    # Compares the custom fields of two audits. Returns a list of dicts with
+    # the kind of change, the custom field, and its values before and after.
+    def diff(self, before_id, after_id):
+        before = self._fields(before_id)
+        after = self._fields(after_id)
+        before_options = self._enum_options(before_id)
+        after_options = self._enum_options(after_id)
+
+        changes = []
+
+        for gid in sorted(before.keys() - after.keys()):
+            changes.append(_change("field_removed", before[gid], "", before[gid]["name"], ""))
+
+        for gid in sorted(after.keys() - before.keys()):
+            changes.append(_change("field_added", after[gid], "", "", after[gid]["name"]))
+
+        for gid in sorted(before.keys() & after.keys()):
+            old, new = before[gid], after[gid]
+
+            for column in ("name", "type", "project_count"):
+                # Audits that did not count projects have no project counts
+                # to compare
+                if column == "project_count" and None in (old[column], new[column]):
+                    continue
+                if old[column] != new[column]:
+                    changes.append(_change(f"{column}_changed", new, "", old[column], new[column]))
+
+            old_options = before_options.get(gid, {})
+            new_options = after_options.get(gid, {})
+
+            for option_gid in sorted(old_options.keys() - new_options.keys()):
+                changes.append(
+                    _change("enum_option_removed", new, option_gid, old_options[option_gid]["name"], "")
+                )
+
+            for option_gid in sorted(new_options.keys() - old_options.keys()):
+                changes.append(
+                    _change("enum_option_added", new, option_gid, "", new_options[option_gid]["name"])
+                )
+
+            for option_gid in sorted(old_options.keys() & new_options.keys()):
+                old_option, new_option = old_options[option_gid], new_options[option_gid]
+                for column in ("name", "enabled"):
+                    if old_option[column] != new_option[column]:
+                        changes.append(
+                            _change(
+                                f"enum_option_{column}_changed",
+                                new,
+                                option_gid,
+                                old_option[column],
+                                new_option[column],
+                            )
+                        )
+
+        return changes
+
+    def _fields(self, audit_id):
+        return {
+            row["gid"]: row
+            for row in self.db.execute(
+                "SELECT * FROM custom_fields WHERE audit_id = ?", (audit_id,)
+            )
+        }
+
+    def _enum_options(self, audit_id):
+        options = {}
+        for row in self.db.execute(
+            "SELECT * FROM enum_options WHERE audit_id = ?", (audit_id,)
+        ):
+            options.setdefault(row["custom_field_gid"], {})[row["gid"]] = row
+        return options
+
+
+DIFF_HEADERS = [
+    "change",
+    "gid",
+    "name",
+    "enum_option_gid",
+    "before",
+    "after",
+]
+
+
+def _change(change, field, enum_option_gid, before, after):
+    return {
+        "change": change,
+        "gid": field["gid"],
+        "name": field["name"],
+        "enum_option_gid": enum_option_gid,
+        "before": before,
+        "after": after,
+    }
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
@@ -0,0 +1,128 @@
+from collections import Counter
+
+# Dimensions of the usage cube, in the order of its columns
+DIMENSIONS = ["field", "team", "archived", "year"]
+
+# Columns of the usage report, by dimension
+DIMENSION_HEADERS = {
+    "field": ["field_gid", "field_name"],
+    "team": ["team_gid", "team_name"],
+    "archived": ["archived"],
+    "year": ["created_year"],
+}
+
+# Bits given to the team and year codes of a cell. The field code takes the
+# bits above them, so any number of fields fits.
+_TEAM_BITS = 20
+_YEAR_BITS = 8
+
+
+class UsageCube:
+    """
+    Project counts of each custom field, broken down by the project's team,
+    archived state and creation year.
+
+    Each dimension's values are numbered in the order they are first seen,
+    and a cell is one integer packing the numbers of its field, team,
+    archived state and year. The counts are a Counter of those integers, so
+    only the cells that occur take memory.
+    """
+
+    def __init__(self, field_gids):
+        self.fields = _Codes(field_gids)
+        self.teams = _Codes(limit=1 << _TEAM_BITS)
+        self.years = _Codes(limit=1 << _YEAR_BITS)
+        self.team_names = {}
+        self.counts = Counter()
+
+    # Adds the projects returned by the API (see records.Project). Custom
+    # fields that were not listed are left out, like in the project counts.
+    def add_projects(self, projects):
+        for project in projects:
+            team = self.teams.code(project.team_gid)
+            if project.team_gid and project.team_name:
+                self.team_names[project.team_gid] = project.team_name
+            year = self.years.code(project.created_at[:4] if project.created_at else None)
+
+            cell = ((team << 1 | bool(project.archived)) << _YEAR_BITS) | year
+            for gid in set(project.custom_field_gids):
+                field = self.fields.index.get(gid)
+                if field is not None:
+                    self.counts[field << (_TEAM_BITS + 1 + _YEAR_BITS) | cell] += 1
+
+    # Yields (field gid, team gid, archived, year, count) for every cell
+    def cells(self):
+        for key, count in self.counts.items():
+            year = key & ((1 << _YEAR_BITS) - 1)
+            key >>= _YEAR_BITS
+            archived = bool(key & 1)
+            key >>= 1
+            team = key & ((1 << _TEAM_BITS) - 1)
+            field = key >> _TEAM_BITS
+            yield (
+                self.fields.values[field],
+                self.teams.values[team],
+                archived,
+                self.years.values[year],
+                count,
+            )
+
+    # Totals the cube over the dimensions not in `by`, keeping the cells
+    # that match the `filters` (e.g. archived=False, year="2023"). Returns
+    # {tuple of the `by` values: project count}.
+    def query(self, by=DIMENSIONS, **filters):
+        unknown = (set(by) | set(filters)) - set(DIMENSIONS)
+        if unknown:
+            raise ValueError(f"unknown dimensions: {', '.join(sorted(unknown))}")
+
+        positions = [DIMENSIONS.index(dimension) for dimension in by]
+        wanted = [(DIMENSIONS.index(dimension), value) for dimension, value in filters.items()]
+
+        totals = Counter()
+        for cell in self.cells():
+            if all(cell[i] == value for i, value in wanted):
+                totals[tuple(cell[i] for i in positions)] += cell[-1]
+        return totals
+
+    # Returns the rows of the usage report, with the columns of the
+    # dimensions in `by`, from the largest count down
+    def rows(self, field_names, by=DIMENSIONS):
+        rows = []
+        for values, count in self.query(by).items():
+            row = {}
+            for dimension, value in zip(by, values):
+                if dimension == "field":
+                    row.update(field_gid=value, field_name=field_names.get(value))
+                elif dimension == "team":
+                    row.update(team_gid=value, team_name=self.team_names.get(value))
+                elif dimension == "archived":
+                    row["archived"] = value
+                else:
+                    row["created_year"] = value
+            row["project_count"] = count
+            rows.append(row)
+
+        rows.sort(key=lambda row: -row["project_count"])
+        return rows
+
+
+# Columns of the usage report for the dimensions in `by`
+def usage_headers(by=DIMENSIONS):
+    headers = [header for dimension in by for header in DIMENSION_HEADERS[dimension]]
+    return headers + ["project_count"]
+
+
+# Numbers the values of one dimension in the order they are first seen
+class _Codes:
+    def __init__(self, values=(), limit=None):
+        self.values = list(values)
+        self.index = {value: i for i, value in enumerate(self.values)}
+        self.limit = limit
+
+    def code(self, value):
+        if value not in self.index:
+            if self.limit and len(self.values) >= self.limit:
+                raise RuntimeError(f"the usage cube has room for {self.limit} values per dimension")
+            self.index[value] = len(self.values)
+            self.values.append(value)
+        return self.index[value]
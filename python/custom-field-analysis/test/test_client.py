@@ -0,0 +1,46 @@
+from unittest import TestCase
+
+from fieldanalysis.asanaUtils.client import asana_client
+
+from .test_events import run
+
+
+class FakeResponse:
+    def __init__(self, status, body):
+        self.status = status
+        self.headers = {}
+        self.body = body
+
+    async def read(self):
+        return self.body
+
+
+class FakeSession:
+    """
+    Answers every request with the next (status, body) of `replies`.
+    """
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.methods = []
+
+    async def request(self, method, url, **kwargs):
+        self.methods.append(method)
+        return FakeResponse(*self.replies.pop(0))
+
+
+class TestAsanaClient(TestCase):
+    def test_gateway_error_retried(self):
+        session = FakeSession([(502, b"<html>Bad Gateway</html>"), (200, b'{"data": {"gid": "1"}}')])
+        result = run(asana_client("GET", "/projects/1", session, token="token"))
+        assert result == {"data": {"gid": "1"}}
+        assert session.methods == ["GET", "GET"]
+
+    def test_gateway_error_not_retried_for_writes(self):
+        session = FakeSession([(504, b""), (200, b"{}")])
+        assert run(asana_client("POST", "/projects", session, token="token", data={})) is False
+        assert session.methods == ["POST"]
+
+    def test_error_body_not_json(self):
+        session = FakeSession([(403, b"<html>Forbidden</html>")])
+        assert run(asana_client("GET", "/projects/1", session, token="token")) is False
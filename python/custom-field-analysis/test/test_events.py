@@ -0,0 +1,128 @@
+import asyncio
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from fieldanalysis.asanaUtils.events import EventStream, ProjectEventStreams
+from fieldanalysis.asanaUtils.records import CustomField, Project
+from fieldanalysis.fieldanalysis import apply_events
+from fieldanalysis.store import AuditStore
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+class FakeEvents:
+    """
+    Answers GET /events like Asana does, which only streams the events of a
+    task, project or goal. Other resources, such as a workspace, are
+    rejected.
+    """
+
+    def __init__(self, projects):
+        self.projects = set(projects)
+        # Events waiting to be read, by project gid
+        self.pending = {gid: [] for gid in projects}
+        # Projects whose sync token expires on the next read
+        self.expired = set()
+        self.syncs = 0
+
+    async def asana_client(self, method, url, session, **kwargs):
+        assert (method, url) == ("GET", "/events")
+        resource = kwargs["params"]["resource"]
+        if resource not in self.projects:
+            # 400 Bad Request
+            return False
+
+        self.syncs += 1
+        sync = f"sync{self.syncs}"
+        if "sync" not in kwargs["params"] or resource in self.expired:
+            self.expired.discard(resource)
+            return {"errors": [{"message": "Sync token invalid or too old"}], "sync": sync}
+
+        events, self.pending[resource] = self.pending[resource], []
+        return {"data": events, "sync": sync, "has_more": False}
+
+
+class TestEventStreams(TestCase):
+    def setUp(self):
+        self.fake = FakeEvents(["p1", "p2"])
+        patcher = patch("fieldanalysis.asanaUtils.events.asana_client", self.fake.asana_client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_workspace_rejected(self):
+        with self.assertRaises(RuntimeError):
+            run(EventStream(None, "token", "w1").start())
+
+    def test_events_by_project(self):
+        streams = ProjectEventStreams(None, "token")
+
+        async def scenario():
+            await streams.track(["p1", "p2", "w1"])
+            assert set(streams.streams) == {"p1", "p2"}
+
+            self.fake.pending["p1"].append({"action": "changed"})
+            self.fake.expired.add("p2")
+            events, missed = await streams.poll()
+            assert events == {"p1": [{"action": "changed"}]}
+            assert missed == {"p2"}
+
+            # The expired stream goes on from its new token
+            events, missed = await streams.poll()
+            assert events == {"p1": [], "p2": []}
+            assert not missed
+
+            await streams.track(["p1"])
+            assert set(streams.streams) == {"p1"}
+
+        run(scenario())
+
+
+class TestApplyEvents(TestCase):
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.store = AuditStore(os.path.join(self.tmp.name, "audits.db"))
+        self.addCleanup(self.store.close)
+        self.audit_id = self.store.start_audit("w1", "Workspace")
+        self.store.save_custom_fields(
+            self.audit_id, [CustomField("f1", "Priority", "text"), CustomField("f2", "Cost", "number")]
+        )
+        self.store.save_projects(
+            "w1", [("p1", "2024-01-01", ["f1"]), ("p2", "2024-01-01", ["f1"]), ("p3", "2024-01-01", [])]
+        )
+        self.reads = []
+
+    async def asana_client(self, method, url, session, **kwargs):
+        project_gid = url.split("/")[2]
+        self.reads.append(project_gid)
+        return {"data": Project(project_gid, "2024-02-01", ["f2"])}
+
+    def test_events_applied_to_their_project(self):
+        events = {
+            "p1": [
+                {"action": "added", "resource": {"resource_type": "custom_field_setting", "gid": "s1"},
+                 "parent": {"resource_type": "project", "gid": "p1"}},
+                # Tasks of the project do not change its custom fields
+                {"action": "added", "resource": {"resource_type": "task", "gid": "t1"},
+                 "parent": {"resource_type": "project", "gid": "p1"}},
+            ],
+            "p2": [{"action": "deleted", "resource": {"resource_type": "project", "gid": "p2"}}],
+        }
+        with patch("fieldanalysis.fieldanalysis.asana_client", self.asana_client):
+            changes = run(apply_events(
+                None, "token", "w1", self.store, self.audit_id, events, missed={"p3"}
+            ))
+
+        assert sorted(self.reads) == ["p1", "p3"]
+        assert set(self.store.known_projects("w1")) == {"p1", "p3"}
+        assert self.store.project_counts("w1") == {"f2": 2}
+        # f2 is listed in the audit, even though no project used it before
+        assert changes == {"projects": 3, "fields": False}
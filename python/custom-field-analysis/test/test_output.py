@@ -0,0 +1,18 @@
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from fieldanalysis.fieldanalysis import output_path, parse_args
+
+
+class TestOutputPath(TestCase):
+    def test_gid_only_for_shared_names(self):
+        with TemporaryDirectory() as tmp:
+            options = parse_args(["--output-dir", os.path.join(tmp, "audits")])
+            path = output_path(options, "1", "Marketing", "Asana_Custom_Field_Usage.csv")
+            assert path == os.path.join(tmp, "audits", "Marketing_Asana_Custom_Field_Usage.csv")
+            assert os.path.isdir(os.path.join(tmp, "audits"))
+
+            options.shared_workspace_names = {"Marketing"}
+            path = output_path(options, "1", "Marketing", "Asana_Custom_Field_Usage.csv")
+            assert path == os.path.join(tmp, "audits", "Marketing_1_Asana_Custom_Field_Usage.csv")
@@ -0,0 +1,55 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+from fieldanalysis.asanaUtils.records import Project
+from fieldanalysis.fieldanalysis import scan_projects
+
+from .test_events import run
+
+
+class FakeProjects:
+    """
+    Answers the project listings of a workspace with two teams the user can
+    see, and projects shared with the user from a team they cannot see.
+    """
+
+    def __init__(self):
+        self.teams = {"t1": ["p1", "p2"], "t2": ["p3"], "hidden": ["p4", "p5"]}
+        self.reads = []
+
+    async def get_teams(self, session, token, workspace):
+        return [{"gid": gid} for gid in self.teams if gid != "hidden"]
+
+    async def paginate(self, session, token, url, params=None, **kwargs):
+        if url.startswith("/workspaces/"):
+            gids = [gid for team in self.teams.values() for gid in team]
+            yield {"data": [{"gid": gid} for gid in gids]}
+        elif params["archived"] == "false":
+            team = url.split("/")[2]
+            yield {"data": [Project(gid, custom_field_gids=["f1"]) for gid in self.teams[team]]}
+        else:
+            yield {"data": []}
+
+    async def asana_client(self, method, url, session, **kwargs):
+        project_gid = url.split("/")[2]
+        self.reads.append(project_gid)
+        return {"data": Project(project_gid, custom_field_gids=["f1"])}
+
+
+class TestScanProjects(TestCase):
+    def test_shards_match_workspace_listing(self):
+        fake = FakeProjects()
+        scanned = []
+        with patch("fieldanalysis.fieldanalysis.get_teams", fake.get_teams), \
+                patch("fieldanalysis.fieldanalysis.paginate", fake.paginate), \
+                patch("fieldanalysis.fieldanalysis.asana_client", fake.asana_client):
+            total = run(scan_projects(
+                None, "token", "w1", "custom_field_settings.custom_field.gid",
+                lambda projects: scanned.extend(project.gid for project in projects),
+                shard_by_team=True,
+            ))
+
+        assert total == 5
+        assert sorted(scanned) == ["p1", "p2", "p3", "p4", "p5"]
+        # Only the projects of the hidden team are read one by one
+        assert sorted(fake.reads) == ["p4", "p5"]
@@ -0,0 +1,70 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+from fieldanalysis.asanaUtils.search import count_tasks
+from fieldanalysis.fieldanalysis import count_field_tasks
+
+from .test_events import run
+
+
+class FakeSearch:
+    """
+    Answers task searches from a list of (gid, created_at, {field gid: value})
+    tasks, sorted by creation time like Asana does.
+    """
+
+    def __init__(self, tasks):
+        self.tasks = tasks
+        self.queries = []
+
+    async def asana_client(self, method, url, session, **kwargs):
+        params = kwargs["params"]
+        self.queries.append(dict(params))
+        matches = [
+            {"gid": gid, "created_at": created_at}
+            for gid, created_at, values in self.tasks
+            if created_at > params.get("created_at.after", "")
+            and all(
+                (key.endswith(".is_set") and key.split(".")[1] in values)
+                or (key.endswith(".value") and values.get(key.split(".")[1]) == value)
+                for key, value in params.items()
+                if key.startswith("custom_fields.")
+            )
+        ]
+        return {"data": matches[:params["limit"]]}
+
+
+def created_at(i):
+    return f"2024-01-01T00:{i // 60:02d}:{i % 60:02d}.000Z"
+
+
+class TestCountTasks(TestCase):
+    def setUp(self):
+        tasks = [(str(i), created_at(i), {"f1": "o1" if i % 2 else "o2"}) for i in range(250)]
+        self.fake = FakeSearch(tasks)
+        patcher = patch("fieldanalysis.asanaUtils.search.asana_client", self.fake.asana_client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_exact_count_pages(self):
+        assert run(count_tasks(None, "token", "w1", {"custom_fields.f1.is_set": "true"})) == 250
+        assert len(self.fake.queries) == 3
+
+    def test_limit_takes_one_search(self):
+        filters = {"custom_fields.f1.is_set": "true"}
+        assert run(count_tasks(None, "token", "w1", filters, limit=1)) == 1
+        assert run(count_tasks(None, "token", "w1", filters, limit=100)) == 100
+        assert run(count_tasks(None, "token", "w1", {"custom_fields.f2.is_set": "true"}, 100)) == 0
+        assert len(self.fake.queries) == 3
+
+    def test_tied_creation_times_not_undercounted(self):
+        self.fake.tasks = [(str(i), created_at(0), {"f1": "o1"}) for i in range(150)]
+        assert run(count_tasks(None, "token", "w1", {"custom_fields.f1.is_set": "true"})) is None
+
+    def test_multi_enum_options_not_searched(self):
+        fields = [("f1", "enum", ["o1", "o2"]), ("f1", "multi_enum", ["o1", "o2"])]
+        with patch("fieldanalysis.fieldanalysis.count_tasks", count_tasks):
+            counts = run(count_field_tasks(None, "token", "w1", fields[:1]))
+            assert counts == {"f1": (250, [125, 125])}
+            counts = run(count_field_tasks(None, "token", "w1", fields[1:]))
+            assert counts == {"f1": (250, [None, None])}
@@ -0,0 +1,41 @@
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from fieldanalysis.asanaUtils.records import CustomField
+from fieldanalysis.store import AuditStore
+
+
+class TestAuditStore(TestCase):
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.store = AuditStore(os.path.join(self.tmp.name, "audits.db"))
+        self.addCleanup(self.store.close)
+
+    def _audit(self, counts=None):
+        audit_id = self.store.start_audit("w1", "Workspace")
+        self.store.save_custom_fields(
+            audit_id, [CustomField("f1", "Priority", "text"), CustomField("f2", "Cost", "number")]
+        )
+        if counts is not None:
+            self.store.save_project_counts(audit_id, counts)
+        self.store.finish_audit(audit_id, sum(counts.values()) if counts is not None else None)
+        return audit_id
+
+    def test_diff_without_project_counts(self):
+        counted = self._audit({"f1": 3, "f2": 0})
+        uncounted = self._audit()
+        # Nothing is known to have changed
+        assert self.store.diff(counted, uncounted) == []
+        assert self.store.diff(uncounted, counted) == []
+
+        recounted = self._audit({"f1": 2, "f2": 0})
+        assert self.store.diff(counted, recounted) == [{
+            "change": "project_count_changed",
+            "gid": "f1",
+            "name": "Priority",
+            "enum_option_gid": "",
+            "before": 3,
+            "after": 2,
+        }]
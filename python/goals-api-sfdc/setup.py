@@ -29,5 +29,8 @@ setup(
         "requests",
         "cryptography",
         "croniter",
-    ]
+    ],
+    extras_require={
+        "async": ["aiohttp"],
+    },
 )
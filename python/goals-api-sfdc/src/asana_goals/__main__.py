@@ -1,39 +1,70 @@
 import logging
 import logging.config
-from time import time, sleep
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
 from argparse import ArgumentParser
 from decimal import Decimal
-from typing import Optional, Union, Dict
+from typing import Callable, Iterable, List, Optional, Union, Dict
 
+import requests
 import toml
-from croniter import croniter
 
-from asana_goals.asana import Asana
-from asana_goals.asana.goal import Goal
-from asana_goals.data_source.salesforce import Salesforce
+from asana_goals.asana import Asana, AsanaBatch
+from asana_goals.asana.goal import Goal, GoalStatus
+from asana_goals.data_source.salesforce import ReportCache, Salesforce
+from asana_goals.goal_graph import ConfigurationError, GoalGraph
+from asana_goals.goal_state import GoalState
 from asana_goals.initializer import InitializerProcess
+from asana_goals.receiver import ChangeReceiver
+from asana_goals.scheduler import OVERLAP_SKIP, Scheduler
 
 AnyNumber = Union[str, int, float, Decimal]
 
+# Goals synced at the same time, unless set in the app config
+DEFAULT_CONCURRENCY = 4
+# Every this many syncs of a goal, it is written even if nothing changed, unless
+# set in the app config
+DEFAULT_FORCE_REFRESH_EVERY = 60
+# Seconds a batched write waits for writes of other goals to join its batch,
+# unless set in the app config
+DEFAULT_BATCH_LINGER = 0.05
+
 
 class MainProcess:
     """
     Encloses the runtime variables for an instance of this application.
     """
-    # List of goals we just synced
+    # Latest Goal record of each goal synced
     synced: Dict[str, Goal]
     # Indicates if we are running standalone or as a service
     service: bool
     # These only get used when running as a service
-    cron: Optional[croniter]
+    scheduler: Optional[Scheduler]
     shutdown: Optional[bool]
+    # Set when the config has a [receiver] section
+    receiver: Optional[ChangeReceiver]
 
     # These values are loaded from the config file
     app: dict
     sf: Salesforce
+    # Set when goal writes are sent through the Asana batch API
+    batch: Optional[AsanaBatch]
+    reports: ReportCache
     asana: Asana
     goals: dict
 
+    # Compiled from the config at startup
+    graph: GoalGraph
+    handlers: Dict[str, Callable[[dict, Optional[int]], AnyNumber]]
+    concurrency: int
+
+    # Last values and statuses pushed, to skip writes that change nothing
+    state: GoalState
+    force_refresh_every: int
+    # Runs started so far, some of which may overlap when running as a service
+    ticks: int
+
     def __init__(self, config_filename: str, service: bool = False) -> None:
         """
         Initialize process instance.
@@ -43,8 +74,10 @@ class MainProcess:
         """
         self.synced = {}
         self.service = service
-        self.cron = None
+        self.scheduler = None
         self.shutdown = None
+        self.receiver = None
+        self._wakeup = threading.Event()
         with open(config_filename) as f:
             cfg = toml.loads(f.read())
             if cfg.get("logging") is not None:
@@ -54,97 +87,319 @@ class MainProcess:
             logging.getLogger(__name__).info("Config file loaded")
 
         self.app = cfg["app"]
+        self.setup_clients(cfg)
+        self.goals = cfg["goals"]
+        self.concurrency = self.app.get("concurrency", DEFAULT_CONCURRENCY)
+        self.state = GoalState(self.app.get("state_file"))
+        self.force_refresh_every = self.app.get(
+            "force_refresh_every", DEFAULT_FORCE_REFRESH_EVERY
+        )
+        self.ticks = 0
+        self._ticks_lock = threading.Lock()
+
+        # Check the goals config now rather than halfway through a sync
+        try:
+            self.graph = GoalGraph(self.goals, self.app["goals"])
+            self.handlers = {
+                goal: self.get_handler(self.goals[goal]["source"])
+                for goal in self.graph.order
+            }
+            if service:
+                self.scheduler = Scheduler(
+                    self.schedules(),
+                    jitter=self.app.get("jitter", 0),
+                    overlap=self.app.get("overlap", OVERLAP_SKIP),
+                )
+                if cfg.get("receiver") is not None:
+                    self.receiver = ChangeReceiver(
+                        self.goals_changed, self.reports_changed,
+                        goal_gids=self.graph.by_goal_id, **cfg["receiver"]
+                    )
+        except ConfigurationError as e:
+            logging.getLogger(__name__).error("Configuration error: %s.", e)
+            raise
+
+    def setup_clients(self, cfg: dict) -> None:
+        """
+        Creates the API clients from the config.
+        :param cfg: Application config.
+        """
         self.sf = Salesforce(**cfg["salesforce"])
+        # Goals reading the same report share one fetch per tick
+        self.reports = ReportCache(self.sf.get_report, self.app.get("report_ttl", 0))
         self.asana = Asana(**cfg["asana"])
-        self.goals = cfg["goals"]
+        self.batch = None
+        if self.app.get("batch_writes"):
+            self.batch = self.asana.batch(
+                linger=self.app.get("batch_linger", DEFAULT_BATCH_LINGER)
+            )
 
-    def loop(self) -> None:
+    def schedules(self) -> Dict[str, str]:
+        """
+        Returns the cron string of each goal, which is the app one unless the
+        goal has its own.
+        """
+        return {
+            goal: self.goals[goal].get("cron_string", self.app["cron_string"])
+            for goal in self.graph.order
+        }
+
+    def loop(self, goals: Optional[Iterable[str]] = None) -> None:
         """
         Main loop iteration
+        :param goals: Goals to sync, all of them by default. Composite goals
+                      use the latest values of subgoals not in this list.
         """
-        # Reset synced dict
-        self.synced = {}
-        # Sync each goal
-        for goal in self.app["goals"]:
-            self.sync_goal(goal)
+        graph = self.graph if goals is None else self.graph.subset(goals)
+        with self._ticks_lock:
+            self.ticks += 1
+        # Runs can overlap, each reads reports in its own tick
+        tick = self.reports.new_tick()
+        # Sync each goal, subgoals first
+        try:
+            graph.run(partial(self.sync_goal, tick=tick), self.concurrency)
+        finally:
+            self.reports.end_tick(tick)
+            self.state.save()
+
+    def force_refresh(self, goal: str, goal_id: str) -> bool:
+        """
+        Counts a sync of a goal, and tells whether this one writes the goal
+        whether it changed or not, to catch up with edits made in Asana.
+        Syncs are counted per goal, so goals on their own schedules are
+        refreshed as often as the others.
+        :param goal: Goal config key.
+        :param goal_id: Asana goal GID the config key points at.
+        """
+        syncs = self.state.count_sync(goal, goal_id)
+        return bool(self.force_refresh_every) and syncs % self.force_refresh_every == 0
 
-    def sync_goal(self, goal: str) -> Goal:
+    def sync_goal(self, goal: str, tick: Optional[int] = None) -> Goal:
         """
         Synchronize a goal between systems. This fetches the goal updated value
         from a data source and uploads the new value to Asana.
         :param goal: Goal config key.
+        :param tick: Report cache tick of the run, see ReportCache.new_tick.
         :return:
         """
-        # Handle a double sync
-        if goal in self.synced:
-            return self.synced[goal]
-        # Handle the case where the goal is not configured
-        try:
-            goal_obj = self.goals[goal]
-        except KeyError:
-            goal_obj = None
-            logging.getLogger(__name__).error(
-                "Configuration error: Referenced goal '%s' does not exist.",
-                goal,
-            )
-            exit(-1)
+        goal_obj = self.goals[goal]
+        goal_id = goal_obj["goal_id"]
+        force = self.force_refresh(goal, goal_id)
         # Update the goal value
-        value = self.get_value(goal_obj)
+        value = self.handlers[goal](goal_obj, tick)
 
         if goal_obj["source"] != "asana":
-            upd = self.asana.set_metric_current_value(goal_obj["goal_id"], value)
-            logging.getLogger(__name__).info(
-                "Updating goal '%s' value to '%s'",
-                goal, value,
-            )
+            upd = self.state.goal(goal, goal_id)
+            if force or upd is None or self.state.value_changed(goal, goal_id, value):
+                upd = self.set_metric_current_value(goal_id, value)
+                self.state.record(goal, goal_id, upd, value=value)
+                logging.getLogger(__name__).info(
+                    "Updating goal '%s' value to '%s'",
+                    goal, value,
+                )
         else:
-            upd = self.asana.get_metric_current_value(goal_obj["goal_id"])
+            upd = self.asana.get_metric_current_value(goal_id)
 
-        upd = self.asana.update_goal_status(goal_obj["goal_id"], upd.assess_status())
+        status = upd.assess_status()
+        if force or self.state.status_changed(goal, goal_id, status):
+            upd = self.update_goal_status(goal_id, status)
+            self.state.record(goal, goal_id, upd, status=status)
         # Remember we just synced this Goal
         self.synced[goal] = upd
         return upd
 
+    def set_metric_current_value(self, goal_id: str, value: AnyNumber) -> Goal:
+        """
+        Writes a goal value, batched with the writes of other goals if
+        batching is on.
+        """
+        if self.batch is None:
+            return self.asana.set_metric_current_value(goal_id, value)
+        return self.batch.wait(self.batch.set_metric_current_value(goal_id, value))
+
+    def update_goal_status(self, goal_id: str, status: GoalStatus) -> Goal:
+        """
+        Writes a goal status, batched with the writes of other goals if
+        batching is on.
+        """
+        if self.batch is None:
+            return self.asana.update_goal_status(goal_id, status)
+        return self.batch.wait(self.batch.update_goal_status(goal_id, status))
+
+    def goals_changed(self, goal_gids: List[str]) -> None:
+        """
+        Syncs the goals above Asana goals that changed, e.g. because their
+        target was edited, without waiting for their schedules. Goals whose
+        value comes from Asana are synced again too.
+        :param goal_gids: GIDs of the Asana goals that changed.
+        """
+        changed = self.changed_goals(goal_gids)
+        for goal in changed:
+            if self.goals[goal]["source"] != "asana":
+                # Composite goals above it read this record
+                self.synced[goal] = self.asana.get_goal(self.goals[goal]["goal_id"])
+        self.request_sync(self.resync_goals(changed))
+
+    def reports_changed(self, report_ids: List[str]) -> None:
+        """
+        Syncs the goals reading Salesforce reports that changed, and the goals
+        above them, without waiting for their schedules.
+        :param report_ids: IDs of the Salesforce reports that changed.
+        """
+        changed = []
+        for report_id in report_ids:
+            self.reports.invalidate(report_id)
+            changed.extend(self.graph.by_report_id.get(report_id, []))
+        self.request_sync(changed + self.graph.ancestors(changed))
+
+    def changed_goals(self, goal_gids: List[str]) -> List[str]:
+        """
+        Returns the config keys of the goals with the given Asana GIDs.
+        """
+        return [goal for gid in goal_gids for goal in self.graph.by_goal_id.get(gid, [])]
 
-    def get_value(self, goal_obj: dict) -> AnyNumber:
+    def resync_goals(self, changed: List[str]) -> List[str]:
+        """
+        Returns the goals to sync after Asana goals changed: the ones reading
+        their value from Asana, and every goal above them.
+        """
+        return [
+            goal for goal in changed if self.goals[goal]["source"] == "asana"
+        ] + self.graph.ancestors(changed)
+
+    def request_sync(self, goals: List[str]) -> None:
+        """
+        Has the service sync goals as soon as possible. Composite goals not
+        in the list keep their latest values.
+        """
+        if not goals:
+            return
+        logging.getLogger(__name__).info("Changes notified, syncing goals: %s", ", ".join(goals))
+        self.scheduler.request(goals)
+        self._wakeup.set()
+
+    def start_receiver(self) -> None:
+        """
+        Starts receiving change notifications, and establishes the missing
+        webhooks.
+        """
+        self.receiver.start()
+        try:
+            me = self.asana.get_me()
+        except requests.RequestException:
+            logging.getLogger(__name__).exception(
+                "Could not look up the Asana user, syncing after every goal event",
+            )
+        else:
+            # Events of our own writes are dropped
+            self.receiver.own_user_gid = me["gid"]
+            self.check_webhooks([w["gid"] for w in me.get("workspaces", [])])
+        self.create_webhooks()
+
+    def check_webhooks(self, workspace_gids: List[str]) -> None:
+        """
+        Forgets the webhooks that were deleted in Asana, or that send their
+        events elsewhere, so create_webhooks establishes them again.
+        :param workspace_gids: Workspaces the webhooks may be in.
+        """
+        if self.receiver.public_url is None:
+            return
+        try:
+            webhooks = [
+                webhook
+                for workspace_gid in workspace_gids
+                for webhook in self.asana.get_webhooks(workspace_gid)
+            ]
+        except requests.RequestException:
+            logging.getLogger(__name__).exception("Could not list the Asana webhooks")
+            return
+        self._forget_missing_webhooks(webhooks)
+
+    def _forget_missing_webhooks(self, webhooks: List[dict]) -> None:
+        active = {
+            webhook["resource"]["gid"]
+            for webhook in webhooks
+            if webhook.get("active", True)
+            and webhook["target"] == self.receiver.webhook_target(webhook["resource"]["gid"])
+        }
+        for goal_gid in self.graph.by_goal_id:
+            if self.receiver.has_webhook(goal_gid) and goal_gid not in active:
+                logging.getLogger(__name__).warning(
+                    "Webhook of goal %s no longer exists in Asana, establishing it again",
+                    goal_gid,
+                )
+                self.receiver.forget_webhook(goal_gid)
+
+    def create_webhooks(self) -> None:
+        """
+        Establishes a webhook for each goal that has none yet, if the
+        receiver has a public URL Asana can reach.
+        """
+        if self.receiver.public_url is None:
+            return
+        for goal_gid in self.graph.by_goal_id:
+            if self.receiver.has_webhook(goal_gid):
+                continue
+            try:
+                with self.receiver.expect_handshake(goal_gid):
+                    self.asana.create_webhook(
+                        goal_gid, self.receiver.webhook_target(goal_gid)
+                    )
+            except requests.RequestException:
+                logging.getLogger(__name__).exception(
+                    "Could not establish a webhook for goal %s", goal_gid,
+                )
+
+    def get_value(self, goal_obj: dict, tick: Optional[int] = None) -> AnyNumber:
         """
         Gets a the new value for the given goal dict using a handler function
         depending on said goal's source.
         :param goal_obj: Configured goal
+        :param tick: Report cache tick of the run, see ReportCache.new_tick.
         :return:
         """
-        source = goal_obj["source"]
         # Get a handler function depending on where this goal is coming from
-        f = getattr(self, "get_value_" + source)
-        if f is None:
-            raise KeyError(f"Source {source} not managed.")
+        f = self.get_handler(goal_obj["source"])
         # Use the handle function to get the updated value
-        return f(goal_obj)
+        return f(goal_obj, tick)
 
-    def get_value_composite(self, goal_obj: dict) -> AnyNumber:
+    def get_handler(self, source: str) -> Callable[[dict, Optional[int]], AnyNumber]:
+        """
+        Gets the handler function getting the values of goals with the given
+        source.
+        :param source: Goal source, e.g. "salesforce_report".
+        :return:
+        """
+        f = getattr(self, "get_value_" + source, None)
+        if f is None:
+            raise ConfigurationError(f"Source {source} not managed")
+        return f
+
+    def get_value_composite(self, goal_obj: dict, tick: Optional[int] = None) -> AnyNumber:
         """
         Gets a new value calculated from multiple subgoals.
         """
         subsum = 0
         for subgoal, weight in zip(goal_obj["subgoals"], goal_obj["weights"]):
-            sg = self.sync_goal(subgoal)
+            # Subgoals due in this run were synced first
+            sg = self.synced.get(subgoal) or self.sync_goal(subgoal, tick)
             subsum += (sg.current_value / sg.target_value) * weight
         return subsum
 
-    def get_value_fixed(self, goal_obj: dict) -> AnyNumber:
+    def get_value_fixed(self, goal_obj: dict, tick: Optional[int] = None) -> AnyNumber:
         """
         Gets a fixed value from config.
         """
         return goal_obj["value"]
  
-    def get_value_salesforce_report(self, goal_obj: dict) -> AnyNumber:
+    def get_value_salesforce_report(self, goal_obj: dict, tick: Optional[int] = None) -> AnyNumber:
         """
         Gets a new value from a Salesforce report aggregate.
         """
-        rpt = self.sf.get_report(goal_obj["sf_report_id"])
+        rpt = self.reports.get_report(goal_obj["sf_report_id"], tick)
         return rpt.get_metric(goal_obj["sf_metric"])
 
-    def get_value_asana(self, goal_obj: dict) -> AnyNumber:
+    def get_value_asana(self, goal_obj: dict, tick: Optional[int] = None) -> AnyNumber:
         """
         Gets latest value from Asana goals.
         """
@@ -158,17 +413,49 @@ class MainProcess:
         """
         if self.service:
             self.shutdown = False
-            self.cron = croniter(self.app["cron_string"])
-            next_run = self.cron.get_next()
-            while not self.shutdown:
-                if time() > next_run:
-                    self.loop()
-                    next_run = self.cron.get_next()
-                sleep(5)
+            if self.receiver is not None:
+                self.start_receiver()
+            try:
+                self.serve()
+            finally:
+                if self.receiver is not None:
+                    self.receiver.stop()
         else:
             self.loop()
         return 0
 
+    def serve(self) -> None:
+        """
+        Syncs goals as they come due, sleeping until the next one is. Each
+        batch of due goals runs in the background, so a slow sync does not
+        hold back goals on other schedules.
+        """
+        with ThreadPoolExecutor(max_workers=max(len(self.graph.order), 1)) as runs:
+            while not self.shutdown:
+                self._wakeup.clear()
+                goals = self.scheduler.take_due()
+                if goals:
+                    logging.getLogger(__name__).info("Syncing goals: %s", ", ".join(goals))
+                    future = runs.submit(self.loop, goals)
+                    future.add_done_callback(partial(self._run_finished, goals))
+                self._wakeup.wait(self.scheduler.sleep_time())
+
+    def stop(self) -> None:
+        """
+        Stops serving once the running syncs are done.
+        """
+        self.shutdown = True
+        self._wakeup.set()
+
+    def _run_finished(self, goals: List[str], future: Future) -> None:
+        self.scheduler.finished(goals)
+        if future.exception() is not None:
+            logging.getLogger(__name__).error(
+                "Sync of goals %s failed", ", ".join(goals), exc_info=future.exception(),
+            )
+        # Goals queued while this run was going may be due now
+        self._wakeup.set()
+
 
 def setup_argument_parser(parser: ArgumentParser):
     parser.add_argument(
@@ -182,6 +469,12 @@ def setup_argument_parser(parser: ArgumentParser):
         help="runs this program as a background service",
         action="store_true"
     )
+    parser.add_argument(
+        "-a", "--async",
+        help="syncs goals as asyncio tasks instead of threads (requires aiohttp)",
+        action="store_true",
+        dest="use_async",
+    )
     parser.add_argument(
         "-i", "--initialize",
         help="using the provided access token, helps to generate goal entries "
@@ -210,7 +503,15 @@ def main():
             args.config_file, args.initialize, args.workspace, args.time_period
         )
     else:
-        process = MainProcess(args.config_file, args.service)
+        process_class = MainProcess
+        if args.use_async:
+            from asana_goals.aio import AsyncMainProcess
+            process_class = AsyncMainProcess
+        try:
+            process = process_class(args.config_file, args.service)
+        except ConfigurationError:
+            # Already logged
+            exit(-1)
 
     status = process.main()
     logging.getLogger(__name__).info("Process finished, shutting down.")
@@ -0,0 +1,250 @@
+"""
+Asyncio version of the main process: goals are synced as tasks on one event
+loop instead of threads. Requires the optional aiohttp dependency
+(pip install "asana_goals[async]").
+"""
+import asyncio
+import logging
+from functools import partial
+from typing import Iterable, List, Optional
+
+import requests
+
+from asana_goals.__main__ import AnyNumber, MainProcess
+from asana_goals.asana.aio import AsyncAsana
+from asana_goals.asana.goal import Goal
+from asana_goals.data_source.salesforce.aio import AsyncReportCache, AsyncSalesforce
+
+__all__ = ["AsyncMainProcess"]
+
+
+class AsyncMainProcess(MainProcess):
+    """
+    MainProcess running each tick on an event loop. The [app] concurrency
+    setting bounds how many goals sync at once, and the pool_size of the
+    Asana config how many connections they share, so it can be set much
+    higher than with threads.
+    """
+    asana: AsyncAsana
+    sf: AsyncSalesforce
+    reports: AsyncReportCache
+
+    def setup_clients(self, cfg: dict) -> None:
+        """
+        Creates the asyncio API clients from the config.
+        :param cfg: Application config.
+        """
+        self.sf = AsyncSalesforce(**cfg["salesforce"])
+        self.reports = AsyncReportCache(self.sf.get_report, self.app.get("report_ttl", 0))
+        self.asana = AsyncAsana(**cfg["asana"])
+        self.batch = None
+        if self.app.get("batch_writes"):
+            logging.getLogger(__name__).warning(
+                "batch_writes is not supported by the async process, ignoring it"
+            )
+
+    async def loop(self, goals: Optional[Iterable[str]] = None) -> None:
+        """
+        See MainProcess.loop.
+        """
+        graph = self.graph if goals is None else self.graph.subset(goals)
+        self.ticks += 1
+        tick = self.reports.new_tick()
+        try:
+            await graph.run_async(partial(self.sync_goal, tick=tick), self.concurrency)
+        finally:
+            self.reports.end_tick(tick)
+            self.state.save()
+
+    async def sync_goal(self, goal: str, tick: Optional[int] = None) -> Goal:
+        """
+        See MainProcess.sync_goal.
+        """
+        goal_obj = self.goals[goal]
+        goal_id = goal_obj["goal_id"]
+        force = self.force_refresh(goal, goal_id)
+        value = await self.handlers[goal](goal_obj, tick)
+
+        if goal_obj["source"] != "asana":
+            upd = self.state.goal(goal, goal_id)
+            if force or upd is None or self.state.value_changed(goal, goal_id, value):
+                upd = await self.asana.set_metric_current_value(goal_id, value)
+                self.state.record(goal, goal_id, upd, value=value)
+                logging.getLogger(__name__).info(
+                    "Updating goal '%s' value to '%s'",
+                    goal, value,
+                )
+        else:
+            upd = await self.asana.get_metric_current_value(goal_id)
+
+        status = upd.assess_status()
+        if force or self.state.status_changed(goal, goal_id, status):
+            upd = await self.asana.update_goal_status(goal_id, status)
+            self.state.record(goal, goal_id, upd, status=status)
+        self.synced[goal] = upd
+        return upd
+
+    def goals_changed(self, goal_gids: List[str]) -> None:
+        """
+        See MainProcess.goals_changed. Called by the receiver thread, so the
+        work is handed to the event loop.
+        """
+        asyncio.run_coroutine_threadsafe(
+            self._goals_changed(goal_gids), self._loop
+        ).result()
+
+    async def _goals_changed(self, goal_gids: List[str]) -> None:
+        changed = self.changed_goals(goal_gids)
+        for goal in changed:
+            if self.goals[goal]["source"] != "asana":
+                self.synced[goal] = await self.asana.get_goal(self.goals[goal]["goal_id"])
+        self.request_sync(self.resync_goals(changed))
+
+    def reports_changed(self, report_ids: List[str]) -> None:
+        """
+        See MainProcess.reports_changed. Called by the receiver thread, so the
+        work is handed to the event loop.
+        """
+        self._loop.call_soon_threadsafe(super().reports_changed, report_ids)
+
+    async def start_receiver(self) -> None:
+        """
+        See MainProcess.start_receiver.
+        """
+        self.receiver.start()
+        try:
+            me = await self.asana.get_me()
+        except requests.RequestException:
+            logging.getLogger(__name__).exception(
+                "Could not look up the Asana user, syncing after every goal event",
+            )
+        else:
+            self.receiver.own_user_gid = me["gid"]
+            await self.check_webhooks([w["gid"] for w in me.get("workspaces", [])])
+        await self.create_webhooks()
+
+    async def check_webhooks(self, workspace_gids: List[str]) -> None:
+        """
+        See MainProcess.check_webhooks.
+        """
+        if self.receiver.public_url is None:
+            return
+        try:
+            webhooks = []
+            for workspace_gid in workspace_gids:
+                webhooks.extend(await self.asana.get_webhooks(workspace_gid))
+        except requests.RequestException:
+            logging.getLogger(__name__).exception("Could not list the Asana webhooks")
+            return
+        self._forget_missing_webhooks(webhooks)
+
+    async def create_webhooks(self) -> None:
+        """
+        See MainProcess.create_webhooks.
+        """
+        if self.receiver.public_url is None:
+            return
+        for goal_gid in self.graph.by_goal_id:
+            if self.receiver.has_webhook(goal_gid):
+                continue
+            try:
+                with self.receiver.expect_handshake(goal_gid):
+                    await self.asana.create_webhook(
+                        goal_gid, self.receiver.webhook_target(goal_gid)
+                    )
+            except requests.RequestException:
+                logging.getLogger(__name__).exception(
+                    "Could not establish a webhook for goal %s", goal_gid,
+                )
+
+    async def get_value(self, goal_obj: dict, tick: Optional[int] = None) -> AnyNumber:
+        """
+        See MainProcess.get_value.
+        """
+        return await self.get_handler(goal_obj["source"])(goal_obj, tick)
+
+    async def get_value_composite(self, goal_obj: dict, tick: Optional[int] = None) -> AnyNumber:
+        """
+        See MainProcess.get_value_composite.
+        """
+        subsum = 0
+        for subgoal, weight in zip(goal_obj["subgoals"], goal_obj["weights"]):
+            sg = self.synced.get(subgoal) or await self.sync_goal(subgoal, tick)
+            subsum += (sg.current_value / sg.target_value) * weight
+        return subsum
+
+    async def get_value_fixed(self, goal_obj: dict, tick: Optional[int] = None) -> AnyNumber:
+        """
+        See MainProcess.get_value_fixed.
+        """
+        return goal_obj["value"]
+
+    async def get_value_salesforce_report(self, goal_obj: dict,
+                                          tick: Optional[int] = None) -> AnyNumber:
+        """
+        See MainProcess.get_value_salesforce_report.
+        """
+        rpt = await self.reports.get_report(goal_obj["sf_report_id"], tick)
+        return rpt.get_metric(goal_obj["sf_metric"])
+
+    async def get_value_asana(self, goal_obj: dict, tick: Optional[int] = None) -> AnyNumber:
+        """
+        See MainProcess.get_value_asana.
+        """
+        await self.asana.get_metric_current_value(goal_obj["goal_id"])
+        return 1.1
+
+    def main(self) -> int:
+        """
+        Main function. Return exit status code.
+        """
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            return loop.run_until_complete(self.main_async())
+        finally:
+            loop.close()
+
+    async def main_async(self) -> int:
+        """
+        Coroutine running the process until it shuts down.
+        """
+        self._loop = asyncio.get_event_loop()
+        try:
+            if self.service:
+                self.shutdown = False
+                if self.receiver is not None:
+                    await self.start_receiver()
+                try:
+                    await self.serve()
+                finally:
+                    if self.receiver is not None:
+                        self.receiver.stop()
+            else:
+                await self.loop()
+        finally:
+            await self.asana.close()
+            await self.sf.close()
+        return 0
+
+    async def serve(self) -> None:
+        """
+        See MainProcess.serve. Each batch of due goals runs as a task.
+        """
+        self._wakeup = asyncio.Event()
+        runs = set()
+        while not self.shutdown:
+            self._wakeup.clear()
+            goals = self.scheduler.take_due()
+            if goals:
+                logging.getLogger(__name__).info("Syncing goals: %s", ", ".join(goals))
+                run = asyncio.ensure_future(self.loop(goals))
+                run.add_done_callback(partial(self._run_finished, goals))
+                run.add_done_callback(runs.discard)
+                runs.add(run)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.scheduler.sleep_time())
+            except asyncio.TimeoutError:
+                pass
+        if runs:
+            await asyncio.wait(runs)
@@ -1,3 +1,4 @@
+from .batch import AsanaBatch, BatchActionError
 from .client import Asana
 
-__all__ = ["Asana"]
+__all__ = ["Asana", "AsanaBatch", "BatchActionError"]
@@ -0,0 +1,179 @@
+"""
+Asyncio counterpart of the Asana client. Requires the optional aiohttp
+dependency (pip install "asana_goals[async]").
+"""
+from typing import Union, List
+
+from asana_goals.util.aio_session import AsyncSession, debug_async_response
+from asana_goals.util.session import (
+    DEFAULT_POOL_SIZE,
+    DEFAULT_MAX_RETRIES,
+    DEFAULT_BACKOFF_FACTOR,
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_READ_TIMEOUT,
+)
+
+from .goal import Goal, GoalStatus
+
+__all__ = ["AsyncAsana"]
+
+BASE_URL = "https://app.asana.com/api/1.0"
+
+
+class AsyncAsana:
+    def __init__(
+        self,
+        access_token: str,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        backoff_factor: float = DEFAULT_BACKOFF_FACTOR,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        read_timeout: float = DEFAULT_READ_TIMEOUT,
+    ) -> None:
+        """
+        Asyncio version of the Asana client, with the same methods as
+        coroutines. At most pool_size calls are open at once, any more wait
+        for a connection.
+        :param access_token: Asana API access token.
+        :param pool_size: Connections kept open to the Asana API.
+        :param max_retries: Retries of a call before giving up.
+        :param backoff_factor: Base of the exponential backoff between
+                               retries, in seconds. A Retry-After header
+                               takes precedence.
+        :param connect_timeout: Seconds to wait for a connection.
+        :param read_timeout: Seconds to wait for a response.
+        """
+        self._access_token = access_token
+        self._session = AsyncSession(
+            pool_size=pool_size,
+            max_retries=max_retries,
+            backoff_factor=backoff_factor,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+        )
+
+    async def __aenter__(self) -> "AsyncAsana":
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        """
+        Closes the connections to the Asana API.
+        """
+        await self._session.close()
+
+    async def _request(self, method: str, path: str, **kwargs) -> dict:
+        resp = await self._session.request(
+            method, BASE_URL + path, token=self._access_token, **kwargs
+        )
+        debug_async_response(__name__, resp)
+        resp.raise_for_status()
+        return resp.json()
+
+    async def get_workspaces(self) -> List[dict]:
+        """
+        See Asana.get_workspaces.
+        """
+        return (await self._request("GET", "/workspaces"))["data"]
+
+    async def get_me(self) -> dict:
+        """
+        See Asana.get_me.
+        """
+        j = await self._request("GET", "/users/me")
+        return j["data"]
+
+    async def get_time_periods_for_workspace(self, workspace_gid: str) -> List[dict]:
+        """
+        See Asana.get_time_periods_for_workspace.
+        """
+        j = await self._request("GET", "/time_periods", params={
+            "workspace": workspace_gid,
+        })
+        return j["data"]
+
+    async def create_goal(self, goal: Union[Goal, dict]) -> Goal:
+        """
+        See Asana.create_goal.
+        """
+        if isinstance(goal, Goal):
+            goal = goal.source
+        return Goal(await self._request("POST", "/goals/", json=goal))
+
+    async def create_goal_metric(self, goal_gid: str, metric: dict) -> Goal:
+        """
+        See Asana.create_goal_metric.
+        """
+        return Goal(await self._request(
+            "POST", f"/goals/{goal_gid}/setMetric", json={"data": metric}
+        ))
+
+    async def add_subgoal(self, parent_goal_gid: str, child_goal_gid: str) -> None:
+        """
+        See Asana.add_subgoal.
+        """
+        await self._request(
+            "POST", f"/goals/{parent_goal_gid}/addSubgoal",
+            json={"data": {"subgoal": child_goal_gid}},
+        )
+
+    async def update_goal_status(self, goal_gid: str, status: GoalStatus) -> Goal:
+        """
+        See Asana.update_goal_status.
+        """
+        return Goal(await self._request(
+            "PUT", f"/goals/{goal_gid}", json={"data": {"status": status.value}}
+        ))
+
+    async def set_metric_current_value(self, goal_gid: str, value: Union[str, int, float]) -> Goal:
+        """
+        See Asana.set_metric_current_value.
+        """
+        return Goal(await self._request(
+            "POST", f"/goals/{goal_gid}/setMetricCurrentValue",
+            json={"data": {"current_number_value": value}},
+        ))
+
+    async def get_metric_current_value(self, goal_gid: str) -> Goal:
+        """
+        See Asana.get_metric_current_value.
+        """
+        return Goal(await self._request("GET", f"/goals/{goal_gid}"))
+
+    async def get_goal(self, goal_gid: str) -> Goal:
+        """
+        See Asana.get_goal.
+        """
+        return Goal(await self._request("GET", f"/goals/{goal_gid}"))
+
+    async def create_webhook(self, resource_gid: str, target: str) -> dict:
+        """
+        See Asana.create_webhook.
+        """
+        j = await self._request("POST", "/webhooks", json={"data": {
+            "resource": resource_gid,
+            "target": target,
+        }})
+        return j["data"]
+
+    async def get_webhooks(self, workspace_gid: str) -> List[dict]:
+        """
+        See Asana.get_webhooks.
+        """
+        webhooks = []
+        params = {"workspace": workspace_gid, "limit": 100}
+        while True:
+            j = await self._request("GET", "/webhooks", params=params)
+            webhooks.extend(j["data"])
+            if not j.get("next_page"):
+                return webhooks
+            params["offset"] = j["next_page"]["offset"]
+
+    async def send_batch(self, actions: List[dict]) -> List[dict]:
+        """
+        See Asana.send_batch.
+        """
+        j = await self._request("POST", "/batch", json={"data": {"actions": actions}})
+        return j["data"]
@@ -0,0 +1,171 @@
+"""
+Batching of Asana write actions through the batch API.
+"""
+import threading
+from concurrent.futures import Future, TimeoutError
+from typing import Any, Callable, List, NamedTuple, Optional, Union
+
+import requests
+
+from .goal import Goal, GoalStatus
+
+__all__ = ["MAX_BATCH_ACTIONS", "AsanaBatch", "BatchActionError"]
+
+# Most actions the batch API accepts in one request
+MAX_BATCH_ACTIONS = 10
+
+
+class BatchActionError(requests.HTTPError):
+    """
+    An action of a batch failed, while the batch request itself succeeded.
+    """
+    status_code: int
+    errors: List[dict]
+
+    def __init__(self, status_code: int, errors: List[dict], action: dict) -> None:
+        self.status_code = status_code
+        self.errors = errors
+        messages = "; ".join(e.get("message", "") for e in errors)
+        super().__init__(
+            f"{status_code} error in batch action "
+            f"{action['method'].upper()} {action['relative_path']}: {messages}"
+        )
+
+
+class _Action(NamedTuple):
+    # Action as sent to the batch API
+    request: dict
+    # Turns the response body into the result of the future
+    wrap: Callable[[Optional[dict]], Any]
+    future: Future
+
+
+class AsanaBatch:
+    """
+    Queues write actions and sends them to the Asana batch API, up to
+    MAX_BATCH_ACTIONS per request. Each queued action returns a Future that
+    resolves to what the matching Asana method returns, or raises a
+    BatchActionError if that action failed.
+    Actions of one batch are not guaranteed to run in order, so actions
+    depending on each other must go in separate batches.
+    Actions can be queued from several threads. A thread waiting on its
+    action with wait() sends the queue after lingering for other threads to
+    add theirs.
+    """
+
+    def __init__(self, asana, linger: float = 0) -> None:
+        """
+        Initialize an empty batch.
+        :param asana: Asana client to send the batches with.
+        :param linger: Seconds wait() lets the queue fill before sending it.
+        """
+        self._asana = asana
+        self.linger = linger
+        self._pending = []  # type: List[_Action]
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "AsanaBatch":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.flush()
+
+    def create_goal(self, goal: Union[Goal, dict]) -> Future:
+        """
+        Queues the creation of a goal. See Asana.create_goal.
+        """
+        if isinstance(goal, Goal):
+            goal = goal.source
+        return self._queue("post", "/goals", goal["data"], Goal)
+
+    def create_goal_metric(self, goal_gid: str, metric: dict) -> Future:
+        """
+        Queues the creation of a goal metric. See Asana.create_goal_metric.
+        """
+        return self._queue("post", f"/goals/{goal_gid}/setMetric", metric, Goal)
+
+    def add_subgoal(self, parent_goal_gid: str, child_goal_gid: str) -> Future:
+        """
+        Queues adding a subgoal to a goal. See Asana.add_subgoal.
+        """
+        return self._queue(
+            "post", f"/goals/{parent_goal_gid}/addSubgoal",
+            {"subgoal": child_goal_gid}, lambda body: None,
+        )
+
+    def update_goal_status(self, goal_gid: str, status: GoalStatus) -> Future:
+        """
+        Queues a goal status update. See Asana.update_goal_status.
+        """
+        return self._queue("put", f"/goals/{goal_gid}", {"status": status.value}, Goal)
+
+    def set_metric_current_value(self, goal_gid: str, value: Union[str, int, float]) -> Future:
+        """
+        Queues a goal metric value update. See Asana.set_metric_current_value.
+        """
+        return self._queue(
+            "post", f"/goals/{goal_gid}/setMetricCurrentValue",
+            {"current_number_value": value}, Goal,
+        )
+
+    def wait(self, future: Future) -> Any:
+        """
+        Waits for a queued action, sending the queue if no other thread sent
+        it within the linger time.
+        :param future: Future returned when queueing the action.
+        :return: Result of the action.
+        """
+        try:
+            return future.result(timeout=self.linger)
+        except TimeoutError:
+            self.flush()
+            return future.result()
+
+    def flush(self) -> None:
+        """
+        Sends every queued action.
+        """
+        while True:
+            with self._lock:
+                actions = self._pending[:MAX_BATCH_ACTIONS]
+                del self._pending[:MAX_BATCH_ACTIONS]
+            if not actions:
+                return
+            self._send(actions)
+
+    def _queue(self, method: str, relative_path: str, data: dict,
+               wrap: Callable[[Optional[dict]], Any]) -> Future:
+        action = _Action(
+            {"method": method, "relative_path": relative_path, "data": data},
+            wrap,
+            Future(),
+        )
+        with self._lock:
+            self._pending.append(action)
+            full = len(self._pending) >= MAX_BATCH_ACTIONS
+        if full:
+            self.flush()
+        return action.future
+
+    def _send(self, actions: List[_Action]) -> None:
+        try:
+            results = self._asana.send_batch([action.request for action in actions])
+        except Exception as e:
+            for action in actions:
+                action.future.set_exception(e)
+            return
+
+        # Results come back in the order of the actions
+        for action, result in zip(actions, results):
+            body = result.get("body")
+            if result["status_code"] >= 400:
+                action.future.set_exception(BatchActionError(
+                    result["status_code"], (body or {}).get("errors", []), action.request,
+                ))
+            else:
+                action.future.set_result(action.wrap(body))
+        for action in actions[len(results):]:
+            action.future.set_exception(requests.HTTPError(
+                "No result for batch action "
+                f"{action.request['method'].upper()} {action.request['relative_path']}"
+            ))
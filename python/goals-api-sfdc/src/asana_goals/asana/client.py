@@ -4,23 +4,54 @@ recommended to add parse_float=Decimal as an argument to the json() calls.
 """
 from typing import Union, List
 
-import requests
-
 from asana_goals.util.bearer_auth import HTTPBearerAuth
 from asana_goals.util.log_requests import debug_response
+from asana_goals.util.session import (
+    make_session,
+    DEFAULT_POOL_SIZE,
+    DEFAULT_MAX_RETRIES,
+    DEFAULT_BACKOFF_FACTOR,
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_READ_TIMEOUT,
+)
 
+from .batch import AsanaBatch
 from .goal import Goal, GoalStatus
 
 __all__ = ["Asana"]
 
 
 class Asana:
-    def __init__(self, access_token: str) -> None:
+    def __init__(
+        self,
+        access_token: str,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        backoff_factor: float = DEFAULT_BACKOFF_FACTOR,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        read_timeout: float = DEFAULT_READ_TIMEOUT,
+    ) -> None:
         """
-        Lightweight Asana API client for the Goal API.
+        Lightweight Asana API client for the Goal API. Every call goes through
+        one shared session, which keeps connections alive, retries rate
+        limited (429) and failed calls, and times out stalled ones.
         :param access_token: Asana API access token.
+        :param pool_size: Connections kept open to the Asana API.
+        :param max_retries: Retries of a call before giving up.
+        :param backoff_factor: Base of the exponential backoff between
+                               retries, in seconds. A Retry-After header
+                               takes precedence.
+        :param connect_timeout: Seconds to wait for a connection.
+        :param read_timeout: Seconds to wait for a response.
         """
         self._access_token = access_token
+        self._session = make_session(
+            pool_size=pool_size,
+            max_retries=max_retries,
+            backoff_factor=backoff_factor,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+        )
 
     def get_workspaces(self) -> List[dict]:
         """
@@ -29,7 +60,7 @@ class Asana:
         See: https://developers.asana.com/docs/get-multiple-workspaces
         :return: List of Workspace records.
         """
-        resp = requests.get(
+        resp = self._session.get(
             "https://app.asana.com/api/1.0/workspaces",
             auth=HTTPBearerAuth(self._access_token),
         )
@@ -37,6 +68,20 @@ class Asana:
         resp.raise_for_status()
         return resp.json()["data"]
 
+    def get_me(self) -> dict:
+        """
+        Returns the record of the user the access token belongs to.
+        See: https://developers.asana.com/docs/get-a-user
+        :return: User record.
+        """
+        resp = self._session.get(
+            "https://app.asana.com/api/1.0/users/me",
+            auth=HTTPBearerAuth(self._access_token),
+        )
+        debug_response(__name__, resp)
+        resp.raise_for_status()
+        return resp.json()["data"]
+
     def get_time_periods_for_workspace(self, workspace_gid: str) -> List[dict]:
         """
         Returns compact time period records.
@@ -44,7 +89,7 @@ class Asana:
         :param workspace_gid: Workspace GID to search in.
         :return: List of Time Period records.
         """
-        resp = requests.get(
+        resp = self._session.get(
             "https://app.asana.com/api/1.0/time_periods",
             auth=HTTPBearerAuth(self._access_token),
             params={
@@ -64,7 +109,7 @@ class Asana:
         """
         if isinstance(goal, Goal):
             goal = goal.source
-        resp = requests.post(
+        resp = self._session.post(
             "https://app.asana.com/api/1.0/goals/",
             auth=HTTPBearerAuth(self._access_token),
             json=goal
@@ -81,7 +126,7 @@ class Asana:
         :param metric: Metric record to attach.
         :return: Modified Goal record.
         """
-        resp = requests.post(
+        resp = self._session.post(
             f"https://app.asana.com/api/1.0/goals/{goal_gid}/setMetric",
             auth=HTTPBearerAuth(self._access_token),
             json={"data": metric}
@@ -98,7 +143,7 @@ class Asana:
         :param child_goal_gid: Child Goal GID.
         :return:
         """
-        resp = requests.post(
+        resp = self._session.post(
             f"https://app.asana.com/api/1.0/goals/{parent_goal_gid}/addSubgoal",
             auth=HTTPBearerAuth(self._access_token),
             json={"data": {"subgoal": child_goal_gid}}
@@ -115,7 +160,7 @@ class Asana:
         :param status: Goal status as an enum.
         :return: Goal record.
         """
-        resp = requests.put(
+        resp = self._session.put(
             f"https://app.asana.com/api/1.0/goals/{goal_gid}",
             auth=HTTPBearerAuth(self._access_token),
             json={"data": {
@@ -134,7 +179,7 @@ class Asana:
         :param value: Value to set on the goal numeric value.
         :return:
         """
-        resp = requests.post(
+        resp = self._session.post(
             f"https://app.asana.com/api/1.0/goals/{goal_gid}/setMetricCurrentValue",
             auth=HTTPBearerAuth(self._access_token),
             json={"data": {
@@ -152,7 +197,7 @@ class Asana:
         :param goal_gid: Globally unique identifier for the Goal.
         :return:
         """
-        resp = requests.get(
+        resp = self._session.get(
             f"https://app.asana.com/api/1.0/goals/{goal_gid}",
             auth=HTTPBearerAuth(self._access_token)
         )
@@ -160,3 +205,92 @@ class Asana:
         debug_response(__name__, resp)
         resp.raise_for_status()
         return Goal(resp.json())
+
+    def get_goal(self, goal_gid: str) -> Goal:
+        """
+        Returns the complete Goal record.
+        See: https://developers.asana.com/docs/get-a-goal
+        :param goal_gid: Globally unique identifier for the Goal.
+        :return: Goal record.
+        """
+        resp = self._session.get(
+            f"https://app.asana.com/api/1.0/goals/{goal_gid}",
+            auth=HTTPBearerAuth(self._access_token)
+        )
+        debug_response(__name__, resp)
+        resp.raise_for_status()
+        return Goal(resp.json())
+
+    def create_webhook(self, resource_gid: str, target: str) -> dict:
+        """
+        Establishes a webhook sending the changes of a resource to a URL.
+        Asana confirms the target with a handshake request before this
+        returns, so the receiver has to be up already.
+        See: https://developers.asana.com/docs/establish-a-webhook
+        :param resource_gid: Globally unique identifier for e.g. a Goal.
+        :param target: URL events are POSTed to.
+        :return: Webhook record.
+        """
+        resp = self._session.post(
+            "https://app.asana.com/api/1.0/webhooks",
+            auth=HTTPBearerAuth(self._access_token),
+            json={"data": {
+                "resource": resource_gid,
+                "target": target,
+            }}
+        )
+        debug_response(__name__, resp)
+        resp.raise_for_status()
+        return resp.json()["data"]
+
+    def get_webhooks(self, workspace_gid: str) -> List[dict]:
+        """
+        Returns the webhooks the access token established in a workspace.
+        See: https://developers.asana.com/docs/get-multiple-webhooks
+        :param workspace_gid: Workspace GID to search in.
+        :return: List of Webhook records.
+        """
+        webhooks = []
+        params = {"workspace": workspace_gid, "limit": 100}
+        while True:
+            resp = self._session.get(
+                "https://app.asana.com/api/1.0/webhooks",
+                auth=HTTPBearerAuth(self._access_token),
+                params=params,
+            )
+            debug_response(__name__, resp)
+            resp.raise_for_status()
+            j = resp.json()
+            webhooks.extend(j["data"])
+            if not j.get("next_page"):
+                return webhooks
+            params["offset"] = j["next_page"]["offset"]
+
+    def batch(self, linger: float = 0) -> AsanaBatch:
+        """
+        Returns a batch queueing write actions, to send them in as few
+        requests as possible. Use it as a context manager to send what is
+        left in it on exit.
+        :param linger: Seconds AsanaBatch.wait lets the queue fill before
+                       sending it.
+        :return: Empty batch.
+        """
+        return AsanaBatch(self, linger)
+
+    def send_batch(self, actions: List[dict]) -> List[dict]:
+        """
+        Submits parallel actions in one request.
+        See: https://developers.asana.com/docs/submit-parallel-requests
+        :param actions: Action records (method, relative_path and data), at
+                        most 10.
+        :return: Response of each action (status_code, headers and body), in
+                 the order of the actions.
+        """
+        resp = self._session.post(
+            "https://app.asana.com/api/1.0/batch",
+            auth=HTTPBearerAuth(self._access_token),
+            json={"data": {"actions": actions}}
+        )
+        debug_response(__name__, resp)
+        resp.raise_for_status()
+        return resp.json()["data"]
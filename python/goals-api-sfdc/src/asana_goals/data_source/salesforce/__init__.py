@@ -1,3 +1,4 @@
+from .cache import ReportCache
 from .client import Salesforce
 
-__all__ = ["Salesforce"]
+__all__ = ["ReportCache", "Salesforce"]
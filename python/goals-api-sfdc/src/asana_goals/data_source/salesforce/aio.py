@@ -0,0 +1,141 @@
+"""
+Asyncio counterparts of the Salesforce client and report cache. Requires the
+optional aiohttp dependency (pip install "asana_goals[async]").
+"""
+import asyncio
+from time import monotonic
+from typing import Awaitable, Callable, Optional, Tuple
+
+from asana_goals.util.aio_session import AsyncResponse, AsyncSession, debug_async_response
+from asana_goals.util.session import DEFAULT_POOL_SIZE
+
+from . import client
+from .cache import ReportCache, _Entry
+from .client import (
+    DEFAULT_TOKEN_LIFETIME,
+    REPORT_PARAMS,
+    REPORT_URL,
+    TOKEN_REFRESH_MARGIN,
+    Salesforce,
+)
+from .report import ReportStreamParser, SalesforceReport
+
+__all__ = ["AsyncReportCache", "AsyncSalesforce"]
+
+
+class AsyncSalesforce(Salesforce):
+    def __init__(self, username: str, client_id: str, private_key_file: str,
+                 token_lifetime: float = DEFAULT_TOKEN_LIFETIME,
+                 pool_size: int = DEFAULT_POOL_SIZE) -> None:
+        """
+        Asyncio version of the Salesforce client, with the same methods as
+        coroutines.
+        :param username: Target user username.
+        :param client_id: Application client ID.
+        :param private_key_file: PEM format private key filename.
+        :param token_lifetime: Seconds an access token is reused before a
+                               new one is requested.
+        :param pool_size: Connections kept open to Salesforce.
+        """
+        super().__init__(username, client_id, private_key_file, token_lifetime)
+        self._session = AsyncSession(pool_size=pool_size)
+        # Created on first use, so it belongs to the running event loop
+        self._token_lock = None  # type: Optional[asyncio.Lock]
+        self._access_token = None  # type: Optional[str]
+
+    async def __aenter__(self) -> "AsyncSalesforce":
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        """
+        Closes the connections to Salesforce.
+        """
+        await self._session.close()
+
+    async def _authenticate(self, stale: Optional[str] = None) -> Tuple[str, str]:
+        """
+        See Salesforce._authenticate. Coroutines needing a token while one
+        is requested wait for it.
+        :return: Instance URL and access token.
+        """
+        if self._token_lock is None:
+            self._token_lock = asyncio.Lock()
+        async with self._token_lock:
+            if (
+                self._access_token is not None
+                and self._access_token != stale
+                and monotonic() < self._token_expires_at
+            ):
+                return self._instance_url, self._access_token
+
+            self._instance_url, self._access_token, lifetime = await self._request_token()
+            self._token_expires_at = monotonic() + lifetime - TOKEN_REFRESH_MARGIN
+            return self._instance_url, self._access_token
+
+    async def _request_token(self) -> Tuple[str, str, float]:
+        """
+        See Salesforce._request_token.
+        """
+        resp = await self._session.request(
+            "POST", client.LOGIN_BASE_URL + "/services/oauth2/token", data={
+                "grant_type": "urn:ietf:params:oauth:grant-type:jwt-bearer",
+                "assertion": self._make_salesforce_jwt().decode("ascii"),
+            },
+        )
+        debug_async_response(__name__, resp)
+        resp.raise_for_status()
+        j = resp.json()
+        lifetime = float(j.get("expires_in", self._token_lifetime))
+        return j["instance_url"], j["access_token"], lifetime
+
+    async def get_report(self, report_id: str) -> SalesforceReport:
+        """
+        See Salesforce.get_report.
+        """
+        url, token = await self._authenticate()
+        resp = await self._request_report(url, token, report_id)
+        debug_async_response(__name__, resp)
+        if resp.status_code == 401:
+            url, token = await self._authenticate(stale=token)
+            resp = await self._request_report(url, token, report_id)
+            debug_async_response(__name__, resp)
+        resp.raise_for_status()
+        return SalesforceReport(resp.parsed)
+
+    async def _request_report(self, url: str, token: str, report_id: str) -> AsyncResponse:
+        return await self._session.request(
+            "GET", url + REPORT_URL.format(report_id=report_id),
+            token=token, params=REPORT_PARAMS, parser=ReportStreamParser,
+        )
+
+
+class AsyncReportCache(ReportCache):
+    """
+    Asyncio version of ReportCache. Coroutines asking for a report that is
+    being fetched await the same fetch.
+    """
+    _fetch: Callable[[str], Awaitable[SalesforceReport]]
+
+    async def get_report(self, report_id: str, tick: Optional[int] = None) -> SalesforceReport:
+        """
+        See ReportCache.get_report.
+        """
+        tick = self._tick if tick is None else tick
+        entry = self._entries.get(report_id)
+        if entry is None or not self._fresh(entry, tick):
+            entry = _Entry(
+                asyncio.ensure_future(self._fetch(report_id)), tick, monotonic()
+            )
+            self._entries[report_id] = entry
+
+            def forget_failed(task):
+                if (task.cancelled() or task.exception() is not None) \
+                        and self._entries.get(report_id) is entry:
+                    del self._entries[report_id]
+
+            entry.future.add_done_callback(forget_failed)
+        # A cancelled caller must not cancel the fetch others wait for
+        return await asyncio.shield(entry.future)
@@ -0,0 +1,112 @@
+"""
+Report cache shared by the goals synced in a tick.
+"""
+import threading
+from concurrent.futures import Future
+from time import monotonic
+from typing import Callable, Dict, NamedTuple, Optional, Set
+
+from .report import SalesforceReport
+
+__all__ = ["ReportCache"]
+
+
+class _Entry(NamedTuple):
+    # Report, or the fetch that will return it
+    future: Future
+    tick: int
+    fetched_at: float
+
+
+class ReportCache:
+    """
+    Fetches each Salesforce report once per tick, however many goals read
+    metrics from it. Goals asking for a report that is being fetched wait for
+    that fetch instead of starting their own.
+    Ticks can overlap, e.g. runs of goals on different schedules. Each run
+    passes its own tick to get_report, and reuses reports fetched since it
+    started, whichever run fetched them.
+    """
+    ttl: float
+    _fetch: Callable[[str], SalesforceReport]
+    _entries: Dict[str, _Entry]
+
+    def __init__(self, fetch: Callable[[str], SalesforceReport], ttl: float = 0) -> None:
+        """
+        Initialize an empty cache.
+        :param fetch: Function fetching a report given its ID, e.g.
+                      Salesforce.get_report.
+        :param ttl: Seconds a report is also reused in later ticks. With 0,
+                    every tick fetches reports again.
+        """
+        self.ttl = ttl
+        self._fetch = fetch
+        self._entries = {}
+        self._tick = 0
+        # Ticks started and not ended yet
+        self._open = set()  # type: Set[int]
+        self._lock = threading.Lock()
+
+    def new_tick(self) -> int:
+        """
+        Starts a new tick, dropping the reports no tick can reuse anymore.
+        :return: Tick to pass to get_report, and to end_tick once done.
+        """
+        with self._lock:
+            self._tick += 1
+            self._open.add(self._tick)
+            self._prune()
+            return self._tick
+
+    def end_tick(self, tick: int) -> None:
+        """
+        Ends a tick, so the reports only it could reuse are dropped.
+        """
+        with self._lock:
+            self._open.discard(tick)
+            self._prune()
+
+    def _prune(self) -> None:
+        oldest = min(self._open, default=self._tick)
+        self._entries = {
+            report_id: entry
+            for report_id, entry in self._entries.items()
+            if self._fresh(entry, oldest)
+        }
+
+    def invalidate(self, report_id: str) -> None:
+        """
+        Drops a report, e.g. because it changed, so it is fetched again.
+        """
+        with self._lock:
+            self._entries.pop(report_id, None)
+
+    def get_report(self, report_id: str, tick: Optional[int] = None) -> SalesforceReport:
+        """
+        Returns a report, fetching it unless it was already fetched since the
+        tick started or within the TTL.
+        :param report_id: Salesforce report ID.
+        :param tick: Tick returned by new_tick, defaults to the latest one.
+        :return: Report.
+        """
+        with self._lock:
+            tick = self._tick if tick is None else tick
+            entry = self._entries.get(report_id)
+            fetching = entry is None or not self._fresh(entry, tick)
+            if fetching:
+                entry = _Entry(Future(), tick, monotonic())
+                self._entries[report_id] = entry
+
+        if fetching:
+            try:
+                entry.future.set_result(self._fetch(report_id))
+            except BaseException as e:
+                # Goals waiting on this fetch get the error, later ones retry
+                with self._lock:
+                    if self._entries.get(report_id) is entry:
+                        del self._entries[report_id]
+                entry.future.set_exception(e)
+        return entry.future.result()
+
+    def _fresh(self, entry: _Entry, tick: int) -> bool:
+        return entry.tick >= tick or monotonic() - entry.fetched_at < self.ttl
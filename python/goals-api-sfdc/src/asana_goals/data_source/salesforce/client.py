@@ -1,7 +1,10 @@
 import base64
 import json
+import logging
+import threading
 from datetime import datetime, timedelta
-from typing import Tuple
+from time import monotonic
+from typing import Optional, Tuple
 
 import requests
 from cryptography.hazmat.primitives import hashes
@@ -11,33 +14,73 @@ from cryptography.hazmat.primitives.serialization import load_pem_private_key
 from asana_goals.util.bearer_auth import HTTPBearerAuth
 from asana_goals.util.log_requests import debug_response
 
-from .report import SalesforceReport
+from .report import CHUNK_SIZE, SalesforceReport
 
 __all__ = ["Salesforce"]
 
 LOGIN_BASE_URL = "https://login.salesforce.com"
 REPORT_URL = "/services/data/v52.0/analytics/reports/{report_id}"
+# Only the summary of a report is needed, not its detail rows
+REPORT_PARAMS = {"includeDetails": "false"}
+
+# How long an access token is reused, in seconds. The JWT bearer flow does
+# not say when the token expires, as that depends on the session timeout set
+# in the org (2 hours by default).
+DEFAULT_TOKEN_LIFETIME = 30 * 60
+# Tokens are refreshed this many seconds before they are due to expire
+TOKEN_REFRESH_MARGIN = 60
 
 
 class Salesforce:
-    def __init__(self, username: str, client_id: str, private_key_file: str) -> None:
+    def __init__(self, username: str, client_id: str, private_key_file: str,
+                 token_lifetime: float = DEFAULT_TOKEN_LIFETIME) -> None:
         """
         Wrapper over the Salesforce REST API.
         :param username: Target user username.
         :param client_id: Application client ID.
         :param private_key_file: PEM format private key filename.
+        :param token_lifetime: Seconds an access token is reused before a
+                               new one is requested. Keep it below the
+                               session timeout of the org.
         """
         self._username = username
         self._client_id = client_id
         with open(private_key_file, "rb") as f:
             payload = f.read()
             self._pk = load_pem_private_key(payload, None)
+        self._token_lifetime = token_lifetime
+        # Cached instance URL and access token, shared by every thread
+        self._token_lock = threading.Lock()
+        self._instance_url = None  # type: Optional[str]
+        self._auth = None  # type: Optional[HTTPBearerAuth]
+        self._token_expires_at = 0.0
+
+    def _authenticate(self, stale: Optional[HTTPBearerAuth] = None) -> Tuple[str, HTTPBearerAuth]:
+        """
+        Returns the cached instance URL and access token, authenticating
+        first if there is no token yet or it is about to expire. Concurrent
+        callers wait for a single authentication rather than each making one.
+        :param stale: Access token that was just rejected (e.g. with a 401).
+                      It is replaced unless another caller already did.
+        :return: Instance URL and access token.
+        """
+        with self._token_lock:
+            if (
+                self._auth is not None
+                and self._auth is not stale
+                and monotonic() < self._token_expires_at
+            ):
+                return self._instance_url, self._auth
 
-    def _authenticate(self) -> Tuple[str, HTTPBearerAuth]:
+            self._instance_url, self._auth, lifetime = self._request_token()
+            self._token_expires_at = monotonic() + lifetime - TOKEN_REFRESH_MARGIN
+            return self._instance_url, self._auth
+
+    def _request_token(self) -> Tuple[str, HTTPBearerAuth, float]:
         """
         Performs authentication through JWT bearer token with the Salesforce
         REST API. Required to obtain an access token for subsequent requests.
-        :return: Instance URL and access token.
+        :return: Instance URL, access token and its lifetime in seconds.
         """
         resp = requests.post(LOGIN_BASE_URL + "/services/oauth2/token", data={
             "grant_type": "urn:ietf:params:oauth:grant-type:jwt-bearer",
@@ -46,7 +89,8 @@ class Salesforce:
         debug_response(__name__, resp)
         resp.raise_for_status()
         j = resp.json()
-        return j["instance_url"], HTTPBearerAuth(j["access_token"])
+        lifetime = float(j.get("expires_in", self._token_lifetime))
+        return j["instance_url"], HTTPBearerAuth(j["access_token"]), lifetime
 
     def _make_salesforce_jwt(self) -> bytes:
         """
@@ -84,10 +128,28 @@ class Salesforce:
         :return: Salesforce Report resource.
         """
         url, auth = self._authenticate()
-        resp = requests.get(
+        resp = self._request_report(url, auth, report_id)
+        if resp.status_code == 401:
+            # The token expired early (e.g. the session was revoked), so
+            # authenticate again and retry once
+            resp.close()
+            url, auth = self._authenticate(stale=auth)
+            resp = self._request_report(url, auth, report_id)
+        with resp:
+            if not resp.ok:
+                debug_response(__name__, resp)
+                resp.raise_for_status()
+            # The body can be large, it is parsed as it arrives
+            logging.getLogger(__name__).debug(
+                "Received response [%s]: report %s", resp.status_code, report_id,
+            )
+            return SalesforceReport.parse(resp.iter_content(CHUNK_SIZE))
+
+    @staticmethod
+    def _request_report(url: str, auth: HTTPBearerAuth, report_id: str) -> requests.Response:
+        return requests.get(
             url + REPORT_URL.format(report_id=report_id),
+            params=REPORT_PARAMS,
             auth=auth,
+            stream=True,
         )
-        debug_response(__name__, resp)
-        resp.raise_for_status()
-        return SalesforceReport(resp.json())
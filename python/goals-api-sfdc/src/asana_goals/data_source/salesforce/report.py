@@ -1,4 +1,24 @@
-__all__ = ["SalesforceReport"]
+import codecs
+import json
+import re
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+__all__ = ["SalesforceReport", "ReportStreamParser", "REPORT_SECTIONS", "CHUNK_SIZE"]
+
+# Sections of a report response get_metric reads, as paths of object keys
+REPORT_SECTIONS = (
+    ("reportMetadata", "aggregates"),
+    ("factMap", "T!T", "aggregates"),
+)
+# Bytes of a report response read at a time
+CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = re.compile(r"\s*")
+_STRING = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"')
+_LITERAL = re.compile(r'[^\s{}\[\]:,"]+')
+# Text and strings up to the next bracket, which is all that matters to find
+# the end of a skipped value
+_SKIP = re.compile(r'[^"{}\[\]]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"{}\[\]]*)*')
 
 
 class SalesforceReport:
@@ -11,6 +31,20 @@ class SalesforceReport:
         """
         self.source = source
 
+    @classmethod
+    def parse(cls, chunks: Iterable[bytes]) -> "SalesforceReport":
+        """
+        Reads a report from a response body as it arrives, keeping only the
+        sections get_metric needs. Reading stops once they are found.
+        :param chunks: Response body, e.g. Response.iter_content().
+        :return: Report with only REPORT_SECTIONS in its source.
+        """
+        parser = ReportStreamParser()
+        for chunk in chunks:
+            if parser.feed(chunk):
+                break
+        return cls(parser.close())
+
     def get_metric(self, metric: str) -> str:
         """
         Gets a named aggregate from this Report. The format is complicated so
@@ -26,3 +60,160 @@ class SalesforceReport:
                 return val["value"]
 
         raise KeyError(f"Metric {metric} not found")
+
+
+class ReportStreamParser:
+    """
+    Incremental JSON parser keeping only some sections of a document. The
+    rest, such as the detail rows of a report, is scanned for its end and
+    dropped, so memory does not grow with the size of the document.
+    """
+    sections: Tuple[Tuple[str, ...], ...]
+
+    def __init__(self, sections: Iterable[Tuple[str, ...]] = REPORT_SECTIONS) -> None:
+        """
+        :param sections: Paths of object keys of the values to keep.
+        """
+        self.sections = tuple(sections)
+        # Objects to descend into to reach the sections
+        self._prefixes = {s[:i] for s in self.sections for i in range(len(s))}
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._pos = 0
+        # Objects being parsed: their path, current key and what comes next
+        self._stack = []
+        # Nesting depth within a value being skipped or kept
+        self._skip_depth = 0
+        self._skip_path = None  # type: Optional[Tuple[str, ...]]
+        # Where the value being kept starts in the buffer
+        self._keep_start = None  # type: Optional[int]
+        self._found = {}  # type: Dict[Tuple[str, ...], Any]
+        self._done = False
+
+    def feed(self, chunk: bytes) -> bool:
+        """
+        Parses the next part of the document.
+        :param chunk: Bytes following the ones fed so far.
+        :return: True once every section is found, so the rest can be left
+                 unread.
+        :raises ValueError: If the document is not valid JSON.
+        """
+        self._buf += self._decoder.decode(chunk)
+        self._parse(final=False)
+        return self._complete()
+
+    def close(self) -> dict:
+        """
+        Ends the document.
+        :return: Object with the sections that were found.
+        :raises ValueError: If the document ended before it was complete.
+        """
+        # Once every section is found, the rest is never parsed, and may end
+        # in the middle of a character
+        if not self._complete():
+            self._buf += self._decoder.decode(b"", final=True)
+            self._parse(final=True)
+            if not self._done:
+                raise ValueError("Report response ended before it was complete")
+
+        source = {}
+        for path, value in self._found.items():
+            obj = source
+            for key in path[:-1]:
+                obj = obj.setdefault(key, {})
+            obj[path[-1]] = value
+        return source
+
+    def _complete(self) -> bool:
+        return len(self._found) == len(self.sections)
+
+    def _parse(self, final: bool) -> None:
+        buf = self._buf
+        pos = self._pos
+        while not self._done and not self._complete():
+            if self._skip_depth:
+                pos = _SKIP.match(buf, pos).end()
+                if pos == len(buf) or buf[pos] == '"':
+                    # The next bracket, or the end of a string, is in the
+                    # next chunk
+                    break
+                self._skip_depth += 1 if buf[pos] in "{[" else -1
+                pos += 1
+                if not self._skip_depth:
+                    if self._keep_start is not None:
+                        self._found[self._skip_path] = json.loads(buf[self._keep_start:pos])
+                        self._keep_start = None
+                    self._value_done()
+                continue
+
+            pos = _WHITESPACE.match(buf, pos).end()
+            if pos == len(buf):
+                break
+            c = buf[pos]
+            frame = self._stack[-1] if self._stack else None
+            expect = frame["expect"] if frame else "value"
+
+            if c == "}" and expect in ("key_or_end", "comma_or_end"):
+                self._stack.pop()
+                pos += 1
+                self._value_done()
+            elif expect == "comma_or_end":
+                if c != ",":
+                    raise self._error(pos)
+                frame["expect"] = "key"
+                pos += 1
+            elif expect in ("key", "key_or_end"):
+                s = _STRING.match(buf, pos)
+                if s is None:
+                    if c != '"':
+                        raise self._error(pos)
+                    break
+                frame["key"] = json.loads(s.group())
+                frame["expect"] = "colon"
+                pos = s.end()
+            elif expect == "colon":
+                if c != ":":
+                    raise self._error(pos)
+                frame["expect"] = "value"
+                pos += 1
+            else:
+                path = frame["path"] + (frame["key"],) if frame else ()
+                keep = path in self.sections
+                if c == "{" and not keep and path in self._prefixes:
+                    self._stack.append({"path": path, "key": None, "expect": "key_or_end"})
+                    pos += 1
+                elif c in "{[":
+                    self._skip_depth = 1
+                    self._skip_path = path
+                    self._keep_start = pos if keep else None
+                    pos += 1
+                else:
+                    s = (_STRING if c == '"' else _LITERAL).match(buf, pos)
+                    if s is None:
+                        if c != '"':
+                            raise self._error(pos)
+                        break
+                    if s.end() == len(buf) and not final and c != '"':
+                        # The literal may go on in the next chunk
+                        break
+                    value = json.loads(s.group())
+                    if keep:
+                        self._found[path] = value
+                    pos = s.end()
+                    self._value_done()
+
+        # Drop what was parsed, except a value being kept
+        start = pos if self._keep_start is None else self._keep_start
+        self._buf = buf[start:]
+        self._pos = pos - start
+        if self._keep_start is not None:
+            self._keep_start = 0
+
+    def _value_done(self) -> None:
+        if self._stack:
+            self._stack[-1]["expect"] = "comma_or_end"
+        else:
+            self._done = True
+
+    def _error(self, pos: int) -> ValueError:
+        return ValueError(f"Invalid JSON in report response near {self._buf[pos:pos + 20]!r}")
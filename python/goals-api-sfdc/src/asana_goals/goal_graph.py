@@ -0,0 +1,220 @@
+"""
+Dependency graph of the configured goals, used to sync independent goals
+concurrently and composite goals only after their subgoals.
+"""
+import asyncio
+import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Dict, Iterable, List
+
+__all__ = ["ConfigurationError", "GoalGraph"]
+
+
+class ConfigurationError(ValueError):
+    """
+    The goals config references goals that do not exist, or is otherwise
+    unusable.
+    """
+
+
+class _Skipped(Exception):
+    """
+    A subgoal of the goal failed.
+    """
+
+
+class GoalGraph:
+    """
+    Goals reachable from the goals listed in the app config, with the
+    subgoals each of them depends on.
+    """
+    # Subgoals of each goal, in config order
+    dependencies: Dict[str, List[str]]
+    # Goals depending on each goal
+    dependents: Dict[str, List[str]]
+    # Every goal in the graph, subgoals before the goals depending on them
+    order: List[str]
+    # Goals by Asana goal GID and by Salesforce report ID, to find the goals
+    # a change notification is about
+    by_goal_id: Dict[str, List[str]]
+    by_report_id: Dict[str, List[str]]
+
+    def __init__(self, goals: Dict[str, dict], roots: Iterable[str]) -> None:
+        """
+        Compiles the graph and checks it can be synced.
+        :param goals: Goals config, by config key.
+        :param roots: Config keys of the goals to sync.
+        :raises ConfigurationError: If a goal references a goal that does not
+                                    exist, or depends on itself.
+        """
+        self.dependencies = {}
+        self.dependents = {}
+        self.order = []
+        self.by_goal_id = {}
+        self.by_report_id = {}
+        # Goals being visited, to detect cycles
+        path = []
+
+        def visit(goal: str, referrer: str = None) -> None:
+            if goal in self.dependencies:
+                return
+            if goal in path:
+                cycle = path[path.index(goal):] + [goal]
+                raise ConfigurationError(
+                    "Goals depend on themselves: " + " -> ".join(cycle)
+                )
+            try:
+                goal_obj = goals[goal]
+            except KeyError:
+                raise ConfigurationError(
+                    f"Referenced goal '{goal}' does not exist"
+                    + (f" (subgoal of '{referrer}')" if referrer else "")
+                ) from None
+
+            subgoals = []
+            if goal_obj.get("source") == "composite":
+                subgoals = list(goal_obj.get("subgoals", []))
+                if len(subgoals) != len(goal_obj.get("weights", [])):
+                    raise ConfigurationError(
+                        f"Composite goal '{goal}' needs one weight per subgoal"
+                    )
+
+            path.append(goal)
+            for subgoal in subgoals:
+                visit(subgoal, goal)
+            path.pop()
+
+            self.dependencies[goal] = subgoals
+            self.dependents.setdefault(goal, [])
+            for subgoal in subgoals:
+                if goal not in self.dependents[subgoal]:
+                    self.dependents[subgoal].append(goal)
+            self.order.append(goal)
+
+            if "goal_id" in goal_obj:
+                self.by_goal_id.setdefault(str(goal_obj["goal_id"]), []).append(goal)
+            if "sf_report_id" in goal_obj:
+                self.by_report_id.setdefault(goal_obj["sf_report_id"], []).append(goal)
+
+        for root in roots:
+            visit(root)
+
+    def ancestors(self, goals: Iterable[str]) -> List[str]:
+        """
+        Returns the goals depending on the given goals, directly or through
+        other goals.
+        :param goals: Config keys of goals in this graph.
+        :return: Config keys of their ancestors, in graph order.
+        """
+        found = set()
+        pending = list(goals)
+        while pending:
+            for dependent in self.dependents.get(pending.pop(), []):
+                if dependent not in found:
+                    found.add(dependent)
+                    pending.append(dependent)
+        return [goal for goal in self.order if goal in found]
+
+    def subset(self, goals: Iterable[str]) -> "GoalGraph":
+        """
+        Returns the graph of the given goals only. Their subgoals outside of
+        it are left out of their dependencies.
+        :param goals: Config keys of goals in this graph.
+        :return: New graph.
+        """
+        keep = set(goals)
+        graph = GoalGraph({}, [])
+        graph.order = [goal for goal in self.order if goal in keep]
+        for goal in graph.order:
+            graph.dependencies[goal] = [g for g in self.dependencies[goal] if g in keep]
+            graph.dependents[goal] = [g for g in self.dependents[goal] if g in keep]
+        return graph
+
+    def run(self, sync: Callable[[str], Any], max_workers: int) -> Dict[str, Any]:
+        """
+        Syncs every goal on a pool of threads. A goal is submitted once all
+        its subgoals are synced, so goals that do not depend on each other
+        run concurrently.
+        If a goal fails, the goals depending on it are skipped while the
+        rest are still synced, and the first error is raised at the end.
+        :param sync: Function syncing one goal given its config key.
+        :param max_workers: Goals synced at the same time.
+        :return: Results of sync, by config key.
+        """
+        waiting = {goal: len(set(subgoals)) for goal, subgoals in self.dependencies.items()}
+        results = {}
+        errors = {}
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            running = {
+                pool.submit(sync, goal): goal
+                for goal in self.order if not waiting[goal]
+            }
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    goal = running.pop(future)
+                    try:
+                        results[goal] = future.result()
+                    except Exception as e:
+                        logging.getLogger(__name__).exception(
+                            "Could not sync goal '%s'", goal,
+                        )
+                        errors[goal] = e
+                        continue
+                    for dependent in self.dependents[goal]:
+                        waiting[dependent] -= 1
+                        if not waiting[dependent]:
+                            running[pool.submit(sync, dependent)] = dependent
+
+        return self._finish(results, errors)
+
+    async def run_async(self, sync: Callable[[str], Awaitable[Any]],
+                        max_tasks: int) -> Dict[str, Any]:
+        """
+        Asyncio version of run. Every goal gets a task awaiting its subgoals,
+        and at most max_tasks of them sync at the same time.
+        :param sync: Coroutine function syncing one goal given its config key.
+        :param max_tasks: Goals synced at the same time.
+        :return: Results of sync, by config key.
+        """
+        semaphore = asyncio.Semaphore(max_tasks)
+        tasks = {}
+
+        async def run_goal(goal: str) -> Any:
+            for subgoal in self.dependencies[goal]:
+                try:
+                    await tasks[subgoal]
+                except Exception:
+                    raise _Skipped() from None
+            async with semaphore:
+                return await sync(goal)
+
+        # Subgoals come first in the order, so their tasks exist when awaited
+        for goal in self.order:
+            tasks[goal] = asyncio.ensure_future(run_goal(goal))
+        await asyncio.wait(list(tasks.values()))
+
+        results = {}
+        errors = {}
+        for goal in self.order:
+            e = tasks[goal].exception()
+            if e is None:
+                results[goal] = tasks[goal].result()
+            elif not isinstance(e, _Skipped):
+                logging.getLogger(__name__).error(
+                    "Could not sync goal '%s'", goal, exc_info=e,
+                )
+                errors[goal] = e
+        return self._finish(results, errors)
+
+    def _finish(self, results: Dict[str, Any], errors: Dict[str, Exception]) -> Dict[str, Any]:
+        skipped = [goal for goal in self.order if goal not in results and goal not in errors]
+        if skipped:
+            logging.getLogger(__name__).error(
+                "Skipped goals depending on goals that failed: %s",
+                ", ".join(skipped),
+            )
+        if errors:
+            raise next(iter(errors.values()))
+        return results
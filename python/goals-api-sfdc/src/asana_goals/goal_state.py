@@ -0,0 +1,132 @@
+"""
+Local record of the values and statuses last pushed to each Asana goal, used
+to skip writes that would not change anything.
+"""
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, Optional
+
+from asana_goals.asana.goal import Goal, GoalStatus
+
+__all__ = ["GoalState"]
+
+
+class GoalState:
+    """
+    Last value and status pushed per goal config key, with the Goal record
+    Asana returned for them. It is kept in memory and, if a filename is
+    given, in a JSON file so it survives restarts.
+    """
+    filename: Optional[str]
+    _goals: Dict[str, dict]
+
+    def __init__(self, filename: Optional[str] = None) -> None:
+        """
+        Loads the record.
+        :param filename: JSON file to keep the record in. If None, nothing
+                         is written to disk.
+        """
+        self.filename = filename
+        self._goals = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        if filename and os.path.exists(filename):
+            try:
+                with open(filename) as f:
+                    self._goals = json.load(f)
+            except ValueError:
+                # A bad record only costs one round of writes
+                logging.getLogger(__name__).warning(
+                    "Ignoring unreadable goal state file '%s'", filename,
+                )
+
+    @staticmethod
+    def _key(value: Any) -> str:
+        # Values come from config strings, floats, ints or Decimals, so they
+        # are compared the way they are written to the API
+        return str(value)
+
+    def goal(self, goal: str, goal_id: str) -> Optional[Goal]:
+        """
+        Returns the Goal record last returned by Asana for the given goal.
+        :param goal: Goal config key.
+        :param goal_id: Asana goal GID the config key points at.
+        :return: Goal record, or None if nothing was pushed to it yet.
+        """
+        entry = self._get(goal, goal_id)
+        if entry is None or entry.get("goal") is None:
+            return None
+        return Goal(entry["goal"])
+
+    def value_changed(self, goal: str, goal_id: str, value: Any) -> bool:
+        """
+        Tells whether the value differs from the last one pushed.
+        """
+        entry = self._get(goal, goal_id)
+        return entry is None or entry.get("value") != self._key(value)
+
+    def status_changed(self, goal: str, goal_id: str, status: GoalStatus) -> bool:
+        """
+        Tells whether the status differs from the last one pushed.
+        """
+        entry = self._get(goal, goal_id)
+        return entry is None or entry.get("status") != status.value
+
+    def count_sync(self, goal: str, goal_id: str) -> int:
+        """
+        Counts a sync of a goal, whether anything was written or not.
+        :param goal: Goal config key.
+        :param goal_id: Asana goal GID the config key points at.
+        :return: Syncs of the goal so far, including this one.
+        """
+        with self._lock:
+            entry = self._goals.get(goal)
+            if entry is None or entry.get("goal_id") != goal_id:
+                entry = self._goals[goal] = {"goal_id": goal_id}
+            entry["syncs"] = entry.get("syncs", 0) + 1
+            self._dirty = True
+            return entry["syncs"]
+
+    def record(self, goal: str, goal_id: str, upd: Goal,
+               value: Any = None, status: GoalStatus = None) -> None:
+        """
+        Records a write to a goal.
+        :param goal: Goal config key.
+        :param goal_id: Asana goal GID the config key points at.
+        :param upd: Goal record returned by Asana.
+        :param value: Value pushed, if any.
+        :param status: Status pushed, if any.
+        """
+        with self._lock:
+            entry = self._goals.get(goal)
+            if entry is None or entry.get("goal_id") != goal_id:
+                entry = self._goals[goal] = {"goal_id": goal_id}
+            entry["goal"] = upd.source
+            if value is not None:
+                entry["value"] = self._key(value)
+            if status is not None:
+                entry["status"] = status.value
+            self._dirty = True
+
+    def save(self) -> None:
+        """
+        Writes the record to its file if it changed. The file is replaced
+        in one step, so an interrupted write leaves the old record.
+        """
+        with self._lock:
+            if not self.filename or not self._dirty:
+                return
+            partial = self.filename + ".partial"
+            with open(partial, "w") as f:
+                json.dump(self._goals, f, indent=2, default=str)
+            os.replace(partial, self.filename)
+            self._dirty = False
+
+    def _get(self, goal: str, goal_id: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._goals.get(goal)
+        if entry is None or entry.get("goal_id") != goal_id:
+            return None
+        return entry
@@ -109,6 +109,13 @@ config_file = """\
 # Your Asana API access token. You need to create a service account to acquire
 # this.
 access_token="{asana_access_token}"
+# Optional: how many connections to keep open to Asana, how many times to retry
+# rate limited or failed calls, and the timeouts of each call in seconds.
+# pool_size=10
+# max_retries=5
+# backoff_factor=0.5
+# connect_timeout=5
+# read_timeout=60
 
 [salesforce]
 # Your salesforce username, usually in a mail address-like format.
@@ -119,10 +126,35 @@ client_id="<YOUR SALESFORCE APP CLIENT ID HERE>"
 # Your private key file in PEM format. Check README.md for the procedure for
 # # acquiring this.
 private_key_file="<YOUR SALESFORCE SELF-SIGNED PRIVATE KEY HERE>"
+# Optional: seconds to reuse an access token before requesting a new one. Keep
+# it below the session timeout of your org.
+# token_lifetime=1800
 
 [app]
 # Run this every 1 minute
 cron_string="*/1 * * * *"
+# Optional: how many goals to sync at the same time. Goals made of subgoals
+# are synced after their subgoals.
+# concurrency=4
+# Last values and statuses written to each goal are kept in this file, so
+# unchanged goals are not written again, even after a restart.
+state_file="goal_state.json"
+# Optional: every this many syncs of a goal, write it even if nothing changed.
+# 0 turns this off.
+# force_refresh_every=60
+# Optional: seconds a Salesforce report is reused across runs. By default each
+# report is fetched once per run, however many goals read from it.
+# report_ttl=0
+# Optional: send goal writes through the Asana batch API, up to 10 per
+# request. Goals synced at the same time share batches, so raise concurrency
+# too. batch_linger is how many seconds a write waits for others to join.
+# batch_writes=true
+# batch_linger=0.05
+# Optional: delay each run by up to this many seconds, to spread the load.
+# jitter=0
+# Optional: when a goal is due while its previous run is still going, "skip"
+# it or "coalesce" the missed runs into one run after the current one.
+# overlap="skip"
 # We have 2 goals to keep track of, these are configured in the next section
 goals=[
     "example_1",
@@ -137,6 +169,8 @@ goals=[
     source="salesforce_report"
     sf_report_id="<YOUR SALESFORCE REPORT ID HERE>"
     sf_metric="s!AMOUNT"
+    # Optional: refresh this goal on its own schedule instead of the app one
+    # cron_string="0 * * * *"
 
     # Second example calculates its progress by measuring subgoals
     [goals.example_2]
@@ -169,6 +203,16 @@ goals=[
     source="fixed"
     value="58000"
 
+# Optional, when running as a service: receive change notifications, so goals
+# reading data that changed, and the goals above them, are synced right away.
+# Webhooks are established for every goal if public_url is set. Salesforce
+# notifications are POSTed to <public_url>/salesforce, see README.md.
+# [receiver]
+# port=8080
+# public_url="https://<YOUR PUBLIC HOST>"
+# secrets_file="webhook_secrets.json"
+# salesforce_token="<A SECRET SHARED WITH SALESFORCE>"
+
 # This gets fed into Python logging.config.dictConfig
 # For a tutorial on options available see:
 # https://docs.python.org/3/howto/logging.html#logging-basic-tutorial
@@ -251,18 +295,31 @@ class InitializerProcess:
             goal["data"]["workspace"] = self.workspace_gid
             goal["data"]["time_period"] = self.time_period_gid
 
-        # Create by steps
-        examples = []
-        for goal, metric in [example_1, example_2]:
-            examples.append(self.asana.create_goal(goal))
-            self.asana.create_goal_metric(examples[-1].gid, metric)
-
-        # Create subgoals by steps and attach to example 2
-        sub_examples = []
-        for goal, metric in [subgoal_1, subgoal_2, subgoal_3]:
-            sub_examples.append(self.asana.create_goal(goal))
-            self.asana.create_goal_metric(sub_examples[-1].gid, metric)
-            self.asana.add_subgoal(examples[-1].gid, sub_examples[-1].gid)
+        # Create every goal in one batch
+        with self.asana.batch() as batch:
+            examples = [batch.create_goal(goal) for goal, metric in [example_1, example_2]]
+            sub_examples = [
+                batch.create_goal(goal) for goal, metric in [subgoal_1, subgoal_2, subgoal_3]
+            ]
+        examples = [f.result() for f in examples]
+        sub_examples = [f.result() for f in sub_examples]
+
+        # Then set their metrics and attach the subgoals to example 2
+        with self.asana.batch() as batch:
+            pending = [
+                batch.create_goal_metric(created.gid, metric)
+                for created, (goal, metric) in zip(
+                    examples + sub_examples,
+                    [example_1, example_2, subgoal_1, subgoal_2, subgoal_3],
+                )
+            ]
+            pending += [
+                batch.add_subgoal(examples[-1].gid, created.gid)
+                for created in sub_examples
+            ]
+        # Raise if any of them failed
+        for f in pending:
+            f.result()
 
         with open(self.config_filename, "w") as f:
             f.write(config_file.format(
@@ -0,0 +1,272 @@
+"""
+HTTP receiver for change notifications, so the goals reading changed data and
+the composite goals above them are synced right away instead of at their
+next scheduled time.
+"""
+import hashlib
+import hmac
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+__all__ = ["ASANA_PATH", "SALESFORCE_PATH", "DEFAULT_PORT", "ChangeReceiver"]
+
+# Asana webhook events of a goal are POSTed to ASANA_PATH + goal GID
+ASANA_PATH = "/asana/"
+# Salesforce change notifications are POSTed here, as {"report_ids": [...]}
+SALESFORCE_PATH = "/salesforce"
+
+DEFAULT_PORT = 8080
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class ChangeReceiver:
+    """
+    Serves the endpoints Asana webhooks and Salesforce notifications are sent
+    to, from a background thread.
+    Asana sends a secret when a webhook is established, and signs every
+    event with it afterwards. A secret is only accepted while the webhook of
+    that goal is being established, see expect_handshake. Secrets are kept
+    in secrets_file, so webhooks keep working after a restart. Events made
+    by own_user_gid, i.e. by the service writing goals, are dropped.
+    Salesforce notifications can come from anything able to make an HTTP
+    callout, e.g. a flow, or be simulated with:
+    curl -d '{"report_ids": ["<REPORT ID>"]}' http://localhost:8080/salesforce
+    """
+    host: str
+    port: int
+    # URL Asana reaches this receiver at, needed to establish webhooks
+    public_url: Optional[str]
+    secrets_file: Optional[str]
+    salesforce_token: Optional[str]
+    # Goals webhooks are accepted for
+    goal_gids: Set[str]
+    # Asana user the service writes goals as
+    own_user_gid: Optional[str]
+    _secrets: Dict[str, str]
+    # Goals whose webhook is being established
+    _expected: Set[str]
+
+    def __init__(
+        self,
+        on_goals_changed: Callable[[List[str]], None],
+        on_reports_changed: Callable[[List[str]], None],
+        goal_gids: Iterable[str] = (),
+        host: str = "",
+        port: int = DEFAULT_PORT,
+        public_url: Optional[str] = None,
+        secrets_file: Optional[str] = None,
+        salesforce_token: Optional[str] = None,
+    ) -> None:
+        """
+        :param on_goals_changed: Called with the GIDs of Asana goals that
+                                 changed.
+        :param on_reports_changed: Called with the IDs of Salesforce reports
+                                   that changed.
+        :param goal_gids: GIDs of the goals webhooks are accepted for.
+        :param host: Address to listen on, all of them by default.
+        :param port: Port to listen on, 0 picks a free one.
+        :param public_url: URL Asana reaches this receiver at.
+        :param secrets_file: JSON file to keep webhook secrets in. If None,
+                             they are lost on restart.
+        :param salesforce_token: If set, Salesforce notifications must come
+                                 with an "Authorization: Bearer <token>"
+                                 header.
+        """
+        self.on_goals_changed = on_goals_changed
+        self.on_reports_changed = on_reports_changed
+        self.host = host
+        self.port = port
+        self.public_url = public_url.rstrip("/") if public_url else None
+        self.secrets_file = secrets_file
+        self.salesforce_token = salesforce_token
+        self.goal_gids = set(goal_gids)
+        self.own_user_gid = None
+        self._secrets = {}
+        self._expected = set()
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+        if secrets_file and os.path.exists(secrets_file):
+            with open(secrets_file) as f:
+                self._secrets = json.load(f)
+
+    def start(self) -> None:
+        """
+        Starts listening. The port is updated if a free one was picked.
+        """
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if self.path.startswith(ASANA_PATH):
+                    status, headers, changed = receiver.handle_asana(
+                        self.path[len(ASANA_PATH):], self.headers, body
+                    )
+                    callback = receiver.on_goals_changed
+                elif self.path == SALESFORCE_PATH:
+                    status, headers, changed = receiver.handle_salesforce(self.headers, body)
+                    callback = receiver.on_reports_changed
+                else:
+                    status, headers, changed = 404, {}, []
+                    callback = None
+
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                self.wfile.flush()
+                # Answer first, Asana expects it within seconds
+                if changed:
+                    try:
+                        callback(changed)
+                    except Exception:
+                        logging.getLogger(__name__).exception(
+                            "Could not handle change notification for %s", ", ".join(changed),
+                        )
+
+            def log_message(self, format, *args):
+                logging.getLogger(__name__).debug(format, *args)
+
+        self._server = _Server((self.host, self.port), Handler)
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        logging.getLogger(__name__).info("Receiving change notifications on port %d", self.port)
+
+    def stop(self) -> None:
+        """
+        Stops listening.
+        """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    def has_webhook(self, goal_gid: str) -> bool:
+        """
+        Tells whether a webhook was established for a goal.
+        """
+        with self._lock:
+            return goal_gid in self._secrets
+
+    def forget_webhook(self, goal_gid: str) -> None:
+        """
+        Forgets the secret of a goal webhook that no longer exists, so it is
+        established again.
+        """
+        with self._lock:
+            if self._secrets.pop(goal_gid, None) is not None:
+                self._save()
+
+    @contextmanager
+    def expect_handshake(self, goal_gid: str) -> Iterator[None]:
+        """
+        Accepts the handshake of a goal webhook while in this context, which
+        should wrap the request establishing it.
+        """
+        with self._lock:
+            self._expected.add(goal_gid)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._expected.discard(goal_gid)
+
+    def webhook_target(self, goal_gid: str) -> str:
+        """
+        Returns the URL the webhook of a goal sends its events to.
+        """
+        return self.public_url + ASANA_PATH + goal_gid
+
+    def handle_asana(self, goal_gid: str, headers, body: bytes) -> Tuple[int, dict, List[str]]:
+        """
+        Handles a request to the webhook endpoint of a goal.
+        See: https://developers.asana.com/docs/webhooks-guide
+        :param goal_gid: GID of the goal the webhook is for.
+        :param headers: Request headers.
+        :param body: Request body.
+        :return: Response status and headers, and the GIDs of the goals that
+                 changed.
+        """
+        if goal_gid not in self.goal_gids:
+            return 404, {}, []
+
+        secret = headers.get("X-Hook-Secret")
+        if secret:
+            # Handshake, confirming the webhook by echoing the secret
+            with self._lock:
+                if goal_gid not in self._expected:
+                    logging.getLogger(__name__).warning(
+                        "Rejected unexpected webhook handshake for goal %s", goal_gid,
+                    )
+                    return 403, {}, []
+                self._expected.discard(goal_gid)
+                self._secrets[goal_gid] = secret
+                self._save()
+            logging.getLogger(__name__).info("Webhook established for goal %s", goal_gid)
+            return 200, {"X-Hook-Secret": secret}, []
+
+        with self._lock:
+            secret = self._secrets.get(goal_gid)
+        signature = hmac.new(
+            (secret or "").encode(), body, hashlib.sha256
+        ).hexdigest()
+        if secret is None or not hmac.compare_digest(
+            signature, headers.get("X-Hook-Signature", "")
+        ):
+            logging.getLogger(__name__).warning(
+                "Rejected webhook event with an invalid signature for goal %s", goal_gid,
+            )
+            return 401, {}, []
+
+        try:
+            events = json.loads(body)["events"]
+        except (ValueError, KeyError):
+            return 400, {}, []
+        # Heartbeats come without events, and the service's own writes do
+        # not need to be synced again
+        changes = [
+            event for event in events
+            if self.own_user_gid is None
+            or (event.get("user") or {}).get("gid") != self.own_user_gid
+        ]
+        return 200, {}, [goal_gid] if changes else []
+
+    def handle_salesforce(self, headers, body: bytes) -> Tuple[int, dict, List[str]]:
+        """
+        Handles a Salesforce change notification.
+        :param headers: Request headers.
+        :param body: Request body, {"report_ids": [...]} or {"report_id": ...}.
+        :return: Response status and headers, and the IDs of the reports that
+                 changed.
+        """
+        if self.salesforce_token is not None and not hmac.compare_digest(
+            headers.get("Authorization", ""), "Bearer " + self.salesforce_token
+        ):
+            return 401, {}, []
+        try:
+            j = json.loads(body)
+            report_ids = j["report_ids"] if "report_ids" in j else [j["report_id"]]
+        except (ValueError, KeyError, TypeError):
+            return 400, {}, []
+        return 200, {}, [str(report_id) for report_id in report_ids]
+
+    def _save(self) -> None:
+        if not self.secrets_file:
+            return
+        partial = self.secrets_file + ".partial"
+        with open(partial, "w") as f:
+            json.dump(self._secrets, f, indent=2)
+        os.replace(partial, self.secrets_file)
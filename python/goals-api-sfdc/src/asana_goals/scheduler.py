@@ -0,0 +1,147 @@
+"""
+Due times of each goal when running as a service.
+"""
+import logging
+import random
+import threading
+from time import time
+from typing import Dict, Iterable, List, Optional, Set
+
+from croniter import croniter
+
+from asana_goals.goal_graph import ConfigurationError
+
+__all__ = ["OVERLAP_SKIP", "OVERLAP_COALESCE", "Scheduler"]
+
+# What to do with a goal that is due while its previous sync still runs:
+# skip this run, or run it once more as soon as the previous sync finishes
+OVERLAP_SKIP = "skip"
+OVERLAP_COALESCE = "coalesce"
+
+# Longest sleep between checks, in seconds, so a shutdown is noticed
+MAX_SLEEP = 60.0
+
+
+class Scheduler:
+    """
+    Tracks when each goal is next due according to its cron string, and
+    which goals are being synced.
+    A goal is due at most once however many of its times went by, e.g.
+    after a slow sync. Jitter delays each due time by up to that many
+    seconds, so goals sharing a schedule do not all hit the APIs at once.
+    """
+    schedules: Dict[str, str]
+    jitter: float
+    overlap: str
+
+    def __init__(self, schedules: Dict[str, str], jitter: float = 0,
+                 overlap: str = OVERLAP_SKIP, now: Optional[float] = None) -> None:
+        """
+        :param schedules: Cron string of each goal, by config key.
+        :param jitter: Most seconds a due time is delayed by. Keep it shorter
+                       than the schedules.
+        :param overlap: OVERLAP_SKIP or OVERLAP_COALESCE.
+        :param now: Time to schedule from, defaults to the current time.
+        :raises ConfigurationError: If a cron string or the overlap policy is
+                                    not valid.
+        """
+        for goal, cron_string in schedules.items():
+            if not croniter.is_valid(cron_string):
+                raise ConfigurationError(f"Goal '{goal}' has an invalid cron_string '{cron_string}'")
+        if overlap not in (OVERLAP_SKIP, OVERLAP_COALESCE):
+            raise ConfigurationError(
+                f"overlap must be '{OVERLAP_SKIP}' or '{OVERLAP_COALESCE}', not '{overlap}'"
+            )
+        self.schedules = schedules
+        self.jitter = jitter
+        self.overlap = overlap
+        self._lock = threading.Lock()
+        self._running = set()  # type: Set[str]
+        self._queued = set()  # type: Set[str]
+        # Goals to sync as soon as possible, e.g. after a change notification
+        self._requested = set()  # type: Set[str]
+
+        now = time() if now is None else now
+        self._due = {goal: self._next(goal, now) for goal in schedules}
+
+    def _next(self, goal: str, after: float) -> float:
+        due = croniter(self.schedules[goal], after).get_next(float)
+        return due + random.uniform(0, self.jitter)
+
+    def next_wakeup(self) -> float:
+        """
+        Returns when take_due will next have goals to start.
+        """
+        with self._lock:
+            if self._requested or self._queued - self._running:
+                return 0.0
+            return min(self._due.values(), default=float("inf"))
+
+    def sleep_time(self, now: Optional[float] = None) -> float:
+        """
+        Returns how many seconds to sleep before calling take_due again.
+        """
+        now = time() if now is None else now
+        return min(max(self.next_wakeup() - now, 0.0), MAX_SLEEP)
+
+    def take_due(self, now: Optional[float] = None) -> List[str]:
+        """
+        Returns the goals to sync now and marks them as running. Goals still
+        running from a previous sync are skipped or queued to run once more,
+        depending on the overlap policy.
+        :param now: Current time, defaults to the current time.
+        :return: Config keys of the goals to sync.
+        """
+        now = time() if now is None else now
+        with self._lock:
+            ready = []
+            skipped = []
+            # Goals queued while running, and done by now
+            for goal in list(self._queued - self._running):
+                self._queued.discard(goal)
+                ready.append(goal)
+            # Requested goals that are running go again once done, as the
+            # running sync may have read the data before it changed
+            for goal in self._requested:
+                if goal in self._running:
+                    self._queued.add(goal)
+                elif goal not in ready:
+                    ready.append(goal)
+            self._requested.clear()
+
+            for goal, due in self._due.items():
+                if due > now:
+                    continue
+                self._due[goal] = self._next(goal, now)
+                if goal in ready:
+                    continue
+                if goal not in self._running:
+                    ready.append(goal)
+                elif self.overlap == OVERLAP_COALESCE:
+                    self._queued.add(goal)
+                else:
+                    skipped.append(goal)
+
+            self._running.update(ready)
+
+        if skipped:
+            logging.getLogger(__name__).warning(
+                "Skipping goals still syncing from their previous run: %s",
+                ", ".join(skipped),
+            )
+        return ready
+
+    def request(self, goals: Iterable[str]) -> None:
+        """
+        Asks for goals to be synced as soon as possible, whatever their
+        schedules.
+        """
+        with self._lock:
+            self._requested.update(goals)
+
+    def finished(self, goals: List[str]) -> None:
+        """
+        Marks goals as no longer running.
+        """
+        with self._lock:
+            self._running.difference_update(goals)
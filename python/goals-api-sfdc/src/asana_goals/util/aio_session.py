@@ -0,0 +1,199 @@
+"""
+Asyncio counterpart of session.py: an aiohttp session with a bounded
+connection pool, the same retry policy and a default timeout on every call.
+Requires the optional aiohttp dependency (pip install "asana_goals[async]").
+"""
+import asyncio
+import json
+import logging
+from typing import Any, Callable, NamedTuple, Optional
+
+import requests
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+from .session import (
+    DEFAULT_POOL_SIZE,
+    DEFAULT_MAX_RETRIES,
+    DEFAULT_BACKOFF_FACTOR,
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_READ_TIMEOUT,
+    RETRY_STATUSES,
+)
+
+__all__ = ["AsyncResponse", "AsyncSession", "debug_async_response", "require_aiohttp"]
+
+# Methods retried after server errors, as they are safe to repeat
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "PUT", "DELETE", "OPTIONS", "TRACE"})
+# Longest pause between retries, in seconds
+MAX_BACKOFF = 120.0
+# Bytes of a streamed response body read at a time
+CHUNK_SIZE = 64 * 1024
+
+
+def require_aiohttp() -> None:
+    """
+    Raises if aiohttp is not installed.
+    """
+    if aiohttp is None:
+        raise RuntimeError(
+            'The async clients require aiohttp: pip install "asana_goals[async]"'
+        )
+
+
+class AsyncResponse(NamedTuple):
+    """
+    Response read in full, so the connection can go back to the pool.
+    """
+    status_code: int
+    url: str
+    content: bytes
+    # Result of the parser the body was streamed to instead of kept in content
+    parsed: Any = None
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+    def raise_for_status(self) -> None:
+        """
+        Raises the same error as requests.Response.raise_for_status.
+        """
+        if self.status_code >= 400:
+            kind = "Client" if self.status_code < 500 else "Server"
+            raise requests.HTTPError(
+                f"{self.status_code} {kind} Error for url: {self.url}"
+            )
+
+
+class AsyncSession:
+    """
+    Wraps an aiohttp ClientSession, which is only created once a call is made
+    from a running event loop. Like the requests session, rate limited calls
+    (429) are retried for every method and server errors only for idempotent
+    methods, honoring Retry-After headers and otherwise backing off
+    exponentially.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        backoff_factor: float = DEFAULT_BACKOFF_FACTOR,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        read_timeout: float = DEFAULT_READ_TIMEOUT,
+    ) -> None:
+        """
+        :param pool_size: Connections kept open, across hosts.
+        :param max_retries: Retries of a call before its last response (or
+                            error) is returned.
+        :param backoff_factor: Base of the exponential backoff between
+                               retries, in seconds.
+        :param connect_timeout: Seconds to wait for a connection.
+        :param read_timeout: Seconds to wait for data from the server.
+        """
+        require_aiohttp()
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._session = None  # type: Optional[aiohttp.ClientSession]
+
+    def _get_session(self) -> "aiohttp.ClientSession":
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=aiohttp.ClientTimeout(
+                    total=None,
+                    sock_connect=self.connect_timeout,
+                    sock_read=self.read_timeout,
+                ),
+            )
+        return self._session
+
+    async def close(self) -> None:
+        """
+        Closes the pooled connections.
+        """
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def request(self, method: str, url: str, token: Optional[str] = None,
+                      parser: Optional[Callable[[], Any]] = None, **kwargs) -> AsyncResponse:
+        """
+        Sends a request, retrying it as needed.
+        :param method: HTTP method.
+        :param url: Full URL.
+        :param token: Bearer token to authenticate with, if any.
+        :param parser: Returns an incremental parser, with feed(chunk) and
+                       close() methods like ReportStreamParser. If set, a
+                       successful response body is fed to it as it arrives,
+                       and what close returns is the parsed field of the
+                       response.
+        :param kwargs: Passed on to aiohttp (json, data, params...).
+        :return: Last response.
+        """
+        method = method.upper()
+        if token is not None:
+            kwargs["headers"] = dict(kwargs.get("headers") or {}, Authorization="Bearer " + token)
+
+        attempt = 0
+        while True:
+            try:
+                async with self._get_session().request(method, url, **kwargs) as resp:
+                    if parser is not None and resp.status < 300:
+                        response = AsyncResponse(
+                            resp.status, str(resp.url), b"", await self._parse(resp, parser())
+                        )
+                    else:
+                        response = AsyncResponse(resp.status, str(resp.url), await resp.read())
+                    retry_after = resp.headers.get("Retry-After")
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if method not in IDEMPOTENT_METHODS or attempt >= self.max_retries:
+                    raise
+                response, retry_after = None, None
+
+            if response is not None and not self._is_retry(method, response.status_code):
+                return response
+            if attempt >= self.max_retries:
+                return response
+
+            attempt += 1
+            await asyncio.sleep(self._backoff(attempt, retry_after))
+
+    @staticmethod
+    async def _parse(resp: "aiohttp.ClientResponse", parser: Any) -> Any:
+        async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+            if parser.feed(chunk):
+                break
+        return parser.close()
+
+    @staticmethod
+    def _is_retry(method: str, status: int) -> bool:
+        if status == 429:
+            return True
+        return status in RETRY_STATUSES and method in IDEMPOTENT_METHODS
+
+    def _backoff(self, attempt: int, retry_after: Optional[str]) -> float:
+        if retry_after:
+            try:
+                return min(float(retry_after), MAX_BACKOFF)
+            except ValueError:
+                pass
+        if attempt <= 1:
+            return 0.0
+        return min(self.backoff_factor * 2 ** (attempt - 1), MAX_BACKOFF)
+
+
+def debug_async_response(module_name: str, resp: AsyncResponse) -> None:
+    logging.getLogger(module_name).debug(
+        "Received response [%s]: %s", resp.status_code, resp.text
+    )
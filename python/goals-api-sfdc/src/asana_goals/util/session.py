@@ -0,0 +1,99 @@
+"""
+Shared HTTP transport: a connection-pooled requests Session that retries rate
+limited and failed requests and applies a default timeout to every call.
+"""
+from typing import Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+__all__ = [
+    "DEFAULT_POOL_SIZE",
+    "DEFAULT_MAX_RETRIES",
+    "DEFAULT_BACKOFF_FACTOR",
+    "DEFAULT_CONNECT_TIMEOUT",
+    "DEFAULT_READ_TIMEOUT",
+    "RetryPolicy",
+    "TimeoutHTTPAdapter",
+    "make_session",
+]
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BACKOFF_FACTOR = 0.5
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 60.0
+
+# Statuses worth trying again after a pause
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class RetryPolicy(Retry):
+    """
+    Retry policy for API calls. A 429 means the request was turned away
+    before being processed, so it is retried for every method, POST
+    included. Server errors are only retried for idempotent methods, as the
+    request may have been applied. Retry-After headers are honored, and
+    otherwise retries back off exponentially.
+    """
+
+    def is_retry(self, method: str, status_code: int, has_retry_after: bool = False) -> bool:
+        if status_code == 429 and self.total:
+            return True
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter applying a default timeout to every request sent without
+    one.
+    """
+
+    def __init__(self, *args, timeout: Optional[Tuple[float, float]] = None, **kwargs):
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        return super().send(request, **kwargs)
+
+
+def make_session(
+    pool_size: int = DEFAULT_POOL_SIZE,
+    max_retries: int = DEFAULT_MAX_RETRIES,
+    backoff_factor: float = DEFAULT_BACKOFF_FACTOR,
+    connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+    read_timeout: float = DEFAULT_READ_TIMEOUT,
+) -> requests.Session:
+    """
+    Creates a Session whose connections are kept alive and reused across
+    calls, so only the first call to a host pays for the TCP and TLS
+    handshakes.
+    :param pool_size: Connections kept open per host.
+    :param max_retries: Retries of a call before its last response (or
+                        error) is returned.
+    :param backoff_factor: Base of the exponential backoff between retries,
+                           in seconds.
+    :param connect_timeout: Seconds to wait for a connection.
+    :param read_timeout: Seconds to wait for data from the server.
+    :return: Configured Session.
+    """
+    retry = RetryPolicy(
+        total=max_retries,
+        status_forcelist=RETRY_STATUSES,
+        backoff_factor=backoff_factor,
+        # The last response is returned so raise_for_status() reports it
+        raise_on_status=False,
+    )
+    adapter = TimeoutHTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=retry,
+        timeout=(connect_timeout, read_timeout),
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
@@ -0,0 +1,217 @@
+import asyncio
+import json
+import os
+import threading
+from collections import Counter
+from tempfile import TemporaryDirectory
+from unittest import TestCase, skipIf
+from unittest.mock import patch
+
+import requests
+
+try:
+    from aiohttp import web
+except ImportError:
+    web = None
+
+from asana_goals.asana.goal import GoalStatus
+from asana_goals.goal_graph import GoalGraph
+
+from .test_asana_client import test_goal
+from .test_goal_graph import test_goals
+from .test_main import test_shared_report_config
+from .test_salesforce_client import test_private_key, test_report
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+class FakeServer:
+    """
+    Serves fake Asana and Salesforce APIs from a thread, counting the calls
+    to each path.
+    """
+
+    def __init__(self):
+        self.calls = Counter()
+        # Statuses to answer with before succeeding, by path
+        self.failures = {}
+        self.values = {}
+        self.loop = asyncio.new_event_loop()
+        self.started = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        self.started.wait(5)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        app = web.Application()
+        app.router.add_route("*", "/{path:.*}", self._handle)
+        self.runner = web.AppRunner(app)
+        self.loop.run_until_complete(self.runner.setup())
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        self.loop.run_until_complete(site.start())
+        self.url = "http://127.0.0.1:{}".format(site._server.sockets[0].getsockname()[1])
+        self.started.set()
+        self.loop.run_forever()
+        self.loop.run_until_complete(self.runner.cleanup())
+        self.loop.close()
+
+    async def _handle(self, request):
+        path = "/" + request.match_info["path"]
+        self.calls[path] += 1
+        failures = self.failures.get(path)
+        if failures:
+            return web.Response(status=failures.pop(0), headers={"Retry-After": "0"})
+
+        if path == "/services/oauth2/token":
+            return web.json_response({
+                "instance_url": self.url,
+                "access_token": "token{}".format(self.calls[path]),
+            })
+        if path.startswith("/services/data/"):
+            if request.headers.get("Authorization") == "Bearer expired":
+                return web.Response(status=401)
+            await asyncio.sleep(0.05)
+            return web.json_response(test_report)
+
+        gid = path.split("/")[2]
+        goal = json.loads(json.dumps(test_goal))
+        goal["data"]["gid"] = gid
+        if path.endswith("/setMetricCurrentValue"):
+            body = await request.json()
+            self.values[gid] = body["data"]["current_number_value"]
+        goal["data"]["metric"]["current_number_value"] = float(self.values.get(gid, 0))
+        goal["data"]["metric"]["target_number_value"] = 100
+        return web.json_response(goal)
+
+
+@skipIf(web is None, "aiohttp is not installed")
+class TestAsyncClients(TestCase):
+    def test_asana_write_retried(self):
+        from asana_goals.asana.aio import AsyncAsana
+
+        async def write(url):
+            with patch("asana_goals.asana.aio.BASE_URL", url):
+                async with AsyncAsana("dummy", backoff_factor=0) as client:
+                    goal = await client.set_metric_current_value("1", 50)
+                    status = await client.update_goal_status("1", GoalStatus.AT_RISK)
+                    return goal, status
+
+        with FakeServer() as server:
+            server.failures["/goals/1/setMetricCurrentValue"] = [429]
+            server.failures["/goals/1"] = [500]
+            goal, status = run(write(server.url))
+        assert goal.current_value == 50
+        assert server.calls["/goals/1/setMetricCurrentValue"] == 2
+        assert server.calls["/goals/1"] == 2
+
+    def test_asana_error_raised(self):
+        from asana_goals.asana.aio import AsyncAsana
+
+        async def write(url):
+            with patch("asana_goals.asana.aio.BASE_URL", url):
+                async with AsyncAsana("dummy", backoff_factor=0) as client:
+                    await client.set_metric_current_value("1", 50)
+
+        with FakeServer() as server:
+            server.failures["/goals/1/setMetricCurrentValue"] = [500]
+            with self.assertRaises(requests.HTTPError):
+                run(write(server.url))
+        assert server.calls["/goals/1/setMetricCurrentValue"] == 1
+
+    def test_salesforce_token_shared(self):
+        from asana_goals.data_source.salesforce.aio import AsyncReportCache, AsyncSalesforce
+
+        async def fetch(url, key_file):
+            with patch("asana_goals.data_source.salesforce.client.LOGIN_BASE_URL", url):
+                async with AsyncSalesforce("dummy", "dummy", key_file) as sf:
+                    cache = AsyncReportCache(sf.get_report)
+                    cache.new_tick()
+                    reports = await asyncio.gather(
+                        *[sf.get_report("1") for _ in range(4)],
+                        *[cache.get_report("2") for _ in range(4)]
+                    )
+                    # A rejected token is replaced once
+                    sf._access_token = "expired"
+                    await sf.get_report("1")
+                    return reports
+
+        with TemporaryDirectory() as tmp, FakeServer() as server:
+            key_file = os.path.join(tmp, "key.pem")
+            with open(key_file, "wb") as f:
+                f.write(test_private_key)
+            reports = run(fetch(server.url, key_file))
+        assert all(rpt.get_metric("s!AMOUNT") == 3745000.0 for rpt in reports)
+        prefix = "/services/data/v52.0/analytics/reports/"
+        assert server.calls["/services/oauth2/token"] == 2
+        assert server.calls[prefix + "1"] == 6
+        assert server.calls[prefix + "2"] == 1
+
+    def test_main_process(self):
+        from asana_goals.aio import AsyncMainProcess
+
+        with TemporaryDirectory() as tmp, FakeServer() as server:
+            key_file = os.path.join(tmp, "key.pem")
+            with open(key_file, "wb") as f:
+                f.write(test_private_key)
+            config_file = os.path.join(tmp, "config.toml")
+            with open(config_file, "w") as f:
+                f.write(test_shared_report_config.replace(
+                    '"<YOUR PRIIVATE KEY FILE>"', json.dumps(key_file)
+                ))
+
+            with patch("asana_goals.asana.aio.BASE_URL", server.url), \
+                    patch("asana_goals.data_source.salesforce.client.LOGIN_BASE_URL", server.url):
+                process = AsyncMainProcess(config_file, False)
+                assert process.main() == 0
+
+        # Both goals read the same report
+        assert server.calls["/services/data/v52.0/analytics/reports/00O5f0000011TjQEAU"] == 1
+        for goal in process.graph.order:
+            assert server.calls["/goals/{}/setMetricCurrentValue".format(
+                process.goals[goal]["goal_id"]
+            )] == 1
+        assert process.synced["nmv_growth"].current_value == 3745000.0
+
+
+class TestGoalGraphAsync(TestCase):
+    def test_run_async_order(self):
+        graph = GoalGraph(test_goals, ["parent", "unused"])
+        synced = []
+
+        async def sync(goal):
+            for subgoal in graph.dependencies[goal]:
+                assert subgoal in synced
+            await asyncio.sleep(0)
+            synced.append(goal)
+            return goal.upper()
+
+        results = run(graph.run_async(sync, 2))
+        assert sorted(synced) == sorted(graph.order)
+        assert results["parent"] == "PARENT"
+
+    def test_run_async_skips_dependents_of_failed_goals(self):
+        graph = GoalGraph(test_goals, ["parent", "unused"])
+        synced = []
+
+        async def sync(goal):
+            if goal == "leaf":
+                raise RuntimeError("failed")
+            synced.append(goal)
+
+        with self.assertRaisesRegex(RuntimeError, "failed"):
+            run(graph.run_async(sync, 2))
+        assert sorted(synced) == ["child_1", "unused"]
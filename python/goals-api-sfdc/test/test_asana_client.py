@@ -5,6 +5,7 @@ from copy import deepcopy
 import requests
 import responses
 
+from asana_goals.asana.batch import BatchActionError
 from asana_goals.asana.client import Asana
 from asana_goals.asana.goal import Goal, GoalStatus
 
@@ -115,6 +116,18 @@ class TestAsanaClient(TestCase):
         assert responses.calls[0].request.headers.get("Authorization") == "Bearer dummy"
         assert json.loads(responses.calls[0].request.body)["data"]["current_number_value"] == 100
 
+    @responses.activate
+    def test_asana_get_webhooks(self):
+        url = "https://app.asana.com/api/1.0/webhooks"
+        responses.add(responses.GET, url, json={
+            "data": [{"gid": "1"}], "next_page": {"offset": "abc"},
+        })
+        responses.add(responses.GET, url, json={"data": [{"gid": "2"}], "next_page": None})
+        client = Asana("dummy")
+        assert client.get_webhooks("123") == [{"gid": "1"}, {"gid": "2"}]
+        assert "workspace=123" in responses.calls[0].request.url
+        assert "offset=abc" in responses.calls[1].request.url
+
     def test_asana_semaphore_parsing(self):
         goal_obj = deepcopy(test_goal)
         goal = Goal(goal_obj)
@@ -157,3 +170,124 @@ class TestAsanaClient(TestCase):
         assert len(responses.calls) == 1
         assert responses.calls[0].request.headers.get("Authorization") == "Bearer dummy"
         assert json.loads(responses.calls[0].request.body)["data"]["status"] == "green"
+
+    @responses.activate
+    def test_asana_rate_limited_write_retried(self):
+        url = f"https://app.asana.com/api/1.0/goals/{test_goal['data']['gid']}/setMetricCurrentValue"
+        responses.add(responses.POST, url, status=429, headers={"Retry-After": "0"})
+        responses.add(responses.POST, url, status=200, json=test_goal)
+        client = Asana("dummy", backoff_factor=0)
+        goal = client.set_metric_current_value(test_goal["data"]["gid"], 100)
+        assert len(responses.calls) == 2
+        assert goal.gid == test_goal["data"]["gid"]
+
+    @responses.activate
+    def test_asana_server_error_on_write_not_retried(self):
+        url = f"https://app.asana.com/api/1.0/goals/{test_goal['data']['gid']}/setMetricCurrentValue"
+        responses.add(responses.POST, url, status=500)
+        responses.add(responses.POST, url, status=200, json=test_goal)
+        client = Asana("dummy", backoff_factor=0)
+        with self.assertRaises(requests.HTTPError):
+            client.set_metric_current_value(test_goal["data"]["gid"], 100)
+        assert len(responses.calls) == 1
+
+    @responses.activate
+    def test_asana_server_error_on_update_retried(self):
+        url = f"https://app.asana.com/api/1.0/goals/{test_goal['data']['gid']}"
+        responses.add(responses.PUT, url, status=503)
+        responses.add(responses.PUT, url, status=200, json=test_goal)
+        client = Asana("dummy", backoff_factor=0)
+        client.update_goal_status(test_goal["data"]["gid"], GoalStatus.ON_TRACK)
+        assert len(responses.calls) == 2
+
+    @responses.activate
+    def test_asana_retries_exhausted_raises(self):
+        url = f"https://app.asana.com/api/1.0/goals/{test_goal['data']['gid']}"
+        responses.add(responses.PUT, url, status=429, headers={"Retry-After": "0"})
+        client = Asana("dummy", max_retries=2, backoff_factor=0)
+        with self.assertRaises(requests.HTTPError):
+            client.update_goal_status(test_goal["data"]["gid"], GoalStatus.ON_TRACK)
+        assert len(responses.calls) == 3
+
+    @responses.activate
+    def test_asana_default_timeout(self):
+        responses.add(
+            responses.GET,
+            "https://app.asana.com/api/1.0/workspaces",
+            status=200,
+            json={"data": []},
+        )
+        client = Asana("dummy", connect_timeout=1.5, read_timeout=7.0)
+        client.get_workspaces()
+        assert responses.calls[0].request.req_kwargs["timeout"] == (1.5, 7.0)
+
+    @staticmethod
+    def _batch_callback(request):
+        # Answers each action with the test goal, failing the ones on goal 0
+        actions = json.loads(request.body)["data"]["actions"]
+        results = []
+        for action in actions:
+            if action["relative_path"].startswith("/goals/0"):
+                results.append({"status_code": 404, "body": {
+                    "errors": [{"message": "goal: Unknown object: 0"}]
+                }})
+            else:
+                results.append({"status_code": 200, "body": test_goal})
+        return 200, {}, json.dumps({"data": results})
+
+    @responses.activate
+    def test_asana_batch_chunked(self):
+        responses.add_callback(
+            responses.POST,
+            "https://app.asana.com/api/1.0/batch",
+            callback=self._batch_callback,
+            content_type="application/json",
+        )
+        client = Asana("dummy")
+        with client.batch() as batch:
+            futures = [
+                batch.set_metric_current_value(str(gid), gid) for gid in range(1, 13)
+            ]
+            futures.append(batch.update_goal_status("13", GoalStatus.AT_RISK))
+        assert len(responses.calls) == 2
+        sent = [json.loads(c.request.body)["data"]["actions"] for c in responses.calls]
+        assert [len(actions) for actions in sent] == [10, 3]
+        assert sent[0][0] == {
+            "method": "post",
+            "relative_path": "/goals/1/setMetricCurrentValue",
+            "data": {"current_number_value": 1},
+        }
+        assert sent[1][-1] == {
+            "method": "put",
+            "relative_path": "/goals/13",
+            "data": {"status": "yellow"},
+        }
+        assert all(isinstance(f.result(), Goal) for f in futures)
+
+    @responses.activate
+    def test_asana_batch_action_error(self):
+        responses.add_callback(
+            responses.POST,
+            "https://app.asana.com/api/1.0/batch",
+            callback=self._batch_callback,
+            content_type="application/json",
+        )
+        client = Asana("dummy")
+        batch = client.batch()
+        failed = batch.update_goal_status("0", GoalStatus.ON_TRACK)
+        succeeded = batch.update_goal_status("1", GoalStatus.ON_TRACK)
+        with self.assertRaises(BatchActionError) as cm:
+            batch.wait(failed)
+        assert cm.exception.status_code == 404
+        assert "Unknown object" in str(cm.exception)
+        assert batch.wait(succeeded).gid == test_goal["data"]["gid"]
+        assert len(responses.calls) == 1
+
+    @responses.activate
+    def test_asana_batch_request_error(self):
+        responses.add(responses.POST, "https://app.asana.com/api/1.0/batch", status=400)
+        client = Asana("dummy")
+        batch = client.batch()
+        future = batch.add_subgoal("1", "2")
+        with self.assertRaises(requests.HTTPError):
+            batch.wait(future)
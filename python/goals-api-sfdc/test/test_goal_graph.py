@@ -0,0 +1,105 @@
+import threading
+from unittest import TestCase
+
+from asana_goals.goal_graph import ConfigurationError, GoalGraph
+
+test_goals = {
+    "parent": {
+        "source": "composite",
+        "subgoals": ["child_1", "child_2"],
+        "weights": [0.5, 0.5],
+    },
+    "child_1": {"source": "fixed", "value": 1},
+    "child_2": {
+        "source": "composite",
+        "subgoals": ["child_1", "leaf"],
+        "weights": [0.5, 0.5],
+    },
+    "leaf": {"source": "fixed", "value": 2},
+    "unused": {"source": "fixed", "value": 3},
+}
+
+
+class TestGoalGraph(TestCase):
+    def test_subgoals_ordered_first(self):
+        graph = GoalGraph(test_goals, ["parent"])
+        assert set(graph.order) == {"parent", "child_1", "child_2", "leaf"}
+        for goal, subgoals in graph.dependencies.items():
+            for subgoal in subgoals:
+                assert graph.order.index(subgoal) < graph.order.index(goal)
+
+    def test_ancestors(self):
+        graph = GoalGraph(test_goals, ["parent", "unused"])
+        assert graph.ancestors(["leaf"]) == ["child_2", "parent"]
+        assert graph.ancestors(["child_1"]) == ["child_2", "parent"]
+        assert graph.ancestors(["parent", "unused"]) == []
+
+    def test_goals_indexed_by_source(self):
+        goals = {
+            "parent": {"goal_id": "1", "source": "composite",
+                       "subgoals": ["a", "b"], "weights": [0.5, 0.5]},
+            "a": {"goal_id": "2", "source": "salesforce_report", "sf_report_id": "r"},
+            "b": {"goal_id": 3, "source": "salesforce_report", "sf_report_id": "r"},
+        }
+        graph = GoalGraph(goals, ["parent"])
+        assert graph.by_goal_id == {"1": ["parent"], "2": ["a"], "3": ["b"]}
+        assert graph.by_report_id == {"r": ["a", "b"]}
+
+    def test_dangling_reference_rejected(self):
+        goals = dict(test_goals, leaf={
+            "source": "composite", "subgoals": ["missing"], "weights": [1],
+        })
+        with self.assertRaisesRegex(ConfigurationError, "missing"):
+            GoalGraph(goals, ["parent"])
+        with self.assertRaisesRegex(ConfigurationError, "missing"):
+            GoalGraph(test_goals, ["missing"])
+
+    def test_cycle_rejected(self):
+        goals = dict(test_goals, leaf={
+            "source": "composite", "subgoals": ["child_2"], "weights": [1],
+        })
+        with self.assertRaisesRegex(ConfigurationError, "child_2 -> leaf -> child_2"):
+            GoalGraph(goals, ["parent"])
+
+    def test_weights_checked(self):
+        goals = dict(test_goals, parent=dict(test_goals["parent"], weights=[1]))
+        with self.assertRaises(ConfigurationError):
+            GoalGraph(goals, ["parent"])
+
+    def test_run_syncs_subgoals_first(self):
+        graph = GoalGraph(test_goals, ["parent", "unused"])
+        lock = threading.Lock()
+        synced = []
+
+        def sync(goal):
+            with lock:
+                for subgoal in graph.dependencies[goal]:
+                    assert subgoal in synced
+                synced.append(goal)
+            return goal.upper()
+
+        results = graph.run(sync, 4)
+        assert sorted(synced) == sorted(graph.order)
+        assert results["leaf"] == "LEAF"
+
+    def test_run_is_concurrent(self):
+        goals = {
+            "goal_{}".format(i): {"source": "fixed", "value": i} for i in range(3)
+        }
+        graph = GoalGraph(goals, list(goals))
+        # Only passes if all three goals are syncing at the same time
+        barrier = threading.Barrier(3, timeout=5)
+        graph.run(lambda goal: barrier.wait(), 3)
+
+    def test_run_skips_dependents_of_failed_goals(self):
+        graph = GoalGraph(test_goals, ["parent", "unused"])
+        synced = []
+
+        def sync(goal):
+            if goal == "leaf":
+                raise RuntimeError("failed")
+            synced.append(goal)
+
+        with self.assertRaisesRegex(RuntimeError, "failed"):
+            graph.run(sync, 2)
+        assert sorted(synced) == ["child_1", "unused"]
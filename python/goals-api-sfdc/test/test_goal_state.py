@@ -0,0 +1,52 @@
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from asana_goals.asana.goal import Goal, GoalStatus
+from asana_goals.goal_state import GoalState
+
+test_goal = Goal({"data": {"gid": "1", "status": "green"}})
+
+
+class TestGoalState(TestCase):
+    def test_changes_detected(self):
+        state = GoalState()
+        assert state.goal("goal", "1") is None
+        assert state.value_changed("goal", "1", 5)
+        assert state.status_changed("goal", "1", GoalStatus.ON_TRACK)
+
+        state.record("goal", "1", test_goal, value=5, status=GoalStatus.ON_TRACK)
+        assert not state.value_changed("goal", "1", 5)
+        assert not state.value_changed("goal", "1", "5")
+        assert state.value_changed("goal", "1", 6)
+        assert not state.status_changed("goal", "1", GoalStatus.ON_TRACK)
+        assert state.status_changed("goal", "1", GoalStatus.AT_RISK)
+        assert state.goal("goal", "1").gid == "1"
+
+        # Pointing the config key at another goal starts over
+        assert state.value_changed("goal", "2", 5)
+        assert state.goal("goal", "2") is None
+
+    def test_persisted(self):
+        with TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, "state.json")
+            state = GoalState(filename)
+            state.record("goal", "1", test_goal, value=0.92, status=GoalStatus.ON_TRACK)
+            assert state.count_sync("goal", "1") == 1
+            state.save()
+
+            state = GoalState(filename)
+            assert not state.value_changed("goal", "1", 0.92)
+            assert not state.status_changed("goal", "1", GoalStatus.ON_TRACK)
+            assert state.goal("goal", "1").status == GoalStatus.ON_TRACK
+            assert state.count_sync("goal", "1") == 2
+            # Counting starts over for another goal GID
+            assert state.count_sync("goal", "2") == 1
+
+    def test_unreadable_file_ignored(self):
+        with TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, "state.json")
+            with open(filename, "w") as f:
+                f.write("{")
+            state = GoalState(filename)
+            assert state.value_changed("goal", "1", 5)
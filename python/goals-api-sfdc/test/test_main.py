@@ -1,7 +1,12 @@
+from time import time
 from unittest import TestCase
-from unittest.mock import patch, mock_open
+from unittest.mock import Mock, patch, mock_open
 
 from asana_goals.__main__ import MainProcess
+from asana_goals.asana import AsanaBatch
+from asana_goals.asana.goal import Goal
+from asana_goals.goal_graph import ConfigurationError
+from asana_goals.scheduler import Scheduler
 
 test_config = """
 [asana]
@@ -57,6 +62,15 @@ goals=[
     value="58000"
 """
 
+# Two goals reading different metrics from the same report
+test_shared_report_config = test_config.replace('"general_progress"', '"nmv_count"') + """
+    [goals.nmv_count]
+    goal_id="1201008336897092"
+    source="salesforce_report"
+    sf_report_id="00O5f0000011TjQEAU"
+    sf_metric="RowCount"
+"""
+
 
 class TestMain(TestCase):
     @patch("asana_goals.__main__.Asana", autospec=True)
@@ -69,3 +83,233 @@ class TestMain(TestCase):
         # Should have exited and not looped
         assert asana_mock.called
         assert sf_mock.called
+
+    @patch("asana_goals.__main__.Asana", autospec=True)
+    @patch("asana_goals.__main__.Salesforce", autospec=True)
+    @patch("builtins.open", new_callable=mock_open,
+           read_data=test_config.replace('"subgoal_3",', '"subgoal_4",'))
+    def test_missing_subgoal_rejected_at_startup(self, open_mock, sf_mock, asana_mock):
+        with self.assertRaises(ConfigurationError):
+            MainProcess("test_config", False)
+        assert not asana_mock.return_value.set_metric_current_value.called
+
+    @patch("asana_goals.__main__.Asana", autospec=True)
+    @patch("asana_goals.__main__.Salesforce", autospec=True)
+    @patch("builtins.open", new_callable=mock_open, read_data=test_config)
+    def test_composite_synced_after_subgoals(self, open_mock, sf_mock, asana_mock):
+        process = MainProcess("test_config", False)
+        process.main()
+
+        asana = asana_mock.return_value
+        updated = [c[0][0] for c in asana.set_metric_current_value.call_args_list]
+        assert sorted(updated) == sorted(
+            process.goals[goal]["goal_id"] for goal in process.graph.order
+        )
+        composite = updated.index(process.goals["general_progress"]["goal_id"])
+        for subgoal in ("subgoal_1", "subgoal_2", "subgoal_3"):
+            assert updated.index(process.goals[subgoal]["goal_id"]) < composite
+
+    @staticmethod
+    def _fake_goal(goal_gid, value=None, status=None):
+        return Goal({"data": {
+            "gid": goal_gid,
+            "status": status,
+            "metric": {
+                "current_number_value": float(value or 0),
+                "target_number_value": 100,
+            },
+        }})
+
+    def _fake_asana(self, asana_mock):
+        # Asana returns the whole goal after each write
+        values = {}
+
+        def set_value(gid, value):
+            values[gid] = value
+            return self._fake_goal(gid, value)
+
+        asana = asana_mock.return_value
+        asana.set_metric_current_value.side_effect = set_value
+        asana.update_goal_status.side_effect = \
+            lambda gid, status: self._fake_goal(gid, values[gid], status.value)
+        return asana
+
+    @patch("asana_goals.__main__.Asana", autospec=True)
+    @patch("asana_goals.__main__.Salesforce", autospec=True)
+    @patch("builtins.open", new_callable=mock_open, read_data=test_config)
+    def test_unchanged_goals_not_written(self, open_mock, sf_mock, asana_mock):
+        asana = self._fake_asana(asana_mock)
+        sf_mock.return_value.get_report.return_value.get_metric.return_value = 50
+
+        process = MainProcess("test_config", False)
+        process.loop()
+        assert asana.set_metric_current_value.call_count == 5
+        assert asana.update_goal_status.call_count == 5
+
+        process.loop()
+        assert asana.set_metric_current_value.call_count == 5
+        assert asana.update_goal_status.call_count == 5
+
+        # Only the changed goal and the composite using it are written
+        process.goals["subgoal_2"]["value"] = "41"
+        process.loop()
+        updated = [c[0][0] for c in asana.set_metric_current_value.call_args_list[5:]]
+        assert sorted(updated) == sorted([
+            process.goals["subgoal_2"]["goal_id"],
+            process.goals["general_progress"]["goal_id"],
+        ])
+
+        # Forced refreshes write everything, every goal is on its 4th sync
+        process.force_refresh_every = 4
+        process.loop()
+        assert asana.set_metric_current_value.call_count == 12
+        assert asana.update_goal_status.call_count == 10
+
+    @patch("asana_goals.__main__.Asana", autospec=True)
+    @patch("asana_goals.__main__.Salesforce", autospec=True)
+    @patch("builtins.open", new_callable=mock_open, read_data=test_config)
+    def test_forced_refresh_per_goal(self, open_mock, sf_mock, asana_mock):
+        asana = self._fake_asana(asana_mock)
+        sf_mock.return_value.get_report.return_value.get_metric.return_value = 50
+        process = MainProcess("test_config", False)
+        process.force_refresh_every = 2
+        process.loop()
+        assert asana.set_metric_current_value.call_count == 5
+
+        # A goal synced on its own is refreshed on its own 2nd sync...
+        process.loop(["nmv_growth"])
+        assert asana.set_metric_current_value.call_count == 6
+        # ...and the others on theirs, whatever runs went in between
+        process.loop()
+        updated = [c[0][0] for c in asana.set_metric_current_value.call_args_list[6:]]
+        assert process.goals["nmv_growth"]["goal_id"] not in updated
+        assert len(updated) == 4
+
+    @patch("asana_goals.__main__.Asana", autospec=True)
+    @patch("asana_goals.__main__.Salesforce", autospec=True)
+    @patch("builtins.open", new_callable=mock_open, read_data=test_shared_report_config)
+    def test_report_shared_by_goals(self, open_mock, sf_mock, asana_mock):
+        self._fake_asana(asana_mock)
+        sf_mock.return_value.get_report.return_value.get_metric.return_value = 50
+        process = MainProcess("test_config", False)
+        process.loop()
+        assert sf_mock.return_value.get_report.call_count == 1
+        process.loop()
+        assert sf_mock.return_value.get_report.call_count == 2
+
+    @patch("asana_goals.__main__.Asana", autospec=True)
+    @patch("asana_goals.__main__.Salesforce", autospec=True)
+    @patch("builtins.open", new_callable=mock_open,
+           read_data=test_config.replace("[app]", "[app]\nbatch_writes=true"))
+    def test_batched_writes(self, open_mock, sf_mock, asana_mock):
+        sf_mock.return_value.get_report.return_value.get_metric.return_value = 50
+        asana = asana_mock.return_value
+        asana.batch.side_effect = lambda linger: AsanaBatch(asana, linger)
+        actions = []
+
+        def send_batch(batch):
+            actions.extend(batch)
+            return [
+                {"status_code": 200, "body": self._fake_goal("1", 50, "green").source}
+                for _ in batch
+            ]
+
+        asana.send_batch.side_effect = send_batch
+        process = MainProcess("test_config", False)
+        process.loop()
+        assert not asana.set_metric_current_value.called
+        assert not asana.update_goal_status.called
+        assert len(actions) == 10
+        assert asana.send_batch.call_count < 10
+
+    @patch("asana_goals.__main__.Asana", autospec=True)
+    @patch("asana_goals.__main__.Salesforce", autospec=True)
+    @patch("builtins.open", new_callable=mock_open, read_data=test_config.replace(
+        'source="salesforce_report"', 'source="salesforce_report"\n    cron_string="0 * * * *"'
+    ))
+    def test_service_runs_due_goals(self, open_mock, sf_mock, asana_mock):
+        process = MainProcess("test_config", True)
+        assert process.schedules()["nmv_growth"] == "0 * * * *"
+        assert process.schedules()["subgoal_1"] == "*/5 * * * *"
+
+        runs = []
+
+        def loop(goals):
+            runs.append(sorted(goals))
+            process.stop()
+
+        # Everything is due
+        process.scheduler = Scheduler(process.schedules(), now=time() - 3600)
+        process.loop = loop
+        assert process.main() == 0
+        assert runs == [sorted(process.graph.order)]
+
+    @patch("asana_goals.__main__.Asana", autospec=True)
+    @patch("asana_goals.__main__.Salesforce", autospec=True)
+    @patch("builtins.open", new_callable=mock_open, read_data=test_config)
+    def test_composite_uses_latest_subgoals(self, open_mock, sf_mock, asana_mock):
+        asana = self._fake_asana(asana_mock)
+        sf_mock.return_value.get_report.return_value.get_metric.return_value = 50
+        process = MainProcess("test_config", False)
+        process.loop()
+        assert asana.set_metric_current_value.call_count == 5
+
+        # Only the composite is due, its subgoals are not synced again
+        process.goals["subgoal_2"]["value"] = "41"
+        process.force_refresh_every = 1
+        process.loop(["general_progress"])
+        updated = [c[0][0] for c in asana.set_metric_current_value.call_args_list[5:]]
+        assert updated == [process.goals["general_progress"]["goal_id"]]
+
+    @patch("asana_goals.__main__.Asana", autospec=True)
+    @patch("asana_goals.__main__.Salesforce", autospec=True)
+    @patch("builtins.open", new_callable=mock_open,
+           read_data=test_config + "\n[receiver]\nport=0\n")
+    def test_changes_sync_affected_goals(self, open_mock, sf_mock, asana_mock):
+        asana = self._fake_asana(asana_mock)
+        asana.get_goal.side_effect = lambda gid: self._fake_goal(gid, 60)
+        process = MainProcess("test_config", True)
+        assert process.receiver is not None
+        process.receiver.start = Mock()
+        asana.get_me.return_value = {"gid": "1200000000000001"}
+        process.start_receiver()
+        assert process.receiver.own_user_gid == "1200000000000001"
+        assert process.receiver.goal_gids == set(process.graph.by_goal_id)
+        process.reports = Mock(wraps=process.reports)
+
+        process.reports_changed(["00O5f0000011TjQEAU", "unknown"])
+        process.reports.invalidate.assert_any_call("00O5f0000011TjQEAU")
+        assert process.scheduler.take_due() == ["nmv_growth"]
+        process.scheduler.finished(["nmv_growth"])
+
+        # A subgoal edited in Asana only recomputes the goals above it
+        process.goals_changed([process.goals["subgoal_2"]["goal_id"]])
+        assert process.scheduler.take_due() == ["general_progress"]
+        assert process.synced["subgoal_2"].current_value == 60
+        assert not asana.set_metric_current_value.called
+
+    @patch("asana_goals.__main__.Asana", autospec=True)
+    @patch("asana_goals.__main__.Salesforce", autospec=True)
+    @patch("builtins.open", new_callable=mock_open,
+           read_data=test_config + '\n[receiver]\nport=0\npublic_url="http://example.com"\n')
+    def test_deleted_webhooks_established_again(self, open_mock, sf_mock, asana_mock):
+        asana = asana_mock.return_value
+        process = MainProcess("test_config", True)
+        process.receiver.start = Mock()
+        kept, deleted, moved = "1201008336897091", "1201031555453677", "1201031555453678"
+        for goal_gid in (kept, deleted, moved):
+            process.receiver._secrets[goal_gid] = "secret"
+        asana.get_me.return_value = {"gid": "1200000000000001", "workspaces": [{"gid": "1"}]}
+        asana.get_webhooks.return_value = [
+            {"resource": {"gid": kept}, "target": process.receiver.webhook_target(kept), "active": True},
+            {"resource": {"gid": moved}, "target": "http://old.example.com/asana/" + moved, "active": True},
+        ]
+        process.start_receiver()
+
+        asana.get_webhooks.assert_called_once_with("1")
+        # Only the goals whose webhook is gone get a new one
+        established = {c[0][0] for c in asana.create_webhook.call_args_list}
+        assert kept not in established
+        assert {deleted, moved} <= established
+        assert process.receiver.has_webhook(kept)
+        assert not process.receiver.has_webhook(deleted)
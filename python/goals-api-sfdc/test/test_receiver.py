@@ -0,0 +1,94 @@
+import hashlib
+import hmac
+import json
+import os
+import threading
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+import requests
+
+from asana_goals.receiver import ChangeReceiver
+
+
+class TestChangeReceiver(TestCase):
+    def setUp(self):
+        self.changed = []
+        self.notified = threading.Event()
+        self.tmp = TemporaryDirectory()
+        self.secrets_file = os.path.join(self.tmp.name, "secrets.json")
+        self.receiver = self._start()
+
+    def tearDown(self):
+        self.receiver.stop()
+        self.tmp.cleanup()
+
+    def _start(self):
+        def notify(kind):
+            def callback(ids):
+                self.changed.append((kind, ids))
+                self.notified.set()
+            return callback
+
+        receiver = ChangeReceiver(
+            notify("goals"), notify("reports"),
+            goal_gids=["1"], host="127.0.0.1", port=0,
+            public_url="http://example.com/",
+            secrets_file=self.secrets_file,
+            salesforce_token="token",
+        )
+        receiver.start()
+        return receiver
+
+    def _post(self, path, body=b"", headers=None):
+        return requests.post(
+            "http://127.0.0.1:{}{}".format(self.receiver.port, path),
+            data=body, headers=headers or {},
+        )
+
+    def _event(self, secret, body):
+        signature = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+        return self._post("/asana/1", body, {"X-Hook-Signature": signature})
+
+    def test_asana_webhook(self):
+        assert self.receiver.webhook_target("1") == "http://example.com/asana/1"
+        assert not self.receiver.has_webhook("1")
+        # Handshakes are only accepted while establishing the webhook
+        assert self._post("/asana/1", headers={"X-Hook-Secret": "forged"}).status_code == 403
+        with self.receiver.expect_handshake("1"):
+            resp = self._post("/asana/1", headers={"X-Hook-Secret": "secret"})
+        assert resp.status_code == 200
+        assert resp.headers["X-Hook-Secret"] == "secret"
+        assert self.receiver.has_webhook("1")
+        assert self._post("/asana/1", headers={"X-Hook-Secret": "forged"}).status_code == 403
+        with self.receiver.expect_handshake("2"):
+            resp = self._post("/asana/2", headers={"X-Hook-Secret": "secret"})
+        assert resp.status_code == 404
+
+        # Heartbeats do not change anything
+        assert self._event("secret", b'{"events": []}').status_code == 200
+        assert self._event("wrong", b'{"events": [{}]}').status_code == 401
+        # Events of the service's own writes are dropped
+        self.receiver.own_user_gid = "me"
+        own = b'{"events": [{"user": {"gid": "me"}}]}'
+        assert self._event("secret", own).status_code == 200
+        assert self._event("secret", b'{"events": [{"user": {"gid": "you"}}]}').status_code == 200
+        assert self.notified.wait(5)
+        assert self.changed == [("goals", ["1"])]
+
+        # The secret is still known after a restart
+        self.receiver.stop()
+        self.receiver = self._start()
+        assert self.receiver.has_webhook("1")
+        with open(self.secrets_file) as f:
+            assert json.load(f) == {"1": "secret"}
+
+    def test_salesforce_notification(self):
+        body = b'{"report_ids": ["a", "b"]}'
+        assert self._post("/salesforce", body).status_code == 401
+        headers = {"Authorization": "Bearer token"}
+        assert self._post("/salesforce", b"{}", headers).status_code == 400
+        assert self._post("/salesforce", body, headers).status_code == 200
+        assert self.notified.wait(5)
+        assert self.changed == [("reports", ["a", "b"])]
+        assert self._post("/unknown", body, headers).status_code == 404
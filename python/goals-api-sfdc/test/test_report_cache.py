@@ -0,0 +1,76 @@
+import threading
+from unittest import TestCase
+from unittest.mock import Mock
+
+from asana_goals.data_source.salesforce import ReportCache
+
+
+class TestReportCache(TestCase):
+    def test_fetched_once_per_tick(self):
+        fetch = Mock(side_effect=lambda report_id: report_id.upper())
+        cache = ReportCache(fetch)
+        cache.new_tick()
+        assert cache.get_report("a") == "A"
+        assert cache.get_report("a") == "A"
+        assert cache.get_report("b") == "B"
+        assert fetch.call_count == 2
+
+        cache.new_tick()
+        cache.get_report("a")
+        assert fetch.call_count == 3
+
+    def test_ttl_spans_ticks(self):
+        fetch = Mock(return_value="report")
+        cache = ReportCache(fetch, ttl=60)
+        cache.new_tick()
+        cache.get_report("a")
+        cache.new_tick()
+        cache.get_report("a")
+        assert fetch.call_count == 1
+        # A changed report is fetched again
+        cache.invalidate("a")
+        cache.get_report("a")
+        assert fetch.call_count == 2
+
+    def test_overlapping_ticks(self):
+        fetch = Mock(side_effect=lambda report_id: report_id.upper())
+        cache = ReportCache(fetch)
+        first = cache.new_tick()
+        cache.get_report("a", first)
+        # A run starting meanwhile does not expire the report of the first
+        second = cache.new_tick()
+        cache.get_report("a", first)
+        assert fetch.call_count == 1
+        # It fetches its own, which the first run can reuse too
+        cache.get_report("a", second)
+        cache.get_report("a", first)
+        assert fetch.call_count == 2
+
+        cache.end_tick(first)
+        cache.end_tick(second)
+        cache.get_report("a", cache.new_tick())
+        assert fetch.call_count == 3
+
+    def test_failed_fetch_retried(self):
+        fetch = Mock(side_effect=[RuntimeError("failed"), "report"])
+        cache = ReportCache(fetch)
+        with self.assertRaises(RuntimeError):
+            cache.get_report("a")
+        assert cache.get_report("a") == "report"
+
+    def test_concurrent_fetches_collapse(self):
+        release = threading.Event()
+        fetch = Mock(side_effect=lambda report_id: release.wait(5) and "report")
+        cache = ReportCache(fetch)
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(cache.get_report("a")))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join()
+        assert results == ["report"] * 8
+        assert fetch.call_count == 1
@@ -1,3 +1,5 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
 from unittest import TestCase
 from unittest.mock import patch, mock_open
 
@@ -5,6 +7,7 @@ import requests
 import responses
 
 from asana_goals.data_source.salesforce import Salesforce
+from asana_goals.data_source.salesforce.report import ReportStreamParser, SalesforceReport
 
 test_report = {
     "attributes": {
@@ -132,3 +135,148 @@ class TestSalesforceClient(TestCase):
         assert rpt.get_metric("s!AMOUNT") == 3745000.0
         with self.assertRaises(KeyError):
             rpt.get_metric("None")
+
+    def _add_token(self, token="token"):
+        return responses.add(
+            responses.POST,
+            f"https://login.salesforce.com/services/oauth2/token",
+            status=200,
+            json={
+                "instance_url": "https://instance.salesforce.com",
+                "access_token": token
+            }
+        )
+
+    def _add_report(self, status=200):
+        return responses.add(
+            responses.GET,
+            (
+                f"https://instance.salesforce.com/services/data/v52.0/analytics/reports/" +
+                test_report["attributes"]["reportId"]
+            ),
+            status=status,
+            json=test_report
+        )
+
+    @responses.activate
+    @patch("builtins.open", new_callable=mock_open, read_data=test_private_key)
+    def test_token_reused(self, file_mock):
+        token = self._add_token()
+        report = self._add_report()
+        client = Salesforce("dummy", "dummy", "salesforce_pk")
+        client.get_report(test_report["attributes"]["reportId"])
+        client.get_report(test_report["attributes"]["reportId"])
+        assert token.call_count == 1
+        assert report.call_count == 2
+
+    @responses.activate
+    @patch("builtins.open", new_callable=mock_open, read_data=test_private_key)
+    def test_token_refreshed_on_expiry(self, file_mock):
+        token = self._add_token()
+        self._add_report()
+        # Shorter than the refresh margin, so every token is due for refresh
+        client = Salesforce("dummy", "dummy", "salesforce_pk", token_lifetime=0)
+        client.get_report(test_report["attributes"]["reportId"])
+        client.get_report(test_report["attributes"]["reportId"])
+        assert token.call_count == 2
+
+    @responses.activate
+    @patch("builtins.open", new_callable=mock_open, read_data=test_private_key)
+    def test_token_refreshed_on_401(self, file_mock):
+        token = self._add_token()
+        rejected = self._add_report(status=401)
+        client = Salesforce("dummy", "dummy", "salesforce_pk")
+        with self.assertRaises(requests.HTTPError):
+            client.get_report(test_report["attributes"]["reportId"])
+        # One retry with a new token, then the error is raised
+        assert token.call_count == 2
+        assert rejected.call_count == 2
+
+        responses.replace(
+            responses.GET,
+            (
+                f"https://instance.salesforce.com/services/data/v52.0/analytics/reports/" +
+                test_report["attributes"]["reportId"]
+            ),
+            status=200,
+            json=test_report
+        )
+        rpt = client.get_report(test_report["attributes"]["reportId"])
+        assert rpt.get_metric("s!AMOUNT") == 3745000.0
+        assert token.call_count == 2
+
+    @responses.activate
+    @patch("builtins.open", new_callable=mock_open, read_data=test_private_key)
+    def test_concurrent_authentication(self, file_mock):
+        token = self._add_token()
+        client = Salesforce("dummy", "dummy", "salesforce_pk")
+        with ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(lambda _: client._authenticate(), range(16)))
+        assert token.call_count == 1
+        assert all(auth is results[0][1] for _, auth in results)
+
+    @responses.activate
+    @patch("builtins.open", new_callable=mock_open, read_data=test_private_key)
+    def test_report_details_excluded(self, file_mock):
+        self._add_token()
+        report = self._add_report()
+        client = Salesforce("dummy", "dummy", "salesforce_pk")
+        rpt = client.get_report(test_report["attributes"]["reportId"])
+        assert "includeDetails=false" in report.calls[0].request.url
+        # Only the sections get_metric reads are kept
+        assert rpt.source == {
+            "reportMetadata": {"aggregates": test_report["reportMetadata"]["aggregates"]},
+            "factMap": {"T!T": {"aggregates": test_report["factMap"]["T!T"]["aggregates"]}},
+        }
+
+
+class TestReportStreamParser(TestCase):
+    def _chunks(self, body, size):
+        return [body[i:i + size] for i in range(0, len(body), size)]
+
+    def test_chunk_boundaries(self):
+        # Strings with escapes, brackets and multi-byte characters can be cut
+        # anywhere
+        report = json.loads(json.dumps(test_report))
+        report["factMap"]["T!T"]["rows"] = [
+            {"dataCells": [{"label": 'a "quoted" [label] \u00e9 \\', "value": i}]}
+            for i in range(20)
+        ]
+        body = json.dumps(report, indent=1, ensure_ascii=False).encode("utf-8")
+        expected = SalesforceReport(report).get_metric("s!AMOUNT")
+        for size in (1, 2, 3, 7, 64, len(body)):
+            rpt = SalesforceReport.parse(self._chunks(body, size))
+            assert rpt.get_metric("s!AMOUNT") == expected
+            assert "rows" not in rpt.source["factMap"]["T!T"]
+
+    def test_stops_once_sections_found(self):
+        body = json.dumps({
+            "factMap": {"T!T": {"aggregates": [{"value": 1}]}},
+            "reportMetadata": {"aggregates": ["s!AMOUNT"]},
+        }).encode("utf-8") + b"this is never parsed"
+        parser = ReportStreamParser()
+        assert parser.feed(body)
+        assert SalesforceReport(parser.close()).get_metric("s!AMOUNT") == 1
+
+    def test_stops_within_a_character(self):
+        body = json.dumps({
+            "factMap": {"T!T": {"aggregates": [{"value": 1}]}},
+            "reportMetadata": {"aggregates": ["s!AMOUNT"]},
+            "attributes": {"currency": "\u20ac"},
+        }, ensure_ascii=False).encode("utf-8")
+        # The last chunk ends one byte into the euro sign
+        cut = body.index("\u20ac".encode("utf-8")) + 1
+        rpt = SalesforceReport.parse([body[:cut]])
+        assert rpt.get_metric("s!AMOUNT") == 1
+
+    def test_invalid_report_rejected(self):
+        for body in (b'{"factMap": {"T!T": [1, 2', b'{"factMap" {}}', b'{"attributes": "x'):
+            parser = ReportStreamParser()
+            with self.assertRaises(ValueError):
+                parser.feed(body)
+                parser.close()
+        # Missing sections are left out, as get_metric reports them
+        parser = ReportStreamParser()
+        parser.feed(b'{"attributes": {}}')
+        with self.assertRaises(KeyError):
+            SalesforceReport(parser.close()).get_metric("s!AMOUNT")
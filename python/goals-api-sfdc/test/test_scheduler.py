@@ -0,0 +1,71 @@
+from unittest import TestCase
+
+from asana_goals.goal_graph import ConfigurationError
+from asana_goals.scheduler import OVERLAP_COALESCE, Scheduler
+
+# Times are in seconds since the epoch, on the hour
+HOUR = 1600002000.0
+
+
+class TestScheduler(TestCase):
+    def test_goals_due_on_their_schedules(self):
+        scheduler = Scheduler(
+            {"minutely": "* * * * *", "hourly": "0 * * * *"}, now=HOUR,
+        )
+        assert scheduler.next_wakeup() == HOUR + 60
+        assert scheduler.take_due(HOUR + 30) == []
+        assert scheduler.take_due(HOUR + 60) == ["minutely"]
+        scheduler.finished(["minutely"])
+        assert scheduler.next_wakeup() == HOUR + 120
+        assert scheduler.sleep_time(HOUR + 90) == 30
+
+        # Missed runs are only run once
+        assert scheduler.take_due(HOUR + 3605) == ["minutely", "hourly"]
+        assert scheduler.next_wakeup() == HOUR + 3660
+
+    def test_jitter(self):
+        scheduler = Scheduler({"goal": "* * * * *"}, jitter=10, now=HOUR)
+        for _ in range(20):
+            due = scheduler.next_wakeup()
+            minute = due - due % 60
+            assert 0 <= due - minute <= 10
+            assert scheduler.take_due(due) == ["goal"]
+            scheduler.finished(["goal"])
+
+    def test_running_goal_skipped(self):
+        scheduler = Scheduler({"goal": "* * * * *"}, now=HOUR)
+        assert scheduler.take_due(HOUR + 60) == ["goal"]
+        assert scheduler.take_due(HOUR + 120) == []
+        scheduler.finished(["goal"])
+        assert scheduler.take_due(HOUR + 150) == []
+        assert scheduler.take_due(HOUR + 180) == ["goal"]
+
+    def test_running_goal_coalesced(self):
+        scheduler = Scheduler({"goal": "* * * * *"}, overlap=OVERLAP_COALESCE, now=HOUR)
+        assert scheduler.take_due(HOUR + 60) == ["goal"]
+        assert scheduler.take_due(HOUR + 120) == []
+        assert scheduler.take_due(HOUR + 180) == []
+        scheduler.finished(["goal"])
+        # Runs again right away, once
+        assert scheduler.next_wakeup() == 0
+        assert scheduler.take_due(HOUR + 190) == ["goal"]
+        scheduler.finished(["goal"])
+        assert scheduler.take_due(HOUR + 200) == []
+
+    def test_requested_goals(self):
+        scheduler = Scheduler({"a": "0 * * * *", "b": "0 * * * *"}, now=HOUR)
+        scheduler.request(["a"])
+        assert scheduler.next_wakeup() == 0
+        assert scheduler.take_due(HOUR + 60) == ["a"]
+        assert scheduler.take_due(HOUR + 60) == []
+        # Requested while running, runs again once done
+        scheduler.request(["a", "b"])
+        assert scheduler.take_due(HOUR + 70) == ["b"]
+        scheduler.finished(["a"])
+        assert scheduler.take_due(HOUR + 80) == ["a"]
+
+    def test_invalid_config_rejected(self):
+        with self.assertRaises(ConfigurationError):
+            Scheduler({"goal": "every minute"})
+        with self.assertRaises(ConfigurationError):
+            Scheduler({"goal": "* * * * *"}, overlap="queue")